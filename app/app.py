@@ -5,11 +5,18 @@ if ROOT not in sys.path:
 
 import io
 import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
 import streamlit as st
-import pandas as pd
 
+# Light imports only: the page, sidebar and uploader render before pandas and
+# the rules engine load (see "Engine imports" below); the LLM stack loads only
+# when polishing runs.
 from core.schema import missing_columns, REQUIRED_COLUMNS
-from core.generator import build_all_justifications
+from core.formats import FORMATS, MIME_TYPES, detect_format
+from core import instrument
 
 # --------------------------- Modern Look: page config + CSS ---------------------------
 st.set_page_config(page_title="RBI Risk Justification Generator", page_icon="🛠️", layout="wide")
@@ -103,7 +110,7 @@ with st.sidebar:
     st.header("About")
     st.write(
         "Upload your Excel in the standard template. The app will add a **Risk Justification** "
-        "for each component of RBI Analysis using your rule set. Optional LLM polishing is planned.",
+        "for each component of RBI Analysis using your rule set. Optional LLM polishing can rewrite the text for flow.",
         unsafe_allow_html=True
     )
 
@@ -129,6 +136,65 @@ with st.sidebar:
     from core.schema import REQUIRED_COLUMNS  # re-import safe here
     st.code("\n".join(REQUIRED_COLUMNS), language="text")
 
+    st.markdown("---")
+    st.header("Large workbooks")
+    streaming = st.toggle(
+        "Streaming mode",
+        value=False,
+        help="Reads, generates and writes in chunks so memory stays flat for very large sheets (.xlsx only).",
+    )
+    out_format = st.selectbox(
+        "Output format", FORMATS, index=0,
+        help="CSV and Parquet skip the Excel writer and are much faster for large registers.",
+    )
+    workers = st.number_input(
+        "Worker processes",
+        min_value=1, max_value=os.cpu_count() or 1, value=1, step=1,
+        help="Shard generation across CPU cores (in-memory mode). Output is identical to 1 worker.",
+    )
+
+    st.markdown("---")
+    st.header("Baselines")
+    scope = st.radio(
+        "3σ / CCR statistics", ["Whole register", "Per sheet", "Per column value"], index=0,
+        help="Per sheet reads every sheet (one per process unit) and scopes the Inventory, FAA and CCR "
+             "baselines to it; per column value does the same for each value of a chosen column "
+             "(unit, corrosion loop). The output keeps the sheet layout. Rules engine only.",
+    )
+
+    st.markdown("---")
+    st.header("Incremental update")
+    previous = st.file_uploader(
+        "Previous output (RBI_Justifications.xlsx / .csv / .parquet)", type=FORMATS,
+        help="Only components whose inputs (or 3σ/CCR class) changed are regenerated and re-polished; "
+             "the rest keep their previous text. In-memory mode only.",
+    )
+
+    st.markdown("---")
+    st.header("Diagnostics")
+    diagnostics = st.toggle(
+        "Run diagnostics", value=True,
+        help="Record per-stage timings and counters (shown under the results and logged as JSON lines).",
+    )
+
+    st.markdown("---")
+    st.header("LLM Polishing")
+    polish = st.toggle("Polish with LLM", value=False, help="Rewrites each distinct justification for flow; "
+                       "replies that drop a fact fall back to the rules text.")
+    if polish:
+        model_id = st.text_input("Model (Hub id or endpoint URL)", value="mistralai/Mistral-7B-Instruct-v0.3")
+        try:
+            default_token = st.secrets.get("HF_TOKEN", "")
+        except Exception:
+            default_token = ""
+        hf_token = st.text_input("HF token", value=default_token or os.environ.get("HF_TOKEN", ""), type="password")
+        polish_concurrency = st.slider("Concurrent requests", 1, 32, 8)
+        polish_batch_size = st.slider("Items per request", 1, 20, 1,
+                                      help="Pack several justifications into one prompt; "
+                                           "items missing from the reply are retried alone.")
+        use_cache = st.checkbox("Reuse cached polished text", value=True,
+                                help="Identical drafts sent before are answered from a local cache.")
+
 # --------------------------- Main: concise upload row ---------------------------
 # Small info row (optional mini cards)
 i1, i2 = st.columns([1, 1])
@@ -138,48 +204,489 @@ with i2:
     st.markdown('<div class="mini-card"><b>Output</b><br/>Adds: <code>Risk Justification</code> for every component—reason-first, CCR-aware, non-generic.</div>', unsafe_allow_html=True)
 
 # Blue badge and uploader with minimal gap
-st.markdown('<div class="badge-row"><span class="badge badge-blue"> Upload Excel (.xlsx) file as per required Template Format</span></div>', unsafe_allow_html=True)
+st.markdown('<div class="badge-row"><span class="badge badge-blue"> Upload Excel (.xlsx) file as per required Template Format — or a CSV / Parquet export with the same columns</span></div>', unsafe_allow_html=True)
 uploaded = st.file_uploader(
     "Upload Excel (.xlsx) file as per required Template Format",  # <- non-empty label to satisfy Streamlit
-    type=["xlsx"],
+    type=FORMATS,
     label_visibility="collapsed"  # keeps UI clean but avoids the warning
 )
 
+# --------------------------- Engine imports ---------------------------
+# Deferred to here so a cold start shows the UI first (python -m bench.imports measures them)
+import numpy as np
+import pandas as pd
+
+from core.ingest import coerce_register, compact_frame, format_report
+from core.progressive import ProgressiveRun, DEFAULT_POLISH_CHUNK
+from core.incremental import plan_incremental, carry_forward, plan_summary
+from core.rules import rules_version
+from core.snapshot import SnapshotCache, read_excel_cached
+from core.stream import read_header, write_justified_xlsx
+from core.formats import read_register, write_register
+from core.grouped import read_sheets, justify_sheets
+from core.export import export_excel_sheets
+from core.xlsxpatch import export_patched
+
+# --------------------------- Cached stages ---------------------------
+# Every widget interaction (even a download click) reruns this script. The heavy
+# stages are cached on the upload's content hash + the rule-code version, so
+# reruns with the same inputs are served from memory. Arguments starting with
+# "_" are not hashed by Streamlit; the hash key stands in for them.
+CACHE_ENTRIES = 4
+
+def upload_hash(f):
+    # sha256 of an uploaded file, computed once per upload
+    if f is None:
+        return None
+    seen = st.session_state.setdefault("upload_hashes", {})
+    fid = getattr(f, "file_id", None) or (f.name, f.size)
+    if fid not in seen:
+        if len(seen) >= 16:
+            seen.clear()
+        seen[fid] = hashlib.sha256(f.getvalue()).hexdigest()
+    return seen[fid]
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def read_upload(key, _data, fmt="xlsx"):
+    # Held dictionary-encoded. Excel goes through the disk snapshot (survives
+    # restarts); CSV/Parquet parse fast enough to read directly
+    if fmt == "xlsx":
+        return compact_frame(read_excel_cached(_data, SnapshotCache()))
+    return compact_frame(read_register(io.BytesIO(_data), fmt))
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def ingest_upload(key, _df):
+    # (typed frame for the rules engine, invalid-cell report)
+    return coerce_register(_df)
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def read_upload_header(key, _data):
+    return read_header(io.BytesIO(_data))
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def stream_upload(key, _data):
+    # (n_rows, preview, xlsx bytes, diagnostics, invalid-cell report); the compressed output is
+    # far smaller than the sheet
+    preview = []
+    def keep_preview(chunk):
+        if not preview:
+            preview.append(chunk.head(20))
+
+    out_file = tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False)
+    out_file.close()
+    try:
+        with instrument.recording() as inner:
+            report = {}
+            n_rows = write_justified_xlsx(io.BytesIO(_data), out_file.name, on_chunk=keep_preview, report=report)
+        with open(out_file.name, "rb") as f:
+            return n_rows, (preview[0] if preview else None), f.read(), inner.snapshot(), report
+    finally:
+        os.unlink(out_file.name)
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def incremental_plan(key, _df, _prev_data):
+    # Rows that are new, edited or reclassified against the previous output (see core.incremental)
+    prev_data, prev_fmt = _prev_data
+    prev, _ = coerce_register(read_register(io.BytesIO(prev_data), prev_fmt, columns=None))
+    return plan_incremental(_df, prev)
+
+def make_polisher(opts, hf_token):
+    # polish(items) for ProgressiveRun: one polish_batch call per step, through the local cache
+    from core.llm import polish_batch
+    from core.cache import PolishCache
+
+    def polish(items):
+        cache = PolishCache() if opts["use_cache"] else None
+        try:
+            return polish_batch(opts["model_id"], hf_token, items, max_concurrency=opts["concurrency"],
+                                cache=cache, batch_size=opts["batch_size"])
+        finally:
+            if cache is not None:
+                cache.close()
+    return polish
+
+@st.cache_resource(show_spinner=False)
+def finished_runs():
+    # run_key -> finished ProgressiveRun, shared by every session and reload (the newest CACHE_ENTRIES)
+    return {"runs": OrderedDict(), "lock": threading.Lock()}
+
+def finished_run(run_key):
+    store = finished_runs()
+    with store["lock"]:
+        run = store["runs"].get(run_key)
+        if run is not None:
+            store["runs"].move_to_end(run_key)
+        return run
+
+def keep_finished_run(run_key, run):
+    # Share a finished run; False when every polish request failed (bad token, endpoint down),
+    # so that it stays with this session only and a new token or a reload tries again
+    p = run.polish_summary()
+    if p is not None and p["total"] and p["failed"] == p["total"]:
+        return False
+    store = finished_runs()
+    with store["lock"]:
+        store["runs"][run_key] = run
+        store["runs"].move_to_end(run_key)
+        while len(store["runs"]) > CACHE_ENTRIES:
+            store["runs"].popitem(last=False)
+    return True
+
+def token_fingerprint(token):
+    # Stands in for the HF token in run keys, so a new token starts a new run
+    return hashlib.sha256(token.encode()).hexdigest()[:16] if token else None
+
+def format_progress(p):
+    # "Generating 40,000 / 100,000 rows · 25,000 rows/s · about 2 s left"
+    verb = "Polishing" if p["phase"] == "polish" else "Generating"
+    text = f"{verb} {p['done']:,} / {p['total']:,} {p['unit']}"
+    if p["unit"] == "texts":
+        text += f" (covering {p['rows_done']:,} of {p['rows']:,} rows)"
+    if p["per_s"]:
+        text += f" · {p['per_s']:,.0f} {p['unit']}/s"
+    if p["eta_s"] is not None:
+        eta = p["eta_s"]
+        text += f" · about {eta:.0f} s left" if eta < 120 else f" · about {eta / 60:.0f} min left"
+    return text
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def export_upload(key, _df, fmt="xlsx", _source=None):
+    # (bytes, None) or, when the upload could not be patched, (rebuilt bytes, reason).
+    # .xlsx uploads get the justification column patched into the original workbook
+    if fmt == "xlsx" and _source is not None:
+        out, report = io.BytesIO(), {}
+        export_patched(_df, out, _source, report=report)
+        return out.getvalue(), report["reason"]
+    return write_register(_df, io.BytesIO(), fmt).getvalue(), None
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def read_upload_sheets(key, _data, fmt="xlsx"):
+    # Every sheet of a workbook; a CSV/Parquet upload is a single sheet (all columns, for grouping)
+    if fmt == "xlsx":
+        return read_sheets(io.BytesIO(_data))
+    return {"Table1": compact_frame(read_register(io.BytesIO(_data), fmt, columns=None))}
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def justify_groups(key, group_by, _sheets, _workers):
+    # (justified sheets, info, dedup stats, diagnostics) with per-sheet / per-value baselines
+    with instrument.recording() as inner:
+        gen_stats = {}
+        sheets, info = justify_sheets(_sheets, by=group_by, workers=_workers, stats=gen_stats)
+        return sheets, info, gen_stats, inner.snapshot()
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def export_sheets(key, _sheets, fmt="xlsx"):
+    if fmt == "xlsx" or len(_sheets) > 1:
+        return export_excel_sheets(_sheets, io.BytesIO()).getvalue()
+    return write_register(next(iter(_sheets.values())), io.BytesIO(), fmt).getvalue()
+
+def show_diagnostics(rec, **fields):
+    # Collapsible per-stage table + counters; the same summary goes to the JSON log
+    if rec is None:
+        return
+    rec.log_summary(**fields)
+    snap = rec.snapshot()
+    with st.expander("Run diagnostics"):
+        st.dataframe(pd.DataFrame(instrument.timing_rows(snap)), use_container_width=True, hide_index=True)
+        if snap["counters"]:
+            st.dataframe(pd.DataFrame(list(snap["counters"].items()), columns=["counter", "value"]),
+                         use_container_width=True, hide_index=True)
+        st.caption("Sub-stages of cached steps are from the run that computed them; "
+                   f"run id {snap['run_id']}.")
+
 # --------------------------- Core Logic ---------------------------
-if uploaded:
-    with st.spinner("Reading and validating your Excel..."):
+rec = instrument.activate(instrument.Recorder(logger=instrument.json_logger()) if diagnostics else None)
+
+in_format = detect_format(uploaded.name) if uploaded else None
+grouped = uploaded is not None and scope != "Whole register"
+if uploaded and streaming and (grouped or in_format != "xlsx" or out_format != "xlsx"):
+    st.info("Streaming mode reads and writes .xlsx only, with whole-register baselines; "
+            "this file is processed in memory.")
+    streaming = False
+
+if grouped:
+    data_hash = upload_hash(uploaded)
+    if polish or previous is not None:
+        st.info("Per-sheet / per-column baselines use the rules engine only; "
+                "LLM polishing and incremental update are skipped.")
+    with st.spinner("Reading every sheet..."):
         try:
-            df = pd.read_excel(uploaded, sheet_name=0)
+            with instrument.stage("read"):
+                sheets = read_upload_sheets(data_hash, uploaded.getvalue(), in_format)
+        except Exception as e:
+            st.error(f"Failed to read {uploaded.name}: {e}")
+            st.stop()
+
+    group_by = None
+    if scope == "Per column value":
+        common = [c for c in next(iter(sheets.values())).columns if all(c in df.columns for df in sheets.values())]
+        if not common:
+            st.error("The sheets have no column in common to group by.")
+            st.stop()
+        # Default to the first non-input column (e.g. a unit or loop tag the site added)
+        extra = [c for c in common if c not in REQUIRED_COLUMNS]
+        group_by = st.selectbox("Group baselines by column", common,
+                                index=common.index(extra[0]) if extra else 0)
+
+    key = (data_hash, rules_version())
+    with st.spinner("Generating justifications per group..."):
+        try:
+            with instrument.stage("generate"):
+                out_sheets, info, gen_stats, group_diag = justify_groups(key, group_by, sheets, int(workers))
+        except Exception as e:
+            st.error(f"Failed to generate justifications: {e}")
+            st.stop()
+    if rec is not None:
+        rec.merge(group_diag)
+
+    if info["invalid"]:
+        st.warning(f"{info['invalid']} input cells failed the type checks; invalid numbers, PoF values "
+                   f"and CoF letters are treated as blank.")
+        with st.expander("Invalid cells"):
+            for name, report in info["reports"].items():
+                if report["invalid"]:
+                    st.caption(name)
+                    st.dataframe(report["cells"], use_container_width=True)
+    n_rows = sum(len(out_sheets[n]) for n in info["sheets"])
+    st.success(f"Justifications generated for {n_rows} components in {len(info['sheets'])} sheets, "
+               f"with {info['groups']} separate 3σ/CCR baselines.")
+    if info["skipped"]:
+        st.caption("Passed through unchanged: "
+                   + "; ".join(f"{n} ({why})" for n, why in info["skipped"].items()))
+    st.caption(
+        f"{gen_stats['unique']} distinct justifications across {gen_stats['rows']} components "
+        f"(dedup ratio {gen_stats['dedup_ratio']:.1f}×)."
+    )
+
+    st.markdown("### Preview")
+    shown = st.selectbox("Sheet", info["sheets"]) if len(info["sheets"]) > 1 else info["sheets"][0]
+    st.dataframe(out_sheets[shown].head(20), use_container_width=True)
+
+    st.markdown("### Export")
+    out_ext = "xlsx" if len(out_sheets) > 1 else out_format
+    with instrument.stage("export"):
+        out_bytes = export_sheets((key, group_by), out_sheets, out_ext)
+    st.download_button(
+        "Download updated Excel with Justifications" if out_ext == "xlsx"
+        else f"Download justified register ({out_ext.upper()})",
+        data=out_bytes,
+        file_name=f"RBI_Justifications.{out_ext}",
+        mime=MIME_TYPES[out_ext]
+    )
+    show_diagnostics(rec, mode="grouped", rows=n_rows)
+
+elif uploaded and streaming:
+    data = uploaded.getvalue()
+    key = (upload_hash(uploaded), rules_version())
+    with st.spinner("Checking columns..."), instrument.stage("validate"):
+        try:
+            header = read_upload_header(key, data)
         except Exception as e:
             st.error(f"Failed to read Excel: {e}")
             st.stop()
 
-        miss = missing_columns(df)
+        miss = missing_columns(pd.DataFrame(columns=header))
         if miss:
             st.error(f"Missing required columns: {miss}")
             st.stop()
 
-    with st.spinner("Generating justifications using the rules engine..."):
-        justs = build_all_justifications(df)
-        df["Risk Justification"] = justs
+    with st.spinner("Streaming your Excel through the rules engine..."), instrument.stage("generate"):
+        try:
+            n_rows, preview, out_bytes, stream_diag, report = stream_upload(key, data)
+        except Exception as e:
+            st.error(f"Failed to process Excel: {e}")
+            st.stop()
+    if rec is not None:
+        rec.merge(stream_diag)
+    instrument.count("validate.invalid_cells", report.get("invalid", 0))
+
+    if report.get("invalid"):
+        st.warning(f"{report['invalid']} input cells failed the type checks; invalid numbers, PoF values "
+                   f"and CoF letters are treated as blank.\n\n"
+                   + format_report(report).replace("\n", "  \n"))
+        with st.expander("Invalid cells"):
+            st.dataframe(report["cells"], use_container_width=True)
 
-    st.success("Justifications generated successfully.")
+    st.success(f"Justifications generated successfully for {n_rows} components.")
 
     # Preview
     st.markdown("### Preview")
-    st.dataframe(df.head(20), use_container_width=True)
+    if preview is not None:
+        st.dataframe(preview, use_container_width=True)
 
     # Download button
     st.markdown("### Export")
-    out = io.BytesIO()
-    with pd.ExcelWriter(out, engine="xlsxwriter") as writer:
-        df.to_excel(writer, sheet_name="Table1", index=False)
     st.download_button(
         "Download updated Excel with Justifications",
-        data=out.getvalue(),
+        data=out_bytes,
         file_name="RBI_Justifications.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        mime=MIME_TYPES["xlsx"]
+    )
+    show_diagnostics(rec, mode="streaming", rows=n_rows)
+
+elif uploaded:
+    data_hash = upload_hash(uploaded)
+    with st.spinner("Reading and validating your Excel..."):
+        try:
+            with instrument.stage("read"):
+                df = read_upload(data_hash, uploaded.getvalue(), in_format)
+        except Exception as e:
+            st.error(f"Failed to read {uploaded.name}: {e}")
+            st.stop()
+
+        with instrument.stage("validate"):
+            miss = missing_columns(df)
+            if miss:
+                st.error(f"Missing required columns: {miss}")
+                st.stop()
+
+            typed, report = ingest_upload((data_hash, rules_version()), df)
+        instrument.count("validate.invalid_cells", report["invalid"])
+
+    if report["invalid"]:
+        st.warning(f"{report['invalid']} input cells failed the type checks; invalid numbers, PoF values "
+                   f"and CoF letters are treated as blank.\n\n"
+                   + format_report(report).replace("\n", "  \n"))
+        with st.expander("Invalid cells"):
+            st.dataframe(report["cells"], use_container_width=True)
+
+    polish_opts = None
+    if polish:
+        if not hf_token:
+            st.warning("LLM polishing skipped: no HF token provided.")
+        else:
+            polish_opts = {"model_id": model_id, "concurrency": polish_concurrency,
+                           "batch_size": polish_batch_size, "use_cache": use_cache}
+
+    key = (data_hash, upload_hash(previous), rules_version())
+    plan = None
+    if previous is not None:
+        with st.spinner("Comparing with the previous output..."):
+            try:
+                plan = incremental_plan(key, typed, (previous.getvalue(), detect_format(previous.name)))
+            except Exception as e:
+                st.error(f"Failed to read the previous output: {e}")
+                st.stop()
+    work = df if plan is None else df[~plan["reuse"]]
+
+    # Finished runs are shared (finished_runs), so another tab or a reload gets
+    # them back. The run in progress lives in the session, kept across reruns: a
+    # widget click (Cancel included) stops the loop below between chunks and the
+    # work done so far is kept
+    polish_key = polish_opts and (tuple(sorted(polish_opts.items())), token_fingerprint(hf_token))
+    # The worker count only changes the speed, so it is not part of the key: a run in
+    # progress picks up a new count on its next chunk
+    run_key = (key, polish_key)
+    run, state = finished_run(run_key), None
+    if run is None:
+        state = st.session_state.get("run")
+        if state is None or state["key"] != run_key:
+            if state is not None:
+                state["run"].close()  # its worker processes, if it stopped mid-generation
+            run = ProgressiveRun(
+                typed if plan is None else typed[~plan["reuse"]],
+                levels=None if plan is None else plan["levels"],
+                workers=int(workers),
+                polish=make_polisher(polish_opts, hf_token) if polish_opts else None,
+                # A few rounds of requests per step, so Cancel is never far away
+                polish_chunk=4 * polish_opts["concurrency"] * polish_opts["batch_size"] if polish_opts
+                else DEFAULT_POLISH_CHUNK,
+            )
+            state = st.session_state["run"] = {"key": run_key, "run": run, "cancelled": False}
+        run = state["run"]
+        run.set_workers(int(workers))
+
+    if not run.finished:
+        if state["cancelled"]:
+            if st.button("Resume", help="Continue from where the run was cancelled."):
+                state["cancelled"] = False
+                st.rerun()
+        elif st.button("Cancel", help="Stop after the current chunk; what is done so far can be downloaded."):
+            state["cancelled"] = True
+            st.rerun()
+        else:
+            bar = st.progress(0.0, text=format_progress(run.progress()))
+            st.markdown("### Live preview")
+            live = st.empty()
+            while not run.finished:
+                try:
+                    phase = run.step()
+                except Exception as e:
+                    st.error(f"Failed to generate justifications: {e}")
+                    st.stop()
+                p = run.progress()
+                bar.progress(min(p["done"] / p["total"], 1.0) if p["total"] else 1.0, text=format_progress(p))
+                # Latest rows generated, or the first rows while their texts get polished
+                rows = np.arange(max(run.generated - 20, 0), run.generated) if phase == "generate" \
+                    else np.arange(min(20, run.n_rows))
+                view = work.iloc[rows].copy()
+                view["Risk Justification"] = run.texts_at(rows)
+                live.dataframe(view, use_container_width=True)
+            if keep_finished_run(run_key, run):
+                del st.session_state["run"]
+            st.rerun()  # redraw without the progress widgets
+    elif state is not None and keep_finished_run(run_key, run):
+        # Finished without a step (nothing to generate)
+        del st.session_state["run"]
+
+    justs = run.column()
+    df["Risk Justification"] = justs if plan is None else carry_forward(plan, justs)
+    if rec is not None:
+        rec.merge(run.recorder.snapshot())
+
+    p = run.polish_summary()
+    if p is not None and p["total"]:
+        st.caption(f"LLM polishing: {p['kept']}/{p['total']} polished texts kept, "
+                   f"{p['failed']} request failures; the rest use the rules text.")
+        if p["reasons"]:
+            why = ", ".join(f"{k}: {n}" for k, n in p["reasons"].items())
+            st.caption(f"Rejected replies by missing fact — {why}.")
+        if polish_opts["use_cache"]:
+            st.caption(f"Polish cache: {p['cached']} hits, {p['total'] - p['cached']} misses.")
+
+    if not run.finished:
+        prog = run.progress()
+        if prog["phase"] == "generate":
+            st.warning(f"Cancelled after {run.generated:,} of {run.n_rows:,} components; "
+                       f"the rest have no justification in the download.")
+        else:
+            st.warning(f"Polishing cancelled after {prog['done']:,} of {prog['total']:,} distinct texts; "
+                       f"the rest keep the rules text.")
+    else:
+        st.success("Justifications generated successfully.")
+    if plan is not None:
+        summary = plan_summary(plan)
+        st.caption(
+            f"Incremental: {summary['reused']}/{summary['rows']} components reused from the previous output; "
+            f"{summary['new']} new, {summary['changed']} changed, {summary['reclassified']} reclassified by shifted dataset statistics."
+        )
+    gen_stats = run.gen_stats()
+    st.caption(
+        f"{gen_stats['unique']} distinct justifications across {gen_stats['rows']} components "
+        f"(dedup ratio {gen_stats['dedup_ratio']:.1f}×)."
+    )
+
+    # Preview
+    st.markdown("### Preview")
+    st.dataframe(df.head(20), use_container_width=True)
+
+    # Download button
+    st.markdown("### Export")
+    with instrument.stage("export"):
+        out_bytes, rebuilt = export_upload((run_key, run.generated, run.polished), df, out_format,
+                                           uploaded.getvalue() if in_format == "xlsx" else None)
+    if rebuilt:
+        st.warning("The justification column could not be written into your workbook as uploaded "
+                   f"({rebuilt}). The download is a rebuilt workbook: values and sheets are kept, "
+                   "but formatting, column widths and formulas are not.")
+    st.download_button(
+        "Download updated Excel with Justifications" if out_format == "xlsx"
+        else f"Download justified register ({out_format.upper()})",
+        data=out_bytes,
+        file_name=f"RBI_Justifications.{out_format}",
+        mime=MIME_TYPES[out_format]
     )
+    show_diagnostics(rec, mode="in-memory", rows=len(df))
 
 # --------------------------- Footer ---------------------------
 st.markdown('<div class="footer">© 2025 Muhammad Ali Haider. All rights reserved.</div>', unsafe_allow_html=True)
@@ -0,0 +1,77 @@
+# bench/imports.py
+# Import-time budget for cold starts. Each target is imported in a fresh
+# interpreter under `python -X importtime`; its cost is the self time of every
+# module it loaded beyond interpreter startup. Fails (exit 1) when a target is
+# over budget or loads a module it must not (e.g. the LLM stack while
+# polishing is off).
+#
+#   python -m bench.imports              # table + exit status
+#   python -m bench.imports --repeat 5   # best of 5 runs per target
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (name, import statement, budget ms, modules that must not load)
+TARGETS = [
+    ("app shell", "import core.schema, core.formats, core.instrument", 100, ["pandas", "numpy", "openpyxl"]),
+    ("core.llm", "import core.llm", 150, ["huggingface_hub", "tenacity", "pandas"]),
+    ("engine", "import core.ingest, core.generator, core.incremental, core.progressive, core.snapshot, core.stream",
+     2500, ["huggingface_hub", "tenacity"]),
+]
+
+def import_profile(statement):
+    # {module: self µs} for everything `statement` imports, in a fresh interpreter
+    def run(code):
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True,
+                             text=True, cwd=ROOT, check=True)
+        mods = {}
+        for line in out.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            self_us, _, name = (part.strip() for part in line[len("import time:"):].split("|"))
+            if self_us.isdigit():
+                mods[name] = int(self_us)
+        return mods
+    startup = run("pass")
+    return {m: us for m, us in run(statement).items() if m not in startup}
+
+def _loaded(mods, banned):
+    return sorted(b for b in banned if any(m == b or m.startswith(b + ".") for m in mods))
+
+def check(targets=TARGETS, repeat=3):
+    # [{"name", "ms", "budget", "modules", "banned", "ok"}]; best of `repeat` runs
+    results = []
+    for name, statement, budget, banned in targets:
+        runs = [import_profile(statement) for _ in range(max(1, repeat))]
+        mods = min(runs, key=lambda m: sum(m.values()))
+        ms = sum(mods.values()) / 1000
+        bad = _loaded(mods, banned)
+        results.append({"name": name, "ms": ms, "budget": budget, "modules": len(mods),
+                        "banned": bad, "ok": ms <= budget and not bad})
+    return results
+
+def format_check(results):
+    lines = [f"{'target':<10} {'ms':>8} {'budget':>8} {'modules':>8}  status"]
+    for r in results:
+        status = "ok" if r["ok"] else "FAIL"
+        if r["banned"]:
+            status += " (loads " + ", ".join(r["banned"]) + ")"
+        elif not r["ok"]:
+            status += " (over budget)"
+        lines.append(f"{r['name']:<10} {r['ms']:>8.1f} {r['budget']:>8} {r['modules']:>8}  {status}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m bench.imports",
+                                 description="Check cold-start import times against their budgets.")
+    ap.add_argument("--repeat", type=int, default=3, help="runs per target, best kept (default: %(default)s)")
+    args = ap.parse_args(argv)
+    results = check(repeat=args.repeat)
+    print(format_check(results))
+    return 0 if all(r["ok"] for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# bench/load.py
+# Load generator for core.service: concurrent clients POST synthetic registers
+# to /justify for a fixed time, then the client-side throughput and latency are
+# printed next to the server's /health metrics. Start the service first:
+#
+#   python -m core.service -w 4 --quiet &
+#   python -m bench.load -c 16 --rows 500 --seconds 20
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from bench.synth import synth_register
+
+def _body(rows, seed):
+    df = synth_register(rows, seed=seed)
+    return json.dumps({"columns": list(df.columns), "data": json.loads(df.to_json(orient="values"))}).encode()
+
+def _get(url):
+    with urllib.request.urlopen(url) as resp:
+        return json.loads(resp.read())
+
+def run_load(url, clients=8, rows=500, seconds=10.0, bodies=8):
+    # {"requests", "rows", "errors", "seconds", "rows_per_s", "latency_ms_p50/p95/max"} seen by the clients
+    payloads = [_body(rows, seed) for seed in range(bodies)]
+    latencies, errors, lock = [], [0], threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def client(k):
+        i = k
+        while time.perf_counter() < stop:
+            req = urllib.request.Request(f"{url}/justify", data=payloads[i % len(payloads)],
+                                         headers={"Content-Type": "application/json"})
+            t0 = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req) as resp:
+                    resp.read()
+                ok = True
+            except (urllib.error.URLError, ConnectionError):
+                ok = False
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - t0)
+                else:
+                    errors[0] += 1
+            i += 1
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    lat = sorted(latencies)
+    return {
+        "requests": len(lat),
+        "rows": len(lat) * rows,
+        "errors": errors[0],
+        "seconds": round(elapsed, 2),
+        "rows_per_s": round(len(lat) * rows / elapsed, 1),
+        "latency_ms_p50": round(lat[len(lat) // 2] * 1000, 1) if lat else None,
+        "latency_ms_p95": round(lat[int(len(lat) * 0.95)] * 1000, 1) if lat else None,
+        "latency_ms_max": round(lat[-1] * 1000, 1) if lat else None,
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m bench.load",
+                                 description="Load-test a running core.service instance.")
+    ap.add_argument("--url", default="http://127.0.0.1:8765", help="service URL (default: %(default)s)")
+    ap.add_argument("-c", "--clients", type=int, default=8, help="concurrent clients (default: %(default)s)")
+    ap.add_argument("--rows", type=int, default=500, help="rows per request (default: %(default)s)")
+    ap.add_argument("--seconds", type=float, default=10.0, help="test duration (default: %(default)s)")
+    args = ap.parse_args(argv)
+
+    try:
+        _get(f"{args.url}/health")
+    except (urllib.error.URLError, ConnectionError) as e:
+        print(f"Service not reachable at {args.url}: {e}", file=sys.stderr)
+        return 2
+    result = run_load(args.url, args.clients, args.rows, args.seconds)
+    print("client:", json.dumps(result))
+    print("server:", json.dumps(_get(f"{args.url}/health")))
+    return 1 if result["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+# bench/polish.py
+# Polishing throughput against the local stub model (core.llmstub), no network:
+# polish_batch is run over the distinct drafts of a synthetic register for each
+# (concurrency, items per request) pair, with the stub's latency, 429/error
+# rates and mutations set on the command line. In-process by default; --http
+# puts the stub behind localhost so the HF client and its HTTP path are timed.
+#
+#   python -m bench.polish                                   # 2k rows, c in 1 4 16, batch 1 and 8
+#   python -m bench.polish -c 8 -c 32 -b 1 -b 4 --latency-ms 800 --rate-limit-rate 0.05 --http
+import argparse
+import json
+import sys
+import threading
+import time
+
+def polish_run(items, backend, concurrency, batch_size, rate_per_sec=None):
+    # {"items", "seconds", "items_per_s", "kept", "failed", "attempts", "reasons"} for one polish_batch call
+    from core.llm import polish_batch
+    report = {}
+    t0 = time.perf_counter()
+    results = polish_batch("stub", None, items, max_concurrency=concurrency, batch_size=batch_size,
+                           rate_per_sec=rate_per_sec, backoff_base=0.05, backend=backend, report=report)
+    elapsed = time.perf_counter() - t0
+    return {
+        "items": len(results),
+        "seconds": round(elapsed, 3),
+        "items_per_s": round(len(results) / elapsed, 1) if elapsed else None,
+        "kept": sum(r["polished"] for r in results),
+        "failed": sum(r["error"] is not None for r in results),
+        "attempts": sum(r["attempts"] for r in results),
+        "reasons": report.get("reasons", {}),
+    }
+
+def format_runs(runs):
+    head = f"{'conc':>5} {'batch':>5} {'items':>6} {'sec':>8} {'items/s':>9} {'kept':>6} {'failed':>6} {'attempts':>8}"
+    lines = [head, "-" * len(head)]
+    for r in runs:
+        lines.append(f"{r['concurrency']:>5} {r['batch_size']:>5} {r['items']:>6} {r['seconds']:>8.2f} "
+                     f"{r['items_per_s']:>9.1f} {r['kept']:>6} {r['failed']:>6} {r['attempts']:>8}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    from bench.run import parse_rows
+    ap = argparse.ArgumentParser(prog="python -m bench.polish",
+                                 description="Polishing throughput against the local stub model.")
+    ap.add_argument("-n", "--rows", default="2k", help="synthetic register size (default: %(default)s)")
+    ap.add_argument("-c", "--concurrency", type=int, action="append", help="repeatable (default: 1, 4, 16)")
+    ap.add_argument("-b", "--batch-size", type=int, action="append", help="repeatable (default: 1, 8)")
+    ap.add_argument("--rate", type=float, default=None, help="client rate limit, requests/s")
+    ap.add_argument("--latency-ms", type=float, default=200.0, help="stub latency per request (default: %(default)s)")
+    ap.add_argument("--jitter-ms", type=float, default=50.0, help="stub latency jitter (default: %(default)s)")
+    ap.add_argument("--per-item-ms", type=float, default=20.0, help="stub latency per packed item (default: %(default)s)")
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered 429")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered 500")
+    ap.add_argument("--mutation-rate", type=float, default=0.1, help="share of items mutated (default: %(default)s)")
+    ap.add_argument("--drop-rate", type=float, default=0.0, help="share of items left out of packed replies")
+    ap.add_argument("--http", action="store_true", help="serve the stub on localhost and go through the HF client")
+    ap.add_argument("-o", "--out", help="write the runs as JSON")
+    args = ap.parse_args(argv)
+
+    from core.ingest import coerce_register
+    from core.generator import build_polish_items
+    from core.llm import HFBackend
+    from core.llmstub import StubBackend, serve_stub
+    from bench.synth import synth_register
+
+    typed, _ = coerce_register(synth_register(parse_rows(args.rows)))
+    _, drafts, payloads = build_polish_items(typed)
+    items = list(zip(payloads, drafts))
+
+    def make_backend():
+        # A fresh stub per run, so every run sees the same outcomes
+        stub = StubBackend(args.latency_ms, args.jitter_ms, args.per_item_ms, args.rate_limit_rate, None,
+                           args.error_rate, mutation_rate=args.mutation_rate, drop_rate=args.drop_rate)
+        if not args.http:
+            return stub, None
+        server = serve_stub(stub, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return HFBackend(f"http://127.0.0.1:{server.server_port}", "stub"), server
+
+    runs = []
+    for concurrency in args.concurrency or [1, 4, 16]:
+        for batch_size in args.batch_size or [1, 8]:
+            backend, server = make_backend()
+            try:
+                r = polish_run(items, backend, concurrency, batch_size, args.rate)
+            finally:
+                if server is not None:
+                    server.shutdown()
+                    server.server_close()
+            r.update(concurrency=concurrency, batch_size=batch_size)
+            runs.append(r)
+            print(f"[done] c={concurrency} b={batch_size}: {r['items_per_s']} items/s", file=sys.stderr)
+
+    print(f"{len(items)} distinct drafts from {args.rows} rows; stub latency {args.latency_ms:g} ms"
+          + (" over HTTP" if args.http else " in-process"))
+    print(format_runs(runs))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(runs, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
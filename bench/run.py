@@ -0,0 +1,218 @@
+# bench/run.py
+# Reproducible benchmarks on synthetic registers. Each size runs in a fresh
+# process so peak RSS belongs to that size alone; results go to a JSON file
+# that a later run can be compared against.
+#
+#   python -m bench.run                              # 1k, 10k, 100k, 1M rows -> bench_results.json
+#   python -m bench.run -n 10k -n 100k -o new.json
+#   python -m bench.run --compare bench_results.json --fail-above 1.25
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_SIZES = ["1k", "10k", "100k", "1M"]
+DEFAULT_OUT = "bench_results.json"
+# Writing and parsing .xlsx dominates above this; larger sizes skip read/export unless --full
+DEFAULT_XLSX_MAX_ROWS = 200_000
+STAGES = ["read", "validate", "generate", "polish", "export"]
+
+def parse_rows(text):
+    # "10k" -> 10000, "1M" -> 1000000
+    text = str(text).strip()
+    mult = {"k": 1_000, "K": 1_000, "m": 1_000_000, "M": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if mult > 1 else text) * mult)
+
+def peak_rss_mb():
+    # Peak resident set size of this process so far; None where unavailable
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def bench_size(rows, seed=0, xlsx=True, polish_concurrency=8):
+    """
+    One benchmark at `rows` components: synthesise, then time read (from a
+    temporary .xlsx), validate, generate, polish (stub model) and export.
+    Stages skipped for size are recorded as None.
+    """
+    import pandas as pd
+    from core.schema import missing_columns
+    from core.ingest import coerce_register, compact_frame
+    from core.generator import build_justification_column, build_polish_items
+    from core.llm import polish_batch
+    from core.llmstub import StubBackend
+    from core.export import export_excel
+    from bench.synth import synth_register
+
+    t = dict.fromkeys(STAGES)
+    t0 = time.perf_counter()
+    df = synth_register(rows, seed)
+    synth_s = time.perf_counter() - t0
+
+    if xlsx:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "register.xlsx")
+            export_excel(df, path)
+            t0 = time.perf_counter()
+            df = pd.read_excel(path, sheet_name=0)
+            t["read"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    df = compact_frame(df)
+    miss = missing_columns(df)
+    if miss:
+        raise ValueError(f"Missing required columns: {miss}")
+    typed, report = coerce_register(df)
+    t["validate"] = time.perf_counter() - t0
+
+    gen = {}
+    t0 = time.perf_counter()
+    df["Risk Justification"] = build_justification_column(typed, stats=gen)
+    t["generate"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    codes, drafts, payloads = build_polish_items(typed)
+    # Instant stub model returning the draft: measures the pipeline around the model, not the model
+    results = polish_batch("stub", None, zip(payloads, drafts), max_concurrency=polish_concurrency,
+                           backend=StubBackend())
+    t["polish"] = time.perf_counter() - t0
+
+    if xlsx:
+        t0 = time.perf_counter()
+        export_excel(df, io.BytesIO())
+        t["export"] = time.perf_counter() - t0
+
+    timed = sum(v for v in t.values() if v is not None)
+    return {
+        "rows": rows,
+        "seed": seed,
+        "timings": t,
+        "synth": synth_s,
+        "total": timed,
+        "rows_per_s": rows / t["generate"] if t["generate"] else None,
+        "unique": gen["unique"],
+        "polish_items": len(results),
+        "invalid_cells": report["invalid"],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def environment():
+    import numpy as np
+    import pandas as pd
+    from core.rules import rules_version
+    return {
+        "commit": _git_commit(),
+        "rules_version": rules_version(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+def run_benchmarks(sizes, seed=0, xlsx_max_rows=DEFAULT_XLSX_MAX_ROWS, on_result=None):
+    # One fresh (spawned) process per size; returns {"environment", "results"}
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    for rows in sizes:
+        xlsx = xlsx_max_rows is None or rows <= xlsx_max_rows
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as ex:
+            res = ex.submit(bench_size, rows, seed, xlsx).result()
+        results.append(res)
+        if on_result is not None:
+            on_result(res)
+    return {"environment": environment(), "results": results}
+
+def _fmt(v, unit="s"):
+    return f"{v:>8.2f}{unit}" if v is not None else f"{'-':>9}"
+
+def format_results(report):
+    head = f"{'rows':>9} " + " ".join(f"{s:>9}" for s in STAGES) + f" {'rows/s':>10} {'unique':>8} {'peak MB':>9}"
+    lines = [head, "-" * len(head)]
+    for r in report["results"]:
+        stages = " ".join(_fmt(r["timings"][s]) for s in STAGES)
+        rate = f"{r['rows_per_s']:>10.0f}" if r["rows_per_s"] else f"{'-':>10}"
+        peak = f"{r['peak_rss_mb']:>9.0f}" if r["peak_rss_mb"] is not None else f"{'-':>9}"
+        lines.append(f"{r['rows']:>9} {stages} {rate} {r['unique']:>8} {peak}")
+    return "\n".join(lines)
+
+def compare(old, new):
+    """
+    [(rows, metric, old, new, ratio)] for every stage timing and peak RSS that
+    both reports measured at the same size; ratio > 1 means `new` is slower/larger.
+    """
+    before = {r["rows"]: r for r in old["results"]}
+    out = []
+    for r in new["results"]:
+        o = before.get(r["rows"])
+        if o is None:
+            continue
+        pairs = [(s, o["timings"].get(s), r["timings"].get(s)) for s in STAGES]
+        pairs.append(("peak_rss_mb", o.get("peak_rss_mb"), r.get("peak_rss_mb")))
+        for metric, a, b in pairs:
+            if a and b is not None:
+                out.append((r["rows"], metric, a, b, b / a))
+    return out
+
+def format_comparison(rows, old_env):
+    lines = [f"vs {old_env.get('commit') or '?'} ({old_env.get('created', '?')})",
+             f"{'rows':>9} {'metric':<12} {'old':>10} {'new':>10} {'ratio':>7}"]
+    for n, metric, a, b, ratio in rows:
+        lines.append(f"{n:>9} {metric:<12} {a:>10.3f} {b:>10.3f} {ratio:>6.2f}x")
+    return "\n".join(lines)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m bench.run",
+                                 description="Benchmark the justification pipeline on synthetic registers.")
+    ap.add_argument("-n", "--rows", action="append",
+                    help="register size, e.g. 10k or 1M; repeatable (default: %s)" % ", ".join(DEFAULT_SIZES))
+    ap.add_argument("-o", "--out", default=DEFAULT_OUT, help="results JSON (default: %(default)s)")
+    ap.add_argument("--seed", type=int, default=0, help="synthetic register seed (default: %(default)s)")
+    ap.add_argument("--full", action="store_true",
+                    help=f"time .xlsx read/export at every size (default: only up to {DEFAULT_XLSX_MAX_ROWS} rows)")
+    ap.add_argument("--compare", metavar="JSON", help="earlier results to compare against")
+    ap.add_argument("--fail-above", type=float, metavar="RATIO",
+                    help="with --compare, exit 1 if any metric grew by more than RATIO")
+    args = ap.parse_args(argv)
+
+    sizes = [parse_rows(s) for s in (args.rows or DEFAULT_SIZES)]
+    def progress(r):
+        print(f"[done] {r['rows']} rows: {r['total']:.2f}s timed, peak {r['peak_rss_mb'] or 0:.0f} MB",
+              file=sys.stderr)
+
+    report = run_benchmarks(sizes, args.seed, None if args.full else DEFAULT_XLSX_MAX_ROWS, progress)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(format_results(report))
+    print(f"Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        rows = compare(old, report)
+        print(format_comparison(rows, old.get("environment", {})))
+        if args.fail_above and any(ratio > args.fail_above for *_, ratio in rows):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
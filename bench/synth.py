@@ -0,0 +1,121 @@
+# bench/synth.py
+# Synthetic RBI registers for benchmarking: every REQUIRED_COLUMNS (+ the legacy
+# CCR alias) with category mixes and missing-value rates modelled on
+# examples/sample_input.xlsx. Same (rows, seed) -> same frame.
+import numpy as np
+import pandas as pd
+
+from core.schema import REQUIRED_COLUMNS, OPTIONAL_COLUMNS
+
+RISK = (["LOW", "MEDIUM", "MEDIUM HIGH", "HIGH"], [0.50, 0.33, 0.13, 0.04])
+POF = ([1, 2, 3, 4, 5], [0.01, 0.04, 0.35, 0.45, 0.15])
+LETTERS = ["A", "B", "C", "D", "E"]
+FLAMM = [0.02, 0.09, 0.19, 0.24, 0.46]
+TOXIC = [0.12, 0.27, 0.45, 0.11, 0.05]
+PROD = [0.01, 0.03, 0.06, 0.10, 0.80]
+# (representative fluid, fluid type, phase weights (gas, liquid), toxic fluid choices)
+FLUIDS = [
+    ("C1", "Flammable", (0.9, 0.1), ["H2S", np.nan]),
+    ("C3", "Flammable", (0.6, 0.4), ["H2S", np.nan]),
+    ("C4", "Flammable", (0.5, 0.5), ["H2S", "Methyl Mercaptan", np.nan]),
+    ("C6-C8", "Flammable", (0.1, 0.9), [np.nan]),
+    ("Kerosene", "Flammable", (0.0, 1.0), [np.nan]),
+    ("Diesel", "Flammable", (0.0, 1.0), [np.nan]),
+    ("H2", "Flammable", (1.0, 0.0), [np.nan]),
+    ("MDEA", "Reactive", (0.0, 1.0), ["H2S", np.nan]),
+    ("Amine", "Reactive", (0.0, 1.0), ["H2S", np.nan]),
+    ("Caustic (20%)", "Reactive", (0.0, 1.0), [np.nan]),
+    ("NAOH", "Reactive", (0.0, 1.0), [np.nan]),
+    ("DMDS (Di-methyl disulfide)", "Reactive", (0.0, 1.0), ["Methyl Mercaptan"]),
+    ("H2O (Water)", "Inert", (0.0, 1.0), [np.nan]),
+    ("Steam", "Inert", (1.0, 0.0), [np.nan]),
+    ("AIR", "Inert", (1.0, 0.0), [np.nan]),
+    ("Glycol", "Inert", (0.0, 1.0), [np.nan]),
+]
+FLUID_P = [0.03, 0.05, 0.15, 0.06, 0.04, 0.04, 0.02, 0.12, 0.06, 0.14, 0.08, 0.03, 0.08, 0.03, 0.05, 0.02]
+# Default corrosion rates (mm/y) dominate real registers; the rest are measured
+INT_RATES = ([0.1, 0.05, 0.2, 0.001, 0.15], [0.70, 0.10, 0.06, 0.05, 0.04])
+EXT_RATES = ([0.025, 0.0], [0.75, 0.18])
+
+# Fraction of blank cells per column
+MISSING = {
+    "Driving PoF": 0.01,
+    "Int Corr Rate": 0.02,
+    "Ext Corr Rate": 0.02,
+    "Flamm Conseq Categ": 0.01,
+    "Toxic Conseq Cat": 0.70,
+    "Lost Production Category": 0.01,
+    "Representative Fluid": 0.01,
+    "Fluid Type": 0.01,
+    "Inventory": 0.01,
+    "Flammable Affected Area": 0.02,
+    "Int Controlling Corrosion Rate": 0.05,
+    "Controlling Corr Rate": 0.90,
+}
+
+def _choice(rng, values, p, n):
+    p = np.asarray(p, dtype=float)
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=n, p=p / p.sum())]
+
+def _rates(rng, spec, n, scale):
+    # Mostly default rates, the remainder lognormal "measured" values
+    values, p = spec
+    out = rng.lognormal(np.log(scale), 0.8, size=n)
+    pick = rng.random(n)
+    edges = np.cumsum(p)
+    for v, lo, hi in zip(values, np.r_[0.0, edges[:-1]], edges):
+        out[(pick >= lo) & (pick < hi)] = v
+    return out
+
+def synth_register(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    A register of `rows` components with every input column the engine reads.
+    Rule-relevant distributions follow the sample workbook; components are
+    numbered in units of ~200 and circuits of ~10.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(rows)
+
+    unit = np.cumsum(rng.random(n) < 1 / 200)
+    circuit = np.cumsum(rng.random(n) < 1 / 10)
+    comp = pd.Series([f"U{u:03d}CL{c:05d}-PI{i:07d}" for u, c, i in zip(unit, circuit, range(n))], dtype=object)
+
+    fluid_idx = rng.choice(len(FLUIDS), size=n, p=np.asarray(FLUID_P) / sum(FLUID_P))
+    fluid = np.array([f[0] for f in FLUIDS], dtype=object)[fluid_idx]
+    ftype = np.array([f[1] for f in FLUIDS], dtype=object)[fluid_idx]
+    gas_p = np.array([f[2][0] for f in FLUIDS])[fluid_idx]
+    phase = np.where(rng.random(n) < gas_p, "Gas", "Liquid").astype(object)
+    toxic = np.empty(n, dtype=object)
+    for k, (_, _, _, choices) in enumerate(FLUIDS):
+        sel = fluid_idx == k
+        toxic[sel] = _choice(rng, choices, [1] * len(choices), int(sel.sum()))
+
+    int_cr = _rates(rng, INT_RATES, n, 0.12)
+    ext_cr = _rates(rng, EXT_RATES, n, 0.15)
+    ccr = np.maximum(int_cr, ext_cr) * np.where(rng.random(n) < 0.9, 1.0, rng.uniform(0.5, 3.0, n))
+
+    df = pd.DataFrame({
+        "Component": comp,
+        "Risk Category": _choice(rng, *RISK, n),
+        "Driving PoF": _choice(rng, *POF, n),
+        "Int Corr Rate": int_cr,
+        "Ext Corr Rate": ext_cr,
+        "Inspection Priority": rng.integers(1, 26, size=n),
+        "Flamm Conseq Categ": _choice(rng, LETTERS, FLAMM, n),
+        "Toxic Conseq Cat": _choice(rng, LETTERS, TOXIC, n),
+        "Lost Production Category": _choice(rng, LETTERS, PROD, n),
+        "Representative Fluid": fluid,
+        "Fluid Type": ftype,
+        "Initial Fluid Phase": phase,
+        "Toxic Fluid": toxic,
+        "Inventory": rng.lognormal(np.log(9800), 1.3, size=n),
+        "Flammable Affected Area": rng.lognormal(np.log(525), 2.2, size=n),
+        "Int Controlling Corrosion Rate": ccr,
+        "Controlling Corr Rate": ccr,
+    })
+
+    for col, rate in MISSING.items():
+        df.loc[rng.random(n) < rate, col] = np.nan
+    # PoF as pd.read_excel gives it: ints, or floats once the column has blanks
+    df["Driving PoF"] = pd.to_numeric(df["Driving PoF"])
+    return df[REQUIRED_COLUMNS + OPTIONAL_COLUMNS]
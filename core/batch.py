@@ -0,0 +1,269 @@
+# core/batch.py
+# Headless batch mode: justify every workbook in a directory / glob with a process pool.
+#
+#   python -m core.batch registers/            # every register in the folder
+#   python -m core.batch "site_*/*.xlsx" -w 8  # glob, 8 worker processes
+#   python -m core.batch registers/ --incremental  # reuse rows unchanged since the last run
+#   python -m core.batch registers/ --log-json     # stage timings/counters as JSON lines on stderr
+#   python -m core.batch exports/*.parquet --format parquet  # CSV/Parquet in and out, no Excel round trip
+#   python -m core.batch site.xlsx --per-sheet        # all sheets, 3σ/CCR baselines per sheet (unit)
+#   python -m core.batch site.xlsx --group-by "Loop"  # all sheets, baselines per value of a column
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from . import instrument
+from .schema import missing_columns
+from .ingest import coerce_register, compact_frame
+from .generator import build_justification_column
+from .formats import EXTENSIONS, FORMATS, INPUT_COLUMNS, detect_format, read_register, write_register
+from .export import export_excel_sheets
+from .grouped import read_sheets, justify_sheets
+from .xlsxpatch import export_patched
+from .incremental import incremental_justifications
+from .stream import read_header, write_justified_xlsx
+
+DEFAULT_SUFFIX = "_justified"
+STAGES = ["read", "validate", "generate", "export"]
+
+def find_workbooks(patterns, suffix=DEFAULT_SUFFIX):
+    # Directories expand to their .xlsx/.csv/.parquet files; skips our own outputs and Excel lock files
+    found = []
+    for p in patterns:
+        if os.path.isdir(p):
+            paths = [f for ext in EXTENSIONS for f in glob.glob(os.path.join(p, f"*{ext}"))]
+        else:
+            paths = glob.glob(p)
+        for path in sorted(paths):
+            name = os.path.basename(path)
+            stem, ext = os.path.splitext(name)
+            if name.startswith("~$") or stem.endswith(suffix) or ext.lower() not in EXTENSIONS:
+                continue
+            if path not in found:
+                found.append(path)
+    return found
+
+def output_path(path, suffix=DEFAULT_SUFFIX, fmt=None):
+    # Same folder and format as the input unless `fmt` is given
+    stem, _ = os.path.splitext(path)
+    return f"{stem}{suffix}.{fmt or detect_format(path)}"
+
+def _read_grouped(path, group_by):
+    # {sheet: frame}: every sheet of a workbook; a CSV/Parquet file is one sheet named after it
+    if detect_format(path) == "xlsx":
+        return read_sheets(path)
+    columns = INPUT_COLUMNS + ([group_by] if group_by else [])
+    name = os.path.splitext(os.path.basename(path))[0][:31]
+    return {name: compact_frame(read_register(path, columns=columns))}
+
+def _write_grouped(sheets, out_path):
+    if detect_format(out_path) == "xlsx":
+        return export_excel_sheets(sheets, out_path)
+    if len(sheets) > 1:
+        raise ValueError(f"{len(sheets)} sheets need .xlsx output")
+    return write_register(next(iter(sheets.values())), out_path)
+
+def process_workbook(path, out_path=None, streaming=False, incremental=False, log_json=False,
+                     per_sheet=False, group_by=None, group_workers=1):
+    """
+    read -> validate -> generate -> export for one register (.xlsx, .csv or
+    .parquet; the output format follows `out_path`). Never raises;
+    returns a result dict with per-stage seconds and the error, if any.
+    With `incremental`, an existing output at `out_path` is the previous run:
+    unchanged rows keep their text and "reused" counts them.
+    "diagnostics" holds the full instrument snapshot (sub-stages, counters);
+    `log_json` also writes it as JSON log lines to stderr.
+    `per_sheet` / `group_by` read every sheet and scope the 3σ/CCR baselines
+    per sheet / per value of that column (core.grouped), generating groups
+    in `group_workers` processes; the output keeps the sheet layout.
+    """
+    out_path = out_path or output_path(path)
+    res = {"path": path, "out": out_path, "rows": 0, "reused": 0, "invalid": 0, "error": None}
+    rec = instrument.Recorder(logger=instrument.json_logger() if log_json else None)
+    start = time.perf_counter()
+    stage = "read"
+    try:
+        with instrument.recording(rec):
+            if per_sheet or group_by:
+                with rec.stage("read"):
+                    sheets = _read_grouped(path, group_by)
+                stage = "generate"
+                with rec.stage("generate"):
+                    sheets, info = justify_sheets(sheets, by=group_by, workers=group_workers)
+                res["invalid"] = info["invalid"]
+                res["groups"] = info["groups"]
+                res["skipped"] = list(info["skipped"])
+                stage = "export"
+                with rec.stage("export"):
+                    _write_grouped(sheets, out_path)
+                res["rows"] = sum(len(sheets[n]) for n in info["sheets"])
+            elif streaming:
+                if detect_format(path) != "xlsx" or detect_format(out_path) != "xlsx":
+                    raise ValueError("streaming mode reads and writes .xlsx only")
+                # Chunks are read, generated and written in one pass; account it as generate
+                stage = "validate"
+                with rec.stage("validate"):
+                    miss = missing_columns(pd.DataFrame(columns=read_header(path)))
+                if miss:
+                    raise ValueError(f"Missing required columns: {miss}")
+                stage = "generate"
+                with rec.stage("generate"):
+                    report = {}
+                    res["rows"] = write_justified_xlsx(path, out_path, report=report)
+                res["invalid"] = report.get("invalid", 0)
+            else:
+                with rec.stage("read"):
+                    df = compact_frame(read_register(path))
+                    prev = None
+                    if incremental and os.path.exists(out_path):
+                        prev = read_register(out_path, columns=None)
+
+                stage = "validate"
+                with rec.stage("validate"):
+                    miss = missing_columns(df)
+                    if miss:
+                        raise ValueError(f"Missing required columns: {miss}")
+                    typed, report = coerce_register(df)
+                    res["invalid"] = report["invalid"]
+                    if prev is not None:
+                        prev, _ = coerce_register(prev)
+
+                stage = "generate"
+                with rec.stage("generate"):
+                    if prev is not None:
+                        inc = {}
+                        df["Risk Justification"] = incremental_justifications(typed, prev, stats=inc)
+                        res["reused"] = inc["reused"]
+                    else:
+                        df["Risk Justification"] = build_justification_column(typed)
+
+                stage = "export"
+                with rec.stage("export"):
+                    if detect_format(path) == "xlsx" and detect_format(out_path) == "xlsx":
+                        # Only the justification column is written into a copy of the input
+                        patch = {}
+                        export_patched(df, out_path, path, report=patch)
+                        res["rebuilt"] = patch["reason"]
+                    else:
+                        write_register(df, out_path)
+                res["rows"] = len(df)
+    except Exception as e:
+        res["error"] = f"{stage}: {e}"
+    res["total"] = time.perf_counter() - start
+    snap = rec.snapshot()
+    res["timings"] = {s: snap["timings"][s]["total"] if s in snap["timings"] else 0.0 for s in STAGES}
+    res["diagnostics"] = snap
+    rec.log_summary(path=path, rows=res["rows"], error=res["error"], total=res["total"])
+    return res
+
+def run_batch(paths, workers=None, streaming=False, suffix=DEFAULT_SUFFIX, on_result=None,
+              incremental=False, log_json=False, fmt=None, per_sheet=False, group_by=None):
+    # Results come back in input order; on_result(res) fires as each file completes.
+    # Outputs keep each input's format unless `fmt` is given. Files run in parallel;
+    # a single grouped workbook spreads its groups over the workers instead.
+    jobs = [(p, output_path(p, suffix, fmt)) for p in paths]
+    grouped = {"per_sheet": per_sheet, "group_by": group_by}
+    results = {}
+    if (workers or os.cpu_count() or 1) <= 1 or len(jobs) <= 1:
+        for p, out in jobs:
+            results[p] = process_workbook(p, out, streaming, incremental, log_json, group_workers=workers, **grouped)
+            if on_result:
+                on_result(results[p])
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            futs = {ex.submit(process_workbook, p, out, streaming, incremental, log_json, **grouped): p
+                    for p, out in jobs}
+            for fut in as_completed(futs):
+                results[futs[fut]] = fut.result()
+                if on_result:
+                    on_result(results[futs[fut]])
+    return [results[p] for p, _ in jobs]
+
+def format_summary(results, wall):
+    name_w = max([len(os.path.basename(r["path"])) for r in results] + [4])
+    head = f"{'file':<{name_w}} {'rows':>8} " + " ".join(f"{s:>9}" for s in STAGES) + f" {'total':>8} {'rows/s':>9}"
+    lines = [head, "-" * len(head)]
+    for r in results:
+        name = os.path.basename(r["path"])
+        if r["error"]:
+            lines.append(f"{name:<{name_w}} FAILED  {r['error']}")
+            continue
+        rate = r["rows"] / r["total"] if r["total"] else 0.0
+        stages = " ".join(f"{r['timings'][s]:>8.2f}s" for s in STAGES)
+        lines.append(f"{name:<{name_w}} {r['rows']:>8} {stages} {r['total']:>7.2f}s {rate:>9.0f}")
+    ok = [r for r in results if not r["error"]]
+    rows = sum(r["rows"] for r in ok)
+    lines.append("-" * len(head))
+    lines.append(f"{len(ok)}/{len(results)} files, {rows} rows in {wall:.2f}s wall "
+                 f"({rows / wall if wall else 0:.0f} rows/s overall)")
+    reused = sum(r.get("reused", 0) for r in ok)
+    if reused:
+        lines.append(f"{reused}/{rows} rows reused from previous outputs")
+    groups = sum(r.get("groups", 0) for r in ok)
+    if groups:
+        lines.append(f"{groups} baseline groups (per sheet / per column value)")
+    invalid = sum(r.get("invalid", 0) for r in ok)
+    if invalid:
+        lines.append(f"{invalid} input cells failed the type checks")
+    rebuilt = [os.path.basename(r["path"]) for r in ok if r.get("rebuilt")]
+    if rebuilt:
+        lines.append(f"{len(rebuilt)} workbook(s) could not be patched and were rebuilt without "
+                     f"formatting: {', '.join(rebuilt)}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m core.batch",
+                                 description="Generate RBI risk justifications for many workbooks.")
+    ap.add_argument("paths", nargs="+", help="directories, .xlsx/.csv/.parquet files or glob patterns")
+    ap.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    ap.add_argument("--streaming", action="store_true", help="bounded-memory chunked mode for huge sheets")
+    ap.add_argument("--suffix", default=DEFAULT_SUFFIX, help="output file suffix (default: %(default)s)")
+    ap.add_argument("--format", choices=FORMATS, default=None,
+                    help="output format (default: same as each input)")
+    ap.add_argument("--incremental", action="store_true",
+                    help="diff against existing outputs and only regenerate changed rows")
+    ap.add_argument("--log-json", action="store_true",
+                    help="write per-stage timings and counters as JSON lines to stderr")
+    ap.add_argument("--per-sheet", action="store_true",
+                    help="read every sheet; 3σ/CCR baselines per sheet, same sheet layout in the output")
+    ap.add_argument("--group-by", metavar="COLUMN",
+                    help="read every sheet; 3σ/CCR baselines per value of COLUMN (e.g. unit or corrosion loop)")
+    args = ap.parse_args(argv)
+    if args.incremental and args.streaming:
+        ap.error("--incremental needs the in-memory mode (drop --streaming)")
+    if (args.per_sheet or args.group_by) and (args.streaming or args.incremental):
+        ap.error("--per-sheet/--group-by can't be combined with --streaming or --incremental")
+
+    paths = find_workbooks(args.paths, args.suffix)
+    if not paths:
+        print("No .xlsx, .csv or .parquet files found.", file=sys.stderr)
+        return 2
+
+    def progress(r):
+        status = "failed" if r["error"] else f"{r['rows']} rows in {r['total']:.2f}s"
+        if r.get("reused"):
+            status += f", {r['reused']} reused"
+        if r.get("invalid"):
+            status += f", {r['invalid']} invalid cells"
+        if r.get("groups"):
+            status += f", {r['groups']} groups"
+        if r.get("skipped"):
+            status += f", skipped sheets {r['skipped']}"
+        if r.get("rebuilt"):
+            status += f", workbook rebuilt without formatting ({r['rebuilt']})"
+        print(f"[done] {os.path.basename(r['path'])}: {status}", file=sys.stderr)
+
+    start = time.perf_counter()
+    results = run_batch(paths, args.workers, args.streaming, args.suffix, on_result=progress,
+                        incremental=args.incremental, log_json=args.log_json, fmt=args.format,
+                        per_sheet=args.per_sheet, group_by=args.group_by)
+    print(format_summary(results, time.perf_counter() - start))
+    return 1 if any(r["error"] for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+# core/cache.py
+# Content-addressed on-disk cache for polished justifications (SQLite).
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.environ.get("RBI_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "rbi-justifier"))
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIR, "polish.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS polish (
+    key        TEXT PRIMARY KEY,
+    model_text TEXT NOT NULL,
+    kept       INTEGER NOT NULL,
+    created    REAL NOT NULL,
+    last_used  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS polish_last_used ON polish (last_used);
+"""
+
+def cache_key(model_id: str, system: str, payload: dict, draft_text: str) -> str:
+    # Any change to model, prompt, facts or draft gives a new key
+    blob = json.dumps(
+        [model_id, system, json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str), draft_text],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class PolishCache:
+    """
+    Stores the raw model reply and the safe_keep_or_fallback verdict per key.
+    Entries older than `max_age_days` are dropped and the least recently used
+    ones are trimmed beyond `max_entries` (checked on open and every
+    `evict_every` writes). Counts hits/misses for the current process.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=200_000, max_age_days=90, evict_every=1000):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.evict_every = evict_every
+        self.hits = self.misses = self.writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.evict()
+
+    def get(self, key):
+        # (model_text, kept) or None
+        with self._lock:
+            row = self._conn.execute("SELECT model_text, kept FROM polish WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE polish SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0], bool(row[1])
+
+    def put(self, key, model_text, kept):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO polish (key, model_text, kept, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model_text, int(bool(kept)), now, now),
+            )
+            self.writes += 1
+            due = self.evict_every and self.writes % self.evict_every == 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        # Returns the number of rows removed
+        removed = 0
+        with self._lock:
+            if self.max_age:
+                cur = self._conn.execute("DELETE FROM polish WHERE created < ?", (time.time() - self.max_age,))
+                removed += cur.rowcount
+            if self.max_entries:
+                (count,) = self._conn.execute("SELECT COUNT(*) FROM polish").fetchone()
+                if count > self.max_entries:
+                    cur = self._conn.execute(
+                        "DELETE FROM polish WHERE key IN "
+                        "(SELECT key FROM polish ORDER BY last_used ASC LIMIT ?)",
+                        (count - self.max_entries,),
+                    )
+                    removed += cur.rowcount
+        return removed
+
+    def stats(self):
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM polish").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits, "misses": self.misses, "entries": entries,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM polish")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
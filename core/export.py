@@ -0,0 +1,17 @@
+# core/export.py
+import pandas as pd
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def export_excel(df: pd.DataFrame, out, sheet_name="Table1"):
+    # `out` is a path or a binary file object (e.g. BytesIO for st.download_button)
+    with pd.ExcelWriter(out, engine="xlsxwriter") as writer:
+        df.to_excel(writer, sheet_name=sheet_name, index=False)
+    return out
+
+def export_excel_sheets(sheets, out):
+    # {sheet name: DataFrame} -> one workbook, sheets in dict order
+    with pd.ExcelWriter(out, engine="xlsxwriter") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    return out
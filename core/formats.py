@@ -0,0 +1,103 @@
+# core/formats.py
+# Register file formats: .xlsx (the template), .csv and .parquet. CSV and
+# Parquet are what large registers should use: both are parsed by pyarrow
+# (multi-threaded, no openpyxl) and only the engine's input columns are read.
+#
+#   df = read_register("register.parquet")        # format from the extension
+#   write_register(df, "out.csv")                 # or fmt="parquet" / "xlsx"
+#
+# pandas is imported by the functions that need it, so the app can list the
+# formats and check file names before the data stack has loaded.
+import io
+import os
+
+from .schema import REQUIRED_COLUMNS, OPTIONAL_COLUMNS
+
+FORMATS = ["xlsx", "csv", "parquet"]
+EXTENSIONS = {".xlsx": "xlsx", ".csv": "csv", ".parquet": "parquet", ".pq": "parquet"}
+MIME_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",  # = export.XLSX_MIME
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+INPUT_COLUMNS = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+
+def detect_format(name):
+    # "xlsx" / "csv" / "parquet" from a file name; ValueError for anything else
+    ext = os.path.splitext(str(name))[1].lower()
+    if ext not in EXTENSIONS:
+        raise ValueError(f"Unsupported file type {ext or name!r}; expected one of {', '.join(EXTENSIONS)}")
+    return EXTENSIONS[ext]
+
+def _rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return source
+
+def read_columns(source, fmt):
+    # Column names without reading the data
+    if fmt == "csv":
+        import pandas as pd
+        cols = pd.read_csv(_rewind(source), nrows=0).columns
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+        cols = pq.read_schema(_rewind(source)).names
+    else:
+        from .stream import read_header
+        cols = read_header(_rewind(source))
+    _rewind(source)
+    return list(cols)
+
+def read_register(source, fmt=None, columns=INPUT_COLUMNS):
+    """
+    Register at `source` (path or binary file object) as a DataFrame.
+    `fmt` defaults to the path's extension. CSV and Parquet read only the
+    `columns` present in the file (None: all); .xlsx always reads the whole
+    first sheet, as the exported workbook keeps every uploaded column.
+    """
+    import pandas as pd
+    fmt = fmt or detect_format(source)
+    if fmt == "xlsx":
+        return pd.read_excel(_rewind(source), sheet_name=0)
+    use = None
+    if columns is not None:
+        have = read_columns(source, fmt)
+        use = [c for c in have if c in set(columns)]
+    if fmt == "csv":
+        return pd.read_csv(_rewind(source), usecols=use, engine="pyarrow")
+    if fmt == "parquet":
+        return pd.read_parquet(_rewind(source), columns=use)
+    raise ValueError(f"Unknown format {fmt!r}; expected one of {FORMATS}")
+
+def _arrow_safe(df):
+    # Parquet columns need one type; object columns mixing e.g. numbers and
+    # text (as read from Excel) are written as text, blanks stay null
+    import pandas as pd
+    out = df.copy(deep=False)
+    for col in df.columns:
+        s = df[col]
+        values = s.cat.categories if isinstance(s.dtype, pd.CategoricalDtype) else s.dropna().unique()
+        if (s.dtype == object or isinstance(s.dtype, pd.CategoricalDtype)) and \
+                len({type(v) for v in values}) > 1:
+            text = s.astype(object)
+            out[col] = text.where(text.isna(), text.astype(str))
+    return out
+
+def write_register(df, out, fmt=None):
+    # `out` is a path or a binary file object; `fmt` defaults to the path's extension
+    fmt = fmt or detect_format(out)
+    if fmt == "xlsx":
+        from .export import export_excel
+        return export_excel(df, out)
+    if fmt == "csv":
+        if isinstance(out, (str, os.PathLike)):
+            df.to_csv(out, index=False)
+        else:
+            wrapper = io.TextIOWrapper(out, encoding="utf-8", newline="")
+            df.to_csv(wrapper, index=False)
+            wrapper.detach()
+        return out
+    if fmt == "parquet":
+        _arrow_safe(df).to_parquet(out, index=False)
+        return out
+    raise ValueError(f"Unknown format {fmt!r}; expected one of {FORMATS}")
@@ -1,8 +1,11 @@
 # core/generator.py
+import numpy as np
 import pandas as pd
+from . import instrument
+from .stats import RunningStats
 from .rules import (
-    three_sigma_levels, classify_three_sigma, governing_cof,
-    classify_ccr, opener_sentence, pof_band_short, ccr_short, inspection_text
+    three_sigma_from_stats, classify_three_sigma_array, governing_cof,
+    classify_ccr_array, service_phrases, compiled_rules
 )
 
 def _get(row, key):
@@ -37,77 +40,307 @@ def _ccr(row):
         except Exception: pass
     return max(vals) if vals else None
 
-def build_all_justifications(df: pd.DataFrame):
+# ------------------------
+# Column helpers (whole-column equivalents of the per-row logic above)
+# ------------------------
+def _column(df, key):
+    # Object array holding what `_get(row, key)` returns for every row
+    if key not in df.columns:
+        return np.full(len(df), None, dtype=object)
+    return _values(df[key])
+
+def _values(s):
+    vals = s.astype(object).to_numpy(copy=True)
+    vals[s.isna().to_numpy()] = None
+    return vals
+
+def _factorize(vals):
+    # Codes plus one representative value per code. Object columns are keyed on
+    # (type, value) so that 1, 1.0 and True stay apart: str() tells them apart.
+    codes, _ = pd.factorize(vals, use_na_sentinel=False)
+    if vals.dtype == object and len(vals):
+        tcodes, _ = pd.factorize(np.frompyfunc(type, 1, 1)(vals))
+        codes, _ = pd.factorize(codes.astype(np.int64) * (int(tcodes.max()) + 1) + tcodes)
+    _, first = np.unique(codes, return_index=True)
+    return codes, vals[first]
+
+def _map_unique(vals, fn):
+    # fn() evaluated once per distinct value, broadcast back by code
+    codes, uniq = _factorize(vals)
+    out = np.empty(len(uniq), dtype=object)
+    out[:] = [fn(u) for u in uniq]
+    return out[codes]
+
+def _float_column(vals):
+    # float() of every non-null cell; `ok` is False where the cell is null or float() fails
+    codes, uniq = _factorize(vals)
+    num = np.full(len(uniq), np.nan)
+    ok = np.zeros(len(uniq), dtype=bool)
+    for i, u in enumerate(uniq):
+        if u is None:
+            continue
+        try:
+            num[i] = float(u)
+            ok[i] = True
+        except Exception:
+            pass
+    return num[codes], ok[codes]
+
+def _numeric_column(df, key):
+    # (values, ok) as _float_column(_column(df, key)); typed columns (see ingest.py)
+    # skip the per-value float() fallback
+    if key in df.columns and pd.api.types.is_numeric_dtype(df[key]):
+        num = df[key].to_numpy(dtype=float, na_value=np.nan)
+        return num, ~np.isnan(num)
+    return _float_column(_column(df, key))
+
+def ccr_column(df):
+    # Vectorized _ccr(): float array, NaN where _ccr() returns None
+    ccr, have = _numeric_column(df, "Int Controlling Corrosion Rate")
+    legacy, legacy_ok = _numeric_column(df, "Controlling Corr Rate")
+    int_cr, int_ok = _numeric_column(df, "Int Corr Rate")
+    ext_cr, ext_ok = _numeric_column(df, "Ext Corr Rate")
+
+    # max([int, ext]) keeps the first value unless the second is strictly greater
+    both = np.where(ext_cr > int_cr, ext_cr, int_cr)
+    fallback = np.where(int_ok & ext_ok, both, np.where(int_ok, int_cr, np.where(ext_ok, ext_cr, np.nan)))
+    return np.where(have, ccr, np.where(legacy_ok, legacy, fallback))
+
+def _pof_int(pof):
+    return int(pof) if (pof is not None and str(pof).strip().isdigit()) else None
+
+def _risk_text(v):
+    return str(v or "").strip() or "N/A"
+
+def _encoded(df, key):
+    # (codes, values) with values[codes] == _column(df, key)
+    if key not in df.columns:
+        return _factorize(_column(df, key))
+    return _encode(df[key])
+
+def _encode(s):
+    # Categorical columns (see ingest.py) reuse their own codes instead of hashing every cell
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        cat = s.array
+        values = np.empty(len(cat.categories) + 1, dtype=object)  # last slot: missing (None)
+        values[:-1] = cat.categories.to_numpy(dtype=object)
+        codes = cat.codes.astype(np.int64)
+        codes[codes < 0] = len(values) - 1
+        return codes, values
+    return _factorize(_values(s))
+
+def _map_encoded(enc, fn):
+    # fn() once per distinct value; re-encoded so equal results share a code
+    codes, values = enc
+    out = np.empty(len(values), dtype=object)
+    out[:] = [fn(v) for v in values]
+    remap, uniq = _factorize(out)
+    return remap[codes], uniq
+
+def _labels(vals):
+    # Encoding of a per-row label array (3σ level, CCR label)
+    codes, uniq = pd.factorize(vals)
+    return codes.astype(np.int64), np.asarray(uniq, dtype=object)
+
+def _at(enc, i):
+    return enc[1][enc[0][i]]
+
+def _combine(*encs):
+    # Codes for each distinct combination of the given encodings + index of its first row;
+    # only len(values) is used, so any sized table works as the second item
+    key = np.zeros(len(encs[0][0]), dtype=np.int64)
+    for codes, values in encs:
+        key = key * (len(values) + 1) + codes
+    codes, _ = pd.factorize(key)
+    _, first = np.unique(codes, return_index=True)
+    return codes.astype(np.int64), first
+
+def _na(v):
+    return "N/A" if v is None else v
+
+def dataset_stats(df: pd.DataFrame, ccr_vals=None):
+    """
+    Mergeable accumulators (Inventory, FAA, CCR) for this frame. Accumulators
+    from several chunks or shards can be merged and passed to levels_from_stats.
+    """
+    if ccr_vals is None:
+        ccr_vals = ccr_column(df)
+    return (
+        RunningStats.of(df["Inventory"]),
+        RunningStats.of(df["Flammable Affected Area"]),
+        RunningStats.of(ccr_vals),
+    )
+
+def levels_from_stats(inv, fa, ccr):
+    """
+    Dataset-level thresholds the wording depends on: 3σ bounds for Inventory
+    and FAA plus the CCR mean/std used for the spike override.
+    """
     # 3σ levels for Inventory & FAA (qualitative only)
-    _, _, inv_lo, inv_hi = three_sigma_levels(df["Inventory"])
-    _, _, fa_lo,  fa_hi  = three_sigma_levels(df["Flammable Affected Area"])
+    _, _, inv_lo, inv_hi = three_sigma_from_stats(inv)
+    _, _, fa_lo,  fa_hi  = three_sigma_from_stats(fa)
 
     # Dataset CCR stats (for conservative spike override)
-    ccr_series = df.apply(lambda r: _ccr(r), axis=1)
-    try:
-        ccr_mean = float(pd.Series(ccr_series).mean())
-        ccr_std  = float(pd.Series(ccr_series).std(ddof=0))
-    except Exception:
-        ccr_mean, ccr_std = None, None
-
-    out = []
-    for _, r in df.iterrows():
-        risk_cat = str(_get(r, "Risk Category") or "").strip() or "N/A"
-        pof      = _get(r, "Driving PoF")
-        pof_int  = int(pof) if (pof is not None and str(pof).strip().isdigit()) else None
-
-        # Service descriptors (always try Representative Fluid first; fallback to Fluid Type)
-        fluid    = _get(r, "Representative Fluid") or _get(r, "Fluid Type")
-        phase    = _get(r, "Initial Fluid Phase")
-        toxic    = _get(r, "Toxic Fluid")
-
-        # CoF categories
-        flam     = _get(r, "Flamm Conseq Categ")
-        tox_cat  = _get(r, "Toxic Conseq Cat")
-        prod_cat = _get(r, "Lost Production Category")
-
-        # Qualitative levels (no numbers in text)
-        inv_level = classify_three_sigma(_get(r, "Inventory"), inv_lo, inv_hi)
-        fa_level  = classify_three_sigma(_get(r, "Flammable Affected Area"), fa_lo, fa_hi)
-
-        # Governing CoF
-        cof_letter, drivers = governing_cof(flam, tox_cat, prod_cat)
-
-        # CCR classification
-        ccr_val   = _ccr(r)
-        ccr_label = classify_ccr(ccr_val, ccr_mean, ccr_std)
-
-        # -------- Sentence 1: Opener (reason-first, includes fluid + phase if available)
-        opener = opener_sentence(
-            pof=pof_int,
-            cof_letter=cof_letter,
-            drivers=drivers,
-            fluid=fluid,
-            phase=phase,
-            toxic=toxic,
-            inv_level=inv_level,
-            fa_level=fa_level,
-            prod_cat=prod_cat,
-            ccr_label=ccr_label
-        )
-        s1 = f"The risk is {risk_cat}, {opener}."
-
-        # -------- Sentence 2: Compact PoF + CCR + inspection + CoF summary (no repeated reasons)
-        pof_txt  = pof_band_short(pof_int)
-        ccr_txt  = ccr_short(ccr_label)
-        insp_txt = inspection_text(risk_cat, _get(r, "Inspection Priority"))
-
-        flam_txt = flam if flam is not None else "N/A"
-        tox_txt  = tox_cat if tox_cat is not None else "N/A"
-        prod_txt = prod_cat if prod_cat is not None else "N/A"
-        cof_txt  = cof_letter if cof_letter else "N/A"
-
-        s2 = (
-            f"{pof_txt}; {ccr_txt}; {insp_txt}. "
-            f"Flam/Tox/Prod = {flam_txt}/{tox_txt}/{prod_txt}; "
-            f"with CoF governed by Category {cof_txt}, the profile remains {risk_cat}."
-        )
-
-        out.append(f"{s1} {s2}".strip())
-
-    return out
+    ccr_mean, ccr_std = ccr.mean_std()
+
+    return {
+        "inv_lo": inv_lo, "inv_hi": inv_hi,
+        "fa_lo": fa_lo, "fa_hi": fa_hi,
+        "ccr_mean": ccr_mean, "ccr_std": ccr_std,
+    }
+
+def dataset_levels(df: pd.DataFrame, ccr_vals=None):
+    with instrument.stage("stats"):
+        return levels_from_stats(*dataset_stats(df, ccr_vals))
+
+def dataset_classes(df: pd.DataFrame, levels, ccr_vals=None):
+    """
+    The per-row classes that depend on dataset statistics: (fa_level, ccr_label).
+    Qualitative only (no numbers in text); only FAA and CCR reach the wording.
+    """
+    if ccr_vals is None:
+        ccr_vals = ccr_column(df)
+    fa_level = classify_three_sigma_array(
+        _numeric_column(df, "Flammable Affected Area")[0], levels["fa_lo"], levels["fa_hi"]
+    )
+    ccr_label = classify_ccr_array(ccr_vals, levels["ccr_mean"], levels["ccr_std"])
+    return fa_level, ccr_label
+
+def _inputs(df, levels, ccr_vals):
+    # Column-wise rule inputs, each as (codes, distinct values)
+    risk_cat = _map_encoded(_encoded(df, "Risk Category"), _risk_text)
+    pof_int  = _map_encoded(_encoded(df, "Driving PoF"), _pof_int)
+
+    # Service descriptors (always try Representative Fluid first; fallback to Fluid Type)
+    rep, ftype = _encoded(df, "Representative Fluid"), _encoded(df, "Fluid Type")
+    f_codes, first = _combine(rep, ftype)
+    fluid = (f_codes, np.empty(len(first), dtype=object))
+    fluid[1][:] = [_at(rep, i) or _at(ftype, i) for i in first]
+    phase = _encoded(df, "Initial Fluid Phase")
+    toxic = _encoded(df, "Toxic Fluid")
+
+    # CoF categories
+    flam     = _encoded(df, "Flamm Conseq Categ")
+    tox_cat  = _encoded(df, "Toxic Conseq Cat")
+    prod_cat = _encoded(df, "Lost Production Category")
+
+    fa_level, ccr_label = (_labels(v) for v in dataset_classes(df, levels, ccr_vals))
+    return risk_cat, pof_int, fluid, phase, toxic, flam, tox_cat, prod_cat, fa_level, ccr_label
+
+def _build(df, levels=None, with_payloads=False):
+    with instrument.stage("generate.ccr"):
+        ccr_vals = ccr_column(df)
+    if levels is None:
+        levels = dataset_levels(df, ccr_vals)
+
+    with instrument.stage("generate.inputs"):
+        (risk_cat, pof_int, fluid, phase, toxic,
+         flam, tox_cat, prod_cat, fa_level, ccr_label) = _inputs(df, levels, ccr_vals)
+
+    # governing_cof() once per distinct (flam, tox, prod); drivers as key tuples (insertion order)
+    with instrument.stage("generate.cof"):
+        cof_codes, first = _combine(flam, tox_cat, prod_cat)
+        cof = []
+        for i in first:
+            letter, drv = governing_cof(_at(flam, i), _at(tox_cat, i), _at(prod_cat, i))
+            cof.append((letter, tuple(drv)))
+
+    # -------- Templates from the compiled rule table, once per distinct rule key
+    with instrument.stage("generate.templates"):
+        table = compiled_rules()
+        tpl_codes, first = _combine(pof_int, (cof_codes, cof), fa_level, ccr_label, risk_cat)
+        templates = [table.row(_at(pof_int, i), *cof[cof_codes[i]], _at(fa_level, i), _at(ccr_label, i),
+                               _at(risk_cat, i)) for i in first]
+
+    # Free-text service phrases, once per distinct (fluid, phase, toxic)
+    with instrument.stage("generate.service"):
+        svc_codes, first = _combine(fluid, phase, toxic)
+        phrases = [service_phrases(_at(fluid, i), _at(phase, i), _at(toxic, i)) for i in first]
+
+    # -------- Row signature = template (incl. raw letters) + service phrase (only when the
+    # template uses it); one format call per signature
+    with instrument.stage("generate.format"):
+        uses_service = np.array(["{reason}" in t or "{service}" in t for t in templates], dtype=bool)
+        svc_key = np.where(uses_service[tpl_codes], svc_codes, -1) if len(templates) else svc_codes
+        codes, first = _combine((tpl_codes, templates), (svc_key + 1, range(len(phrases) + 1)))
+        texts = []
+        for i in first:
+            service, reason = phrases[svc_codes[i]]
+            texts.append(templates[tpl_codes[i]].format(
+                risk=_at(risk_cat, i), reason=reason, service=service or "service",
+                flam=_na(_at(flam, i)), tox=_na(_at(tox_cat, i)), prod=_na(_at(prod_cat, i)),
+            ))
+
+        # Different signatures can still read the same; keep one entry per distinct text
+        remap, uniq = pd.factorize(np.asarray(texts, dtype=object))
+        codes, texts = remap[codes], list(uniq)
+        first = first[np.unique(remap, return_index=True)[1]]
+    if instrument.enabled():
+        instrument.count("generate.rows", len(codes))
+        instrument.count("generate.templates", len(templates))
+        instrument.count("generate.signatures", len(remap))
+        instrument.count("generate.texts", len(texts))
+    if not with_payloads:
+        return codes, texts, None
+
+    # Facts the polished text has to keep (checked by validate.safe_keep_or_fallback);
+    # everything here is fixed by the text, so one payload per distinct text
+    letter = lambda v: None if v is None else str(v)
+    payloads = []
+    for i in first:
+        pof = _at(pof_int, i)
+        payloads.append({
+            "pof": pof if pof in (1, 2, 3, 4, 5) else None,  # drafts only state 1..5
+            "governing_cof": cof[cof_codes[i]][0],
+            "risk_category": _at(risk_cat, i),
+            "flamm_cat": letter(_at(flam, i)),
+            "tox_cat": letter(_at(tox_cat, i)),
+            "prod_cat": letter(_at(prod_cat, i)),
+            "ccr_label": _at(ccr_label, i),
+            "fa_level": _at(fa_level, i),
+        })
+    return codes, texts, payloads
+
+def build_unique_justifications(df: pd.DataFrame, levels=None):
+    """
+    Justifications deduplicated on each row's effective inputs (after
+    normalisation and 3σ/CCR classification). Returns (codes, texts) where
+    texts[codes[i]] is the justification for row i.
+
+    `levels` (from dataset_levels) lets a caller that only holds part of the
+    register (chunked or sharded runs) classify against whole-dataset thresholds.
+    """
+    codes, texts, _ = _build(df, levels)
+    return codes, texts
+
+def build_polish_items(df: pd.DataFrame, levels=None):
+    # (codes, drafts, payloads): one LLM polishing item per distinct justification
+    return _build(df, levels, with_payloads=True)
+
+def dedup_stats(codes, texts):
+    rows, unique = len(codes), len(texts)
+    return {"rows": rows, "unique": unique, "dedup_ratio": (rows / unique) if unique else 1.0}
+
+def justification_column(codes, texts):
+    """
+    Dictionary-encoded justifications: a pd.Categorical over the distinct texts,
+    so a large register holds one int code per row until it is written out.
+    `texts` may repeat (e.g. after polishing); equal texts share a category.
+    """
+    remap, uniq = pd.factorize(np.asarray(texts, dtype=object))
+    codes = np.asarray(codes, dtype=np.int64)
+    return pd.Categorical.from_codes(remap[codes] if len(codes) else codes, categories=uniq)
+
+def build_justification_column(df: pd.DataFrame, stats=None, levels=None):
+    # build_all_justifications as a pd.Categorical (see justification_column)
+    codes, texts = build_unique_justifications(df, levels=levels)
+    if stats is not None:
+        stats.update(dedup_stats(codes, texts))
+    return justification_column(codes, texts)
+
+def build_all_justifications(df: pd.DataFrame, stats=None, levels=None):
+    # `stats` (optional dict) receives rows / unique / dedup_ratio
+    codes, texts = build_unique_justifications(df, levels=levels)
+    if stats is not None:
+        stats.update(dedup_stats(codes, texts))
+    return np.asarray(texts, dtype=object)[codes].tolist()
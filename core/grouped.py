@@ -0,0 +1,180 @@
+# core/grouped.py
+# Grouped processing: 3σ (Inventory, FAA) and CCR baselines scoped per group
+# instead of across the whole register. A group is a sheet of the workbook
+# (one sheet per process unit) or a value of a chosen column (unit, corrosion
+# loop). Group statistics come from one groupby pass over the stacked
+# register; groups are then generated in worker processes against their own
+# levels and written back with the original sheet layout.
+#
+#   sheets = read_sheets("site.xlsx")
+#   out, info = justify_sheets(sheets)                 # baseline per sheet
+#   out, info = justify_sheets(sheets, by="Unit")      # baseline per Unit value
+#   export_excel_sheets(out, "site_justified.xlsx")
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from . import instrument
+from .schema import missing_columns
+from .stats import RunningStats
+from .ingest import coerce_register, compact_frame
+from .generator import (
+    build_unique_justifications, ccr_column, dedup_stats, justification_column, levels_from_stats,
+)
+from .parallel import DEFAULT_SHARD_ROWS, _input_frame, merge_text_tables
+from .stream import OUTPUT_COLUMN
+
+BLANK_GROUP = "(blank)"
+
+def group_codes(labels):
+    # (codes, names): one int code per row; blank labels form their own group
+    codes, uniq = pd.factorize(pd.Series(labels, dtype=object), use_na_sentinel=False)
+    names = [BLANK_GROUP if pd.isna(u) else u for u in uniq]
+    return codes.astype(np.int64), names
+
+def group_stats(df: pd.DataFrame, codes, n_groups=None):
+    """
+    Per-group (Inventory, FAA, CCR) accumulators, as dataset_stats() gives for
+    the whole frame: one groupby over the three columns for count, mean and
+    population variance. Returns a list indexed by group code.
+    """
+    n_groups = int(codes.max()) + 1 if n_groups is None and len(codes) else (n_groups or 0)
+    values = pd.DataFrame({
+        "inv": pd.to_numeric(df["Inventory"], errors="coerce").to_numpy(dtype=float),
+        "fa": pd.to_numeric(df["Flammable Affected Area"], errors="coerce").to_numpy(dtype=float),
+        "ccr": ccr_column(df),
+    })
+    g = values.groupby(codes, sort=True)
+    n, mean, var = g.count(), g.mean(), g.var(ddof=0)
+    out = []
+    for k in range(n_groups):
+        if k not in n.index:
+            out.append((RunningStats(), RunningStats(), RunningStats()))
+            continue
+        out.append(tuple(
+            RunningStats(int(n.at[k, c]), float(mean.at[k, c]) if n.at[k, c] else 0.0,
+                         float(var.at[k, c]) * int(n.at[k, c]) if n.at[k, c] else 0.0)
+            for c in ("inv", "fa", "ccr")
+        ))
+    return out
+
+def group_levels(df: pd.DataFrame, codes, n_groups=None):
+    # levels_from_stats() per group code
+    with instrument.stage("stats"):
+        return [levels_from_stats(*s) for s in group_stats(df, codes, n_groups)]
+
+def _groups_worker(tasks):
+    return [build_unique_justifications(frame, levels=levels) for frame, levels in tasks]
+
+def _tasks(order, bounds, levels, shard_rows):
+    # Consecutive groups packed into tasks of about `shard_rows` rows (small units share a task)
+    tasks, cur, size = [], [], 0
+    for k in range(len(levels)):
+        rows = order[bounds[k]:bounds[k + 1]]
+        if not len(rows):
+            continue
+        if cur and size + len(rows) > shard_rows:
+            tasks.append(cur)
+            cur, size = [], 0
+        cur.append((k, rows))
+        size += len(rows)
+    if cur:
+        tasks.append(cur)
+    return tasks
+
+def build_grouped_unique_justifications(df: pd.DataFrame, labels, workers=None, shard_rows=DEFAULT_SHARD_ROWS,
+                                        executor=None):
+    """
+    build_unique_justifications() with the dataset levels computed per group
+    (`labels` holds one group label per row, e.g. df["Unit"]). Groups are
+    generated in up to `workers` processes, or on `executor` (an existing
+    process pool) when given; returns (codes, texts) for the rows in their
+    original order.
+    """
+    codes, names = group_codes(labels)
+    levels = group_levels(df, codes, len(names))
+    instrument.count("group.groups", len(names))
+
+    frame = _input_frame(df)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.r_[0, np.cumsum(np.bincount(codes, minlength=len(names)))]
+    tasks = _tasks(order, bounds, levels, max(int(shard_rows), 1))
+    work = [[(frame.iloc[rows], levels[k]) for k, rows in task] for task in tasks]
+
+    workers = workers or os.cpu_count() or 1
+    if executor is not None:
+        results = list(executor.map(_groups_worker, work))
+    elif workers <= 1 or len(work) <= 1:
+        results = [_groups_worker(w) for w in work]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(work))) as ex:
+            results = list(ex.map(_groups_worker, work))
+
+    parts, texts = merge_text_tables([r for res in results for r in res])
+    out = np.zeros(len(df), dtype=np.int64)
+    for (k, rows), part in zip([g for task in tasks for g in task], parts):
+        out[rows] = part
+    return out, texts
+
+def build_grouped_justification_column(df: pd.DataFrame, labels, workers=None, stats=None):
+    # build_grouped_unique_justifications as a pd.Categorical (see generator.justification_column)
+    codes, texts = build_grouped_unique_justifications(df, labels, workers)
+    if stats is not None:
+        stats.update(dedup_stats(codes, texts))
+    return justification_column(codes, texts)
+
+# ------------------------
+# Workbooks with several sheets
+# ------------------------
+def read_sheets(source):
+    # {sheet name: dictionary-encoded frame} for every sheet, in workbook order
+    return {name: compact_frame(df) for name, df in pd.read_excel(source, sheet_name=None).items()}
+
+def justify_sheets(sheets, by=None, workers=None, stats=None):
+    """
+    Justify every sheet that has the required columns, with baselines per
+    sheet (`by` None) or per value of column `by` across all sheets. Other
+    sheets are passed through unchanged.
+
+    Returns (sheets, info): the same sheet names in the same order, each
+    justified one with OUTPUT_COLUMN set, and info = {"sheets", "skipped":
+    {name: reason}, "groups", "invalid", "reports": {name: ingest report}}.
+    `stats` (optional dict) receives rows / unique / dedup_ratio.
+    """
+    info = {"sheets": [], "skipped": {}, "groups": 0, "invalid": 0, "reports": {}}
+    typed, labels = [], []
+    for name, df in sheets.items():
+        miss = missing_columns(df)
+        if by is not None and by not in df.columns:
+            miss = miss + [by]
+        if miss:
+            info["skipped"][name] = f"missing columns: {', '.join(miss[:3])}" + (" ..." if len(miss) > 3 else "")
+            continue
+        t, report = coerce_register(df)
+        info["sheets"].append(name)
+        info["reports"][name] = report
+        info["invalid"] += report["invalid"]
+        typed.append(_input_frame(t))
+        labels.append(np.full(len(df), name, dtype=object) if by is None else df[by].to_numpy(dtype=object))
+    if not typed:
+        raise ValueError("No sheet has the required columns: "
+                         + "; ".join(f"{n}: {r}" for n, r in info["skipped"].items()))
+
+    with instrument.stage("group.stack"):
+        stacked = pd.concat(typed, ignore_index=True)
+        labels = np.concatenate(labels)
+    column = build_grouped_justification_column(stacked, labels, workers, stats)
+    info["groups"] = len(group_codes(labels)[1])
+
+    out, start = {}, 0
+    for name, df in sheets.items():
+        if name not in info["reports"]:
+            out[name] = df
+            continue
+        df = df.copy(deep=False)
+        df[OUTPUT_COLUMN] = column[start:start + len(df)]
+        start += len(df)
+        out[name] = df
+    return out, info
@@ -0,0 +1,95 @@
+# core/incremental.py
+# Incremental re-generation: match rows of a new register revision to the
+# previous output workbook (keyed on Component) and only recompute rows whose
+# inputs changed or whose dataset-dependent class (FAA 3σ level, CCR label)
+# moved. Everything else, polished text included, is carried forward.
+import numpy as np
+import pandas as pd
+
+from .schema import REQUIRED_COLUMNS, OPTIONAL_COLUMNS
+from .generator import (
+    _column, _encoded, build_justification_column, ccr_column, dataset_classes, dataset_levels,
+)
+from .stream import OUTPUT_COLUMN
+
+INPUT_COLUMNS = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
+
+def _cell_keys(df, key):
+    # Type-tagged repr per cell: 3 and 3.0 print differently in the text, so they must not match
+    codes, uniq = _encoded(df, key)
+    keys = np.array(["" if u is None else f"{type(u).__name__}:{u!r}" for u in uniq], dtype=object)
+    return keys[codes]
+
+def row_fingerprints(df: pd.DataFrame):
+    # uint64 per row over every rule input column (absent columns count as empty)
+    if not len(df):
+        return np.zeros(0, dtype=np.uint64)
+    cells = pd.DataFrame({c: pd.util.hash_array(_cell_keys(df, c)) for c in INPUT_COLUMNS})
+    return pd.util.hash_pandas_object(cells, index=False).to_numpy()
+
+def _row_index(df):
+    # (Component, occurrence) so repeated component names pair up in order
+    comp = pd.Series(_cell_keys(df, "Component"))
+    return pd.MultiIndex.from_arrays([comp, comp.groupby(comp).cumcount()])
+
+def plan_incremental(df: pd.DataFrame, prev: pd.DataFrame, levels=None):
+    """
+    Decide which rows of `df` can reuse the justification stored in `prev`
+    (a previous output workbook). `levels` are the thresholds for `df`
+    (computed here when omitted). Returns a dict:
+      reuse      bool array, True where the previous text is carried forward
+      previous   previous justification per row of `df` (None where unmatched)
+      levels     the thresholds used for the new rows
+      rows / reused / new / changed / reclassified   counts
+    """
+    if OUTPUT_COLUMN not in prev.columns:
+        raise ValueError(f"Previous workbook has no '{OUTPUT_COLUMN}' column")
+    ccr_vals = ccr_column(df)
+    if levels is None:
+        levels = dataset_levels(df, ccr_vals)
+
+    match = _row_index(prev).get_indexer(_row_index(df))
+    found = match >= 0
+    src = match[found]
+
+    previous = np.full(len(df), None, dtype=object)
+    previous[found] = _column(prev, OUTPUT_COLUMN)[src]
+
+    same = np.zeros(len(df), dtype=bool)
+    same[found] = row_fingerprints(df)[found] == row_fingerprints(prev)[src]
+
+    # Same inputs can still read differently if the dataset statistics moved the row's class
+    fa_new, ccr_new = dataset_classes(df, levels, ccr_vals)
+    fa_old, ccr_old = dataset_classes(prev, dataset_levels(prev))
+    moved = np.zeros(len(df), dtype=bool)
+    moved[found] = (fa_new[found] != fa_old[src]) | (ccr_new[found] != ccr_old[src])
+
+    reuse = same & ~moved & np.array([isinstance(t, str) and bool(t) for t in previous], dtype=bool)
+    return {
+        "reuse": reuse,
+        "previous": previous,
+        "levels": levels,
+        "rows": len(df),
+        "reused": int(reuse.sum()),
+        "new": int((~found).sum()),
+        "changed": int((found & ~same).sum()),
+        "reclassified": int((same & moved).sum()),
+    }
+
+def carry_forward(plan, fresh):
+    # Full justification column (pd.Categorical): previous text where reused,
+    # `fresh` (one per other row, in order) elsewhere
+    out = plan["previous"].copy()
+    out[~plan["reuse"]] = np.asarray(fresh, dtype=object)
+    return pd.Categorical(out)
+
+def plan_summary(plan):
+    return {k: plan[k] for k in ("rows", "reused", "new", "changed", "reclassified")}
+
+def incremental_justifications(df: pd.DataFrame, prev: pd.DataFrame, stats=None, levels=None):
+    # `stats` (optional dict) receives plan_summary(); only non-reused rows are generated
+    plan = plan_incremental(df, prev, levels)
+    fresh = build_justification_column(df[~plan["reuse"]], levels=plan["levels"])
+    if stats is not None:
+        stats.update(plan_summary(plan))
+    return carry_forward(plan, fresh)
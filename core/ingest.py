@@ -0,0 +1,212 @@
+# core/ingest.py
+# Typed ingest: one column-wise pass that coerces the rule inputs of a raw
+# register (as read by pd.read_excel) to clean dtypes and reports every cell
+# that could not be used. The engine then works on typed arrays instead of
+# falling back cell by cell.
+#   numeric columns  -> float64 (pd.to_numeric, errors="coerce")
+#   Driving PoF      -> Int64 (integral numbers / digit strings)
+#   CoF letters      -> categorical A–E (stripped, upper-cased)
+#   fluid phase      -> categorical (stripped, lower-cased)
+#   text columns     -> categorical
+# compact_frame() dictionary-encodes the remaining low-cardinality columns of
+# the register that is kept for export.
+import numpy as np
+import pandas as pd
+
+from .generator import _encode
+from .schema import (
+    CATEGORY_ORDER, NUMERIC_COLUMNS, POF_COLUMN, LETTER_COLUMNS, PHASE_COLUMN,
+    RISK_COLUMN, RISK_CATEGORIES, TEXT_COLUMNS,
+)
+
+DEFAULT_MAX_CELLS = 1000
+COMPACT_MAX_RATIO = 0.5
+REPORT_COLUMNS = ["excel_row", "column", "value", "problem"]
+
+def _is_blank(v):
+    return isinstance(v, str) and not v.strip()
+
+def _categorical(s):
+    return isinstance(s.dtype, pd.CategoricalDtype)
+
+def _map_cells(s, fn):
+    # fn() once per distinct cell value (None for missing), broadcast to the rows
+    codes, values = _encode(s)
+    out = np.empty(len(values), dtype=object)
+    out[:] = [fn(v) for v in values]
+    return out[codes]
+
+def _plain(s):
+    return s.astype(object) if _categorical(s) else s
+
+def _present(s):
+    # Non-null and not a blank string (blank cells are missing, not invalid)
+    present = s.notna().to_numpy()
+    if s.dtype == object or _categorical(s):
+        present &= ~_map_cells(s, _is_blank).astype(bool)
+    return present
+
+def _strip(v):
+    # Stripped str() of a cell; None where missing or blank
+    v = None if v is None or v is pd.NA or (isinstance(v, float) and v != v) else str(v).strip()
+    return v or None
+
+def _numeric(s):
+    num = pd.to_numeric(_plain(s), errors="coerce").astype(float)
+    return num, _present(s) & num.isna().to_numpy()
+
+def _pof(s):
+    num = pd.to_numeric(_plain(s), errors="coerce").astype(float)
+    v = num.to_numpy()
+    ok = np.isfinite(v) & (v >= 0) & (np.floor(v) == v)
+    out = pd.array(np.where(ok, v, 0).astype(np.int64), dtype="Int64")
+    out[~ok] = pd.NA
+    bad = _present(s) & ~ok
+    out_of_range = ok & ((v < 1) | (v > 5))
+    return pd.Series(out, index=s.index, name=s.name), bad, out_of_range
+
+def _letter(v):
+    # (letter or None, invalid)
+    v = _strip(v)
+    if v is None:
+        return None, False
+    v = v.upper()
+    return (v, False) if v in CATEGORY_ORDER else (None, True)
+
+def _letters(s):
+    res = _map_cells(s, _letter)
+    letters = np.array([r[0] for r in res], dtype=object)
+    bad = np.array([r[1] for r in res], dtype=bool)
+    return pd.Series(pd.Categorical(letters, categories=list(CATEGORY_ORDER)), index=s.index, name=s.name), bad
+
+def _phase(s):
+    lower = _map_cells(s, lambda v: (_strip(v) or "").lower() or None)
+    return pd.Series(pd.Categorical(lower), index=s.index, name=s.name)
+
+def _unknown_risk(v):
+    v = _strip(v)
+    return v is not None and v.upper() not in RISK_CATEGORIES
+
+def coerce_register(df: pd.DataFrame, max_cells=DEFAULT_MAX_CELLS):
+    """
+    Typed copy of `df` plus a report of the cells that could not be used.
+    Only the rule input columns are replaced; other columns are shared with
+    `df` (shallow copy), so the original frame can still be exported as-is.
+
+    Invalid numbers, PoF values and CoF letters become missing. PoF values
+    outside 1–5 and unknown risk categories are reported but kept.
+    Returns (typed_df, report), see ingest_report().
+    """
+    out = df.copy(deep=False)
+    problems = []  # (column, bad mask, problem)
+
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            out[col], bad = _numeric(df[col])
+            problems.append((col, bad, "not a number"))
+
+    if POF_COLUMN in df.columns:
+        out[POF_COLUMN], bad, out_of_range = _pof(df[POF_COLUMN])
+        problems.append((POF_COLUMN, bad, "not a whole number"))
+        problems.append((POF_COLUMN, out_of_range, "outside 1–5"))
+
+    for col in LETTER_COLUMNS:
+        if col in df.columns:
+            out[col], bad = _letters(df[col])
+            problems.append((col, bad, "not a CoF category (A–E)"))
+
+    if PHASE_COLUMN in df.columns:
+        out[PHASE_COLUMN] = _phase(df[PHASE_COLUMN])
+
+    if RISK_COLUMN in df.columns:
+        unknown = _map_cells(df[RISK_COLUMN], _unknown_risk).astype(bool)
+        problems.append((RISK_COLUMN, unknown, "unknown risk category"))
+
+    for col in TEXT_COLUMNS:
+        if col in df.columns and not _categorical(df[col]):
+            out[col] = df[col].astype("category")
+
+    return out, ingest_report(df, problems, max_cells)
+
+def compact_frame(df: pd.DataFrame, max_ratio=COMPACT_MAX_RATIO):
+    """
+    Shallow copy of `df` with object columns of at most `max_ratio` distinct
+    values per row stored as categoricals (one int code per cell). Cells read
+    back as the same values; columns whose distinct values would collide as
+    categories (1 and True) stay object.
+    """
+    out = df.copy(deep=False)
+    for i in range(df.shape[1]):
+        s = df.iloc[:, i]
+        if s.dtype != object or not len(s):
+            continue
+        codes, uniq = pd.factorize(s)
+        if len(uniq) > max_ratio * len(s):
+            continue
+        if len({type(v) for v in uniq}) > 1:
+            # Mixed types: 1 and True hash alike, so re-check on (type, value)
+            codes, values = _encode(s)
+            present = np.array([v is not None for v in values], dtype=bool)
+            uniq = pd.Index(list(values[present]), dtype=object)
+            if not uniq.is_unique:
+                continue
+            codes = np.where(present, np.cumsum(present) - 1, -1)[codes]
+        out.isetitem(i, pd.Categorical.from_codes(codes, categories=pd.Index(uniq, dtype=object)))
+    return out
+
+def ingest_report(df, problems, max_cells=DEFAULT_MAX_CELLS):
+    """
+    {"rows", "invalid", "by_column": {column: {problem: count}}, "cells"}.
+    "cells" is a DataFrame (excel_row, column, value, problem) holding the first
+    `max_cells` invalid cells in row order; excel_row counts the header as row 1.
+    """
+    by_column, parts, total = {}, [], 0
+    for col, bad, problem in problems:
+        n = int(bad.sum())
+        if not n:
+            continue
+        total += n
+        by_column.setdefault(col, {})[problem] = n
+        pos = np.flatnonzero(bad)[:max_cells]
+        parts.append(pd.DataFrame({
+            "excel_row": pos + 2,
+            "column": col,
+            "value": df[col].to_numpy(dtype=object)[pos],
+            "problem": problem,
+        }))
+    cells = pd.DataFrame(columns=REPORT_COLUMNS)
+    if parts:
+        cells = pd.concat(parts, ignore_index=True).sort_values(["excel_row", "column"], kind="stable")
+        cells = cells.head(max_cells).reset_index(drop=True)
+    return {"rows": len(df), "invalid": total, "by_column": by_column, "cells": cells}
+
+def merge_reports(first, second, offset, max_cells=DEFAULT_MAX_CELLS):
+    """
+    Report of a register read in chunks: `second` covers the rows that follow
+    the first `offset` rows (whose report is `first`, None for the first chunk).
+    Counts add up; excel_row of the second chunk's cells is shifted by `offset`.
+    """
+    if first is None:
+        first = {"rows": 0, "invalid": 0, "by_column": {}, "cells": pd.DataFrame(columns=REPORT_COLUMNS)}
+    by_column = {col: dict(counts) for col, counts in first["by_column"].items()}
+    for col, counts in second["by_column"].items():
+        merged = by_column.setdefault(col, {})
+        for problem, n in counts.items():
+            merged[problem] = merged.get(problem, 0) + n
+    cells = first["cells"]
+    if len(cells) < max_cells and len(second["cells"]):
+        shifted = second["cells"].assign(excel_row=second["cells"]["excel_row"] + offset)
+        cells = shifted if not len(cells) else pd.concat([cells, shifted], ignore_index=True)
+        cells = cells.head(max_cells).reset_index(drop=True)
+    return {"rows": first["rows"] + second["rows"], "invalid": first["invalid"] + second["invalid"],
+            "by_column": by_column, "cells": cells}
+
+def format_report(report, limit=5):
+    # One line per column, e.g. "Inventory: 3 not a number"; empty string when clean
+    lines = []
+    for col, counts in list(report["by_column"].items())[:limit]:
+        lines.append(f"{col}: " + ", ".join(f"{n} {problem}" for problem, n in counts.items()))
+    more = len(report["by_column"]) - limit
+    if more > 0:
+        lines.append(f"... and {more} more columns")
+    return "\n".join(lines)
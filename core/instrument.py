@@ -0,0 +1,165 @@
+# core/instrument.py
+# Per-run timings and counters. Code calls the module-level stage()/count()/
+# observe(); they record into the Recorder made active by recording() and cost
+# one ContextVar lookup when nothing is recording.
+#
+#   with recording(Recorder(logger=json_logger())) as rec:
+#       with stage("generate"):
+#           ...
+#       count("llm.fallbacks")
+#   rec.snapshot()  ->  {"timings": {...}, "counters": {...}}
+import contextvars
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+
+LOGGER_NAME = "rbi_justifier.diagnostics"
+
+_current = contextvars.ContextVar("rbi_recorder", default=None)
+_NULL = nullcontext()
+
+class Recorder:
+    """
+    Timings (calls / total / max seconds per name) and integer counters for one
+    run. Thread-safe. With a `logger`, every finished stage() and the final
+    log_summary() are emitted as one JSON object per log line.
+    """
+    def __init__(self, logger=None, run_id=None):
+        self.logger = logger
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.timings = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            t = self.timings.get(name)
+            if t is None:
+                t = self.timings[name] = [0, 0.0, 0.0]
+            t[0] += 1
+            t[1] += seconds
+            t[2] = max(t[2], seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            self.observe(name, seconds)
+            if self.logger is not None:
+                self._log({"event": "stage", "stage": name, "seconds": round(seconds, 6)})
+
+    def merge(self, snapshot):
+        # Fold in another recorder's snapshot (e.g. from a cached or remote stage)
+        with self._lock:
+            for name, s in snapshot.get("timings", {}).items():
+                t = self.timings.setdefault(name, [0, 0.0, 0.0])
+                t[0] += s["calls"]
+                t[1] += s["total"]
+                t[2] = max(t[2], s["max"])
+            for name, n in snapshot.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + n
+        return self
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "timings": {k: {"calls": c, "total": tot, "max": mx} for k, (c, tot, mx) in self.timings.items()},
+                "counters": dict(self.counters),
+            }
+
+    def log_summary(self, **fields):
+        if self.logger is not None:
+            self._log({"event": "summary", **fields, **self.snapshot()})
+
+    def _log(self, record):
+        record = {"run_id": self.run_id, "ts": round(time.time(), 3), **record}
+        self.logger.info(json.dumps(record, default=str))
+
+def current():
+    return _current.get()
+
+@contextmanager
+def recording(recorder=None):
+    # Make `recorder` (a new one when omitted) the target of stage()/count()/observe()
+    rec = recorder if recorder is not None else Recorder()
+    token = _current.set(rec)
+    try:
+        yield rec
+    finally:
+        _current.reset(token)
+
+def activate(recorder):
+    # Make `recorder` (None: off) current for the rest of this context, for
+    # top-level scripts that can't wrap their body in recording()
+    _current.set(recorder)
+    return recorder
+
+def stage(name):
+    rec = _current.get()
+    return _NULL if rec is None else rec.stage(name)
+
+def count(name, n=1):
+    rec = _current.get()
+    if rec is not None:
+        rec.count(name, n)
+
+def observe(name, seconds):
+    rec = _current.get()
+    if rec is not None:
+        rec.observe(name, seconds)
+
+def timed_iter(name, iterable):
+    # `iterable` with the time spent producing each item observed as `name`
+    # (e.g. chunked reads interleaved with processing); unchanged when not recording
+    rec = _current.get()
+    if rec is None:
+        return iterable
+    return _timed_iter(rec, name, iter(iterable))
+
+def _timed_iter(rec, name, it):
+    while True:
+        t0 = time.perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            return
+        finally:
+            rec.observe(name, time.perf_counter() - t0)
+        yield item
+
+def enabled():
+    return _current.get() is not None
+
+def bind(fn):
+    # fn wrapped to run under the caller's recorder, for thread-pool workers;
+    # each call gets its own context copy, so concurrent calls are fine
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.copy().run(fn, *args, **kwargs)
+
+def json_logger(stream=None):
+    # The diagnostics logger with a bare-message handler (added once), at INFO
+    logger = logging.getLogger(LOGGER_NAME)
+    if not logger.handlers:
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+def timing_rows(snapshot):
+    # Rows for a table view, in recording order
+    return [{"stage": k, "calls": v["calls"], "total_s": round(v["total"], 4), "max_s": round(v["max"], 4)}
+            for k, v in snapshot["timings"].items()]
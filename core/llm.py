@@ -1,56 +1,24 @@
-'''
+# core/llm.py
+# LLM polishing. The model sits behind a PolishBackend: HFBackend calls the
+# Hugging Face inference API, core.llmstub.StubBackend answers locally for
+# offline load tests. huggingface_hub and tenacity are imported on first use
+# (_hf(), polish_with_hf), so importing this module costs nothing when
+# polishing is off.
 import json
-from huggingface_hub import InferenceClient
-from tenacity import retry, stop_after_attempt, wait_fixed
-
-SYSTEM = (
-    #Hard Instructions
-    #"You are a technical editor. Rewrite the justification for refinery RBI components. "
-    #"Rules: Do not invent facts. Do not change numbers, category letters, or the risk category. "
-    #"Mention PoF and corrosion-rate stance, inspection-priority phrasing tied to risk profile, "
-    #"all three consequence categories, which category governs CoF or if a tie, and the inventory and flammable-area levels. "
-    #"Use the word 'component'. One concise paragraph. Return only the paragraph text."
-
-    #Soft Instructions
-    "You are a technical editor. Rewrite the justification to improve flow, sentence variety, and readability."
-    "Rules: Do not invent facts. Do not change numbers, category letters, or the risk category. "
-    "Keep all factual details (PoF number, corrosion rates, category letters, risk category)."
-    "You may change wording, sentence order, and phrasing, but not the facts."
-
-)
-
-def build_prompt(payload: dict, draft_text: str):
-    return (
-        f"{SYSTEM}\n\n"
-        f"Data JSON:\n{json.dumps(payload, ensure_ascii=False)}\n\n"
-        f"Draft paragraph:\n{draft_text}\n\n"
-        f"Rewrite now. Keep all facts and categories unchanged."
-    )
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
-@retry(stop=stop_after_attempt(2), wait=wait_fixed(1))
-def polish_with_hf(model_id: str, hf_token: str, payload: dict, draft_text: str) -> str:
-    client = InferenceClient(model=model_id, token=hf_token, timeout=45)
-    prompt = build_prompt(payload, draft_text)
-    # Use generic text-generation so it works with TGI or serverless Inference API
-    text = client.text_generation(
-        prompt=prompt,
-        max_new_tokens=220,
-        temperature=0.2,
-        top_p=0.9,
-        repetition_penalty=1.05,
-       
-        stop_sequences=["\n\n"]
-    )
-    return text.strip()
-'''
+from . import instrument
+from .validate import FactValidator, rejection_stats
+from .cache import cache_key
 
-
-
-'''
-# core/llm.py
-import json
-from huggingface_hub import InferenceClient
-from tenacity import retry, stop_after_attempt, wait_fixed
+if TYPE_CHECKING:
+    from huggingface_hub import InferenceClient
 
 SYSTEM = (
     "You are a technical editor. Rewrite the justification for refinery RBI components. "
@@ -60,6 +28,32 @@ SYSTEM = (
     "Use the word 'component'. One concise paragraph. Return only the paragraph text."
 )
 
+RETRYABLE_STATUS = (429, 503)
+
+class PolishHTTPError(RuntimeError):
+    # HTTP failure from the inference backend; status/retry_after drive the batch backoff
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+@lru_cache(maxsize=1)
+def _hf():
+    # (InferenceClient, InferenceTimeoutError, HfHubHTTPError), imported once on first use
+    from huggingface_hub import InferenceClient, InferenceTimeoutError
+    from huggingface_hub.utils import HfHubHTTPError
+    return InferenceClient, InferenceTimeoutError, HfHubHTTPError
+
+def _http_error(kind, e):
+    status = e.response.status_code if e.response is not None else None
+    retry_after = None
+    if e.response is not None:
+        try:
+            retry_after = float(e.response.headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            pass
+    return PolishHTTPError(f"HF {kind} error {status}: {e}", status, retry_after)
+
 def build_prompt(payload: dict, draft_text: str) -> str:
     return (
         f"{SYSTEM}\n\n"
@@ -68,11 +62,15 @@ def build_prompt(payload: dict, draft_text: str) -> str:
         f"Rewrite now. Keep all facts and categories unchanged."
     )
 
-@retry(stop=stop_after_attempt(2), wait=wait_fixed(1))
-def polish_with_hf(model_id: str, hf_token: str, payload: dict, draft_text: str) -> str:
-    client = InferenceClient(model=model_id, token=hf_token, timeout=90)
+@lru_cache(maxsize=16)
+def get_client(model_id: str, hf_token: str, timeout: float = 120) -> "InferenceClient":
+    # One client per model/token; huggingface_hub pools an HTTP session per thread underneath
+    InferenceClient, _, _ = _hf()
+    return InferenceClient(model=model_id, token=hf_token, timeout=timeout)
 
-    # 1) Try chat API if available on the backend
+def polish_once(client: "InferenceClient", payload: dict, draft_text: str) -> str:
+    _, InferenceTimeoutError, HfHubHTTPError = _hf()
+    # 1) Try chat first
     try:
         msgs = [
             {"role": "system", "content": SYSTEM},
@@ -87,58 +85,115 @@ def polish_with_hf(model_id: str, hf_token: str, payload: dict, draft_text: str)
         text = resp.choices[0].message.content.strip()
         if text:
             return text
+    except HfHubHTTPError as e:
+        # Re-raise with clearer hint
+        raise _http_error("chat", e) from e
     except Exception:
-        pass  # fall back
-
-    # 2) Fallback to plain text generation
-    prompt = build_prompt(payload, draft_text)
-    text = client.text_generation(
-        prompt=prompt,
-        max_new_tokens=220,
-        temperature=0.2,
-        top_p=0.9,
-        repetition_penalty=1.05,
-        # Some backends ignore stop_sequences; safe to omit
-    )
-    return text.strip()
-'''
-
-
+        pass  # fall through to text_generation
 
+    # 2) Fallback to text_generation
+    try:
+        prompt = build_prompt(payload, draft_text)
+        text = client.text_generation(
+            prompt=prompt,
+            max_new_tokens=220,
+            temperature=0.2,
+            top_p=0.9,
+            repetition_penalty=1.05,
+            do_sample=False,
+        )
+        return text.strip()
+    except HfHubHTTPError as e:
+        raise _http_error("text-generation", e) from e
+    except InferenceTimeoutError as e:
+        # huggingface_hub waits out 503 "model loading" until the timeout, then raises this
+        raise PolishHTTPError(f"HF text-generation error 503: {e}", 503) from e
 
-# core/llm.py
-import json
-from huggingface_hub import InferenceClient, HfHubHTTPError
-from tenacity import retry, stop_after_attempt, wait_fixed
+def polish_with_hf(model_id: str, hf_token: str, payload: dict, draft_text: str) -> str:
+    # Two attempts, 1 s apart (tenacity's RetryError when both fail)
+    from tenacity import Retrying, stop_after_attempt, wait_fixed
+    retrying = Retrying(stop=stop_after_attempt(2), wait=wait_fixed(1))
+    return retrying(HFBackend(model_id, hf_token).polish, payload, draft_text)
 
-SYSTEM = (
-    "You are a technical editor. Rewrite the justification for refinery RBI components. "
-    "Rules: Do not invent facts. Do not change numbers, category letters, or the risk category. "
-    "Mention PoF and corrosion-rate stance, inspection-priority phrasing tied to risk profile, "
-    "all three consequence categories, which category governs CoF or if a tie, and the inventory and flammable-area levels. "
-    "Use the word 'component'. One concise paragraph. Return only the paragraph text."
+# ------------------------
+# Multi-item prompts
+# ------------------------
+BATCH_SYSTEM = (
+    SYSTEM + " "
+    "You will receive several numbered items. Rewrite each one independently and reply with only "
+    'a JSON array of objects {"index": <item index>, "text": <rewritten paragraph>}, one per item.'
 )
+# Cached packed replies are keyed on BATCH_SYSTEM and this version: bump it when
+# build_batch_prompt or polish_many_once change what the model is asked
+BATCH_PROMPT_VERSION = 1
 
-def build_prompt(payload: dict, draft_text: str) -> str:
+def estimate_tokens(text: str) -> int:
+    # Rough 4-chars-per-token estimate; good enough for packing
+    return len(text) // 4 + 1
+
+def build_batch_prompt(entries) -> str:
+    # entries: [(payload, draft_text), ...]; the item index is the position in the list
+    items = [{"index": k, "data": payload, "draft": draft} for k, (payload, draft) in enumerate(entries)]
     return (
-        f"{SYSTEM}\n\n"
-        f"Data JSON:\n{json.dumps(payload, ensure_ascii=False)}\n\n"
-        f"Draft paragraph:\n{draft_text}\n\n"
-        f"Rewrite now. Keep all facts and categories unchanged."
+        f"{BATCH_SYSTEM}\n\n"
+        f"Items JSON:\n{json.dumps(items, ensure_ascii=False, default=str)}\n\n"
+        f"Return the JSON array now. Keep all facts and categories unchanged."
     )
 
-@retry(stop=stop_after_attempt(2), wait=wait_fixed(1))
-def polish_with_hf(model_id: str, hf_token: str, payload: dict, draft_text: str) -> str:
-    client = InferenceClient(model=model_id, token=hf_token, timeout=120)
-    # 1) Try chat first
+def parse_batch_reply(text: str, n: int) -> dict:
+    """
+    {index: text} for the items found in a batch reply. Accepts objects with
+    index/text or a bare array of strings (taken positionally); anything that
+    does not parse is simply missing.
+    """
+    if not text:
+        return {}
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end <= start:
+        return {}
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(data, list):
+        return {}
+    out = {}
+    for pos, el in enumerate(data):
+        if isinstance(el, dict):
+            idx, txt = el.get("index", pos), el.get("text")
+        else:
+            idx, txt = pos, el
+        if isinstance(idx, int) and 0 <= idx < n and isinstance(txt, str) and txt.strip():
+            out.setdefault(idx, txt.strip())
+    return out
+
+def plan_batches(drafts, max_items: int, max_tokens: int):
+    """
+    Split item positions into batches whose estimated reply fits `max_tokens`
+    (each rewrite assumed ~25% longer than its draft, plus JSON overhead).
+    """
+    batches, cur, used = [], [], 0
+    for pos, draft in enumerate(drafts):
+        need = int(estimate_tokens(draft) * 1.25) + 16
+        if cur and (len(cur) >= max_items or used + need > max_tokens):
+            batches.append(cur)
+            cur, used = [], 0
+        cur.append(pos)
+        used += need
+    if cur:
+        batches.append(cur)
+    return batches
+
+def polish_many_once(client: "InferenceClient", entries, max_tokens: int = 2048) -> str:
+    # One request for several items; returns the raw reply (see parse_batch_reply)
+    _, InferenceTimeoutError, HfHubHTTPError = _hf()
     try:
-        msgs = [
-            {"role": "system", "content": SYSTEM},
-            {"role": "user", "content": build_prompt(payload, draft_text)},
-        ]
         resp = client.chat.completions.create(
-            messages=msgs,
-            max_tokens=220,
+            messages=[
+                {"role": "system", "content": BATCH_SYSTEM},
+                {"role": "user", "content": build_batch_prompt(entries)},
+            ],
+            max_tokens=max_tokens,
             temperature=0.2,
             top_p=0.9,
         )
@@ -146,22 +201,260 @@ def polish_with_hf(model_id: str, hf_token: str, payload: dict, draft_text: str)
         if text:
             return text
     except HfHubHTTPError as e:
-        # Re-raise with clearer hint
-        raise RuntimeError(f"HF chat error {e.response.status_code}: {e}") from e
+        raise _http_error("chat", e) from e
     except Exception:
         pass  # fall through to text_generation
 
-    # 2) Fallback to text_generation
     try:
-        prompt = build_prompt(payload, draft_text)
         text = client.text_generation(
-            prompt=prompt,
-            max_new_tokens=220,
+            prompt=build_batch_prompt(entries),
+            max_new_tokens=max_tokens,
             temperature=0.2,
             top_p=0.9,
-            repetition_penalty=1.05,
             do_sample=False,
         )
         return text.strip()
     except HfHubHTTPError as e:
-        raise RuntimeError(f"HF text-generation error {e.response.status_code}: {e}") from e
+        raise _http_error("text-generation", e) from e
+    except InferenceTimeoutError as e:
+        raise PolishHTTPError(f"HF text-generation error 503: {e}", 503) from e
+
+# ------------------------
+# Backends
+# ------------------------
+class PolishBackend(ABC):
+    """
+    Where polishing requests go. polish(payload, draft) returns the rewritten
+    paragraph; polish_many(entries) returns the raw reply to a multi-item
+    prompt (see parse_batch_reply). HTTP failures raise PolishHTTPError so
+    polish_batch can retry 429/503; any other exception counts as an error
+    and the item keeps its draft. `name` is part of the polish cache key, so
+    replies from one backend never answer for another.
+    """
+    name = "backend"
+
+    @abstractmethod
+    def polish(self, payload: dict, draft_text: str) -> str:
+        ...
+
+    @abstractmethod
+    def polish_many(self, entries) -> str:
+        ...
+
+class HFBackend(PolishBackend):
+    # Hugging Face inference API (Hub model id or endpoint URL); the client is created on first request
+    name = "hf"
+
+    def __init__(self, model_id: str, hf_token: str, timeout: float = 120, max_tokens: int = 2048):
+        self.model_id = model_id
+        self.hf_token = hf_token
+        self.timeout = timeout
+        self.max_tokens = max_tokens
+
+    @property
+    def client(self) -> "InferenceClient":
+        return get_client(self.model_id, self.hf_token, self.timeout)
+
+    def polish(self, payload: dict, draft_text: str) -> str:
+        return polish_once(self.client, payload, draft_text)
+
+    def polish_many(self, entries) -> str:
+        return polish_many_once(self.client, entries, self.max_tokens)
+
+# ------------------------
+# Batch polishing
+# ------------------------
+class TokenBucket:
+    # Thread-safe token bucket: `rate` requests per second with bursts up to `capacity`
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1.0))
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0, retry_after: float = None) -> float:
+    # Server hint wins; otherwise exponential backoff with full jitter
+    if retry_after is not None:
+        return min(max(retry_after, 0.0), cap)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def _with_retries(call, bucket, max_retries, backoff_base):
+    # Returns (value, error, attempts); 429/503 are retried with backoff, nothing raises
+    attempt = 0
+    while True:
+        if bucket is not None:
+            bucket.acquire()
+        attempt += 1
+        instrument.count("llm.requests")
+        t0 = time.perf_counter()
+        try:
+            value = call()
+            instrument.observe("llm.request", time.perf_counter() - t0)
+            return value, None, attempt
+        except PolishHTTPError as e:
+            instrument.observe("llm.request", time.perf_counter() - t0)
+            if e.status in RETRYABLE_STATUS and attempt <= max_retries:
+                instrument.count("llm.retries")
+                time.sleep(backoff_delay(attempt - 1, backoff_base, retry_after=e.retry_after))
+                continue
+            instrument.count("llm.errors")
+            return None, str(e), attempt
+        except Exception as e:
+            instrument.observe("llm.request", time.perf_counter() - t0)
+            instrument.count("llm.errors")
+            return None, f"{type(e).__name__}: {e}", attempt
+
+def _verdict(validator, model_text, payload, draft, error, attempts):
+    # (text, polished, error, attempts, model_text, rejected); same rule as safe_keep_or_fallback
+    missing = validator.check(model_text, payload)
+    instrument.count("llm.fallbacks" if missing else "llm.kept")
+    return (draft if missing else model_text), not missing, error, attempts, model_text, missing
+
+def _polish_item(polish, payload, draft, bucket, max_retries, backoff_base, validator):
+    # Returns (text, polished, error, attempts, model_text, rejected); never raises
+    model_text, error, attempts = _with_retries(lambda: polish(payload, draft), bucket, max_retries, backoff_base)
+    if model_text is None:
+        return draft, False, error, attempts, None, []
+    return _verdict(validator, model_text, payload, draft, None, attempts)
+
+def _polish_unit(entries, polish, polish_many, bucket, max_retries, backoff_base, retry_single, validator):
+    # One unit of work (a single item or a packed batch) -> one (result tuple, packed) per entry;
+    # `packed` tells whether the reply came from the multi-item prompt
+    if len(entries) == 1 or polish_many is None:
+        return [(_polish_item(polish, p, d, bucket, max_retries, backoff_base, validator), False)
+                for p, d in entries]
+
+    reply, error, attempts = _with_retries(lambda: polish_many(entries), bucket, max_retries, backoff_base)
+    if reply is None:
+        # The request failed even after backing off on 429/503; one request per item
+        # would only multiply the load on an endpoint that is already refusing
+        instrument.count("llm.batch_failures")
+        return [((draft, False, error, attempts, None, []), True) for _, draft in entries]
+    parsed = parse_batch_reply(reply, len(entries))
+    out = []
+    for k, (payload, draft) in enumerate(entries):
+        model_text = parsed.get(k)
+        if model_text is None:
+            # Missing from the reply, or the reply didn't parse: ask for this item alone
+            if retry_single:
+                out.append((_polish_item(polish, payload, draft, bucket, max_retries, backoff_base, validator),
+                            False))
+            else:
+                out.append(((draft, False, error or "missing from batch reply", attempts, None, []), True))
+            continue
+        out.append((_verdict(validator, model_text, payload, draft, None, attempts), True))
+    return out
+
+def polish_batch(model_id: str, hf_token: str, items, max_concurrency: int = 8,
+                 rate_per_sec: float = None, burst: float = None, max_retries: int = 4,
+                 backoff_base: float = 1.0, timeout: float = 120, on_result=None, polish=None,
+                 cache=None, batch_size: int = 1, max_tokens: int = 2048, retry_single: bool = True,
+                 polish_many=None, validator=None, report=None, backend=None):
+    """
+    Polish many (payload, draft_text) items concurrently through one backend
+    (default: HFBackend for `model_id`, one shared client).
+
+    - at most `max_concurrency` requests in flight; optional token-bucket limit
+      of `rate_per_sec` (bursts up to `burst`)
+    - 429/503 are retried up to `max_retries` times with backoff (Retry-After honoured)
+    - each reply is checked as soon as it completes (FactValidator, the engine
+      behind safe_keep_or_fallback); failures and rejected replies fall back to the draft
+    - identical (payload, draft) items are sent once
+    - with a `cache` (core.cache.PolishCache) known items skip the model and
+      successful replies are stored with their verdict, keyed on the backend
+      and the prompt they answered (single, or packed when `batch_size` > 1)
+    - `batch_size` > 1 packs up to that many items per request (fewer when the
+      estimated reply would exceed `max_tokens`); items missing from a batch
+      reply (or all of them, when it doesn't parse) are retried alone when
+      `retry_single` is set. A batch whose request fails, after the 429/503
+      retries, is not split: its items keep their drafts
+
+    Returns one dict per item, in input order:
+    {"text", "polished", "error", "attempts", "cached", "rejected"} where
+    "rejected" lists the fact keys missing from the model reply. `report`
+    (optional dict) receives the aggregate rejection stats.
+    `on_result(i, result)` is called as results complete. `backend` (a
+    PolishBackend, e.g. core.llmstub.StubBackend) replaces the HF backend;
+    `polish(payload, draft)` and `polish_many(entries)` override single calls.
+    """
+    items = list(items)
+    # Cached replies are kept per source: a stub's (possibly mutated) replies must not
+    # be served for the real model, and polish/polish_many overrides count as their
+    # own backend, even when a backend supplies the other call
+    sources = {False: "custom" if polish is not None else None,
+               True: "custom" if polish_many is not None else None}
+    if polish is None or (polish_many is None and batch_size > 1):
+        backend = backend or HFBackend(model_id, hf_token, timeout, max_tokens)
+        polish = polish or backend.polish
+        polish_many = polish_many or backend.polish_many
+    bucket = TokenBucket(rate_per_sec, burst) if rate_per_sec else None
+    validator = validator or FactValidator()
+
+    # Deduplicate identical requests; fan results back out by index
+    groups = {}
+    for i, (payload, draft) in enumerate(items):
+        key = (json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str), draft)
+        groups.setdefault(key, []).append(i)
+
+    results = [None] * len(items)
+    def deliver(idx, res):
+        for i in idx:
+            results[i] = dict(res)
+            if on_result is not None:
+                on_result(i, results[i])
+
+    def key(payload, draft, packed):
+        # Replies to the packed prompt are not interchangeable with single-item ones
+        system = f"{BATCH_SYSTEM}\nbatch prompt v{BATCH_PROMPT_VERSION}" if packed else SYSTEM
+        return cache_key(f"{sources[packed] or backend.name}:{model_id}", system, payload, draft)
+
+    pending = []
+    for idx in groups.values():
+        payload, draft = items[idx[0]]
+        hit = cache.get(key(payload, draft, batch_size > 1)) if cache is not None else None
+        if hit is None:
+            pending.append(idx)
+            continue
+        model_text, kept = hit
+        instrument.count("llm.cache_hits")
+        deliver(idx, {"text": model_text if kept else draft, "polished": kept,
+                      "error": None, "attempts": 0, "cached": True,
+                      "rejected": [] if kept else validator.check(model_text, payload)})
+
+    if batch_size > 1:
+        units = [[pending[k] for k in b]
+                 for b in plan_batches([items[idx[0]][1] for idx in pending], batch_size, max_tokens)]
+    else:
+        units = [[idx] for idx in pending]
+
+    with ThreadPoolExecutor(max_workers=max(1, int(max_concurrency))) as ex:
+        futs = {
+            ex.submit(instrument.bind(_polish_unit), [items[idx[0]] for idx in unit], polish, polish_many,
+                      bucket, max_retries, backoff_base, retry_single, validator): unit
+            for unit in units
+        }
+        for fut in as_completed(futs):
+            for idx, ((text, polished, error, attempts, model_text, rejected), packed) in zip(futs[fut],
+                                                                                            fut.result()):
+                if cache is not None and model_text is not None:
+                    payload, draft = items[idx[0]]
+                    cache.put(key(payload, draft, packed), model_text, polished)
+                deliver(idx, {"text": text, "polished": polished, "error": error,
+                              "attempts": attempts, "cached": False, "rejected": rejected})
+    if report is not None:
+        # Only replies that came back count; request failures are in "error"
+        report.update(rejection_stats([r["rejected"] for r in results if r["error"] is None]))
+    return results
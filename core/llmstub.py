@@ -0,0 +1,253 @@
+# core/llmstub.py
+# Deterministic stand-in for the polishing model, for load tests on machines
+# without network access. StubBackend answers in-process; serve_stub puts the
+# same behaviour behind a localhost HTTP endpoint that the real HF client can
+# use (model = "http://127.0.0.1:8766"), so the whole HTTP path is exercised.
+#
+#   backend = StubBackend(latency_ms=300, rate_limit_rate=0.05, mutation_rate=0.2)
+#   polish_batch("stub", None, items, backend=backend)
+#
+#   python -m core.llmstub --port 8766 --latency-ms 300 --rate-limit-rate 0.05
+#
+# Replies are the draft (which always passes validation), optionally mutated
+# so that FactValidator / safe_keep_or_fallback has something to reject. Each
+# call's outcome is drawn from a generator seeded by (seed, draft, call
+# number), so a run replays the same way whatever the concurrency.
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .llm import PolishBackend, PolishHTTPError
+
+DEFAULT_PORT = 8766
+
+_POF = re.compile(r"PoF is [^;.]*?\(\d\)[;,.]?\s*")
+_TRIPLE = re.compile(r"\b[A-E]/[A-E]/[A-E]\b")
+_CATEGORY = re.compile(r"\bCategory [A-E]\b")
+_SENTENCE = re.compile(r"(?<=[.;])\s")
+RISKS = ["LOW", "MEDIUM", "MEDIUM HIGH", "HIGH"]
+
+def _shift(letters, rng):
+    return "".join(chr(65 + (ord(c) - 65 + rng.randint(1, 4)) % 5) if c.isalpha() else c for c in letters)
+
+# name -> fn(text, payload, rng); "reword" keeps every fact, the others drop or change one
+MUTATIONS = {
+    "reword": lambda text, payload, rng: "For this component, " + text[0].lower() + text[1:] if text else text,
+    "drop_pof": lambda text, payload, rng: _POF.sub("", text),
+    "risk_category": lambda text, payload, rng: text.replace(
+        str(payload.get("risk_category")),
+        rng.choice([r for r in RISKS if r != payload.get("risk_category")])) if payload.get("risk_category") else text,
+    "letters": lambda text, payload, rng: _CATEGORY.sub(
+        lambda m: "Category " + _shift(m.group(0)[-1], rng), _TRIPLE.sub(lambda m: _shift(m.group(0), rng), text)),
+    "truncate": lambda text, payload, rng: _SENTENCE.split(text, 1)[0],
+    "empty": lambda text, payload, rng: "",
+}
+
+class StubBackend(PolishBackend):
+    """
+    Local polishing backend with configurable behaviour, per request:
+
+    - `latency_ms` (+ up to `jitter_ms`, + `per_item_ms` for each item of a
+      multi-item request) before replying
+    - `rate_limit_rate`: share of requests failing with 429 (`retry_after`
+      seconds as the server hint, None = client backoff)
+    - `error_rate`: share failing with `error_status` (500: not retried)
+    - `mutation_rate`: share of items rewritten by one of `mutations`
+      (MUTATIONS keys)
+    - `drop_rate`: share of items left out of a multi-item reply
+
+    `stats()` gives request / item / outcome counts.
+    """
+    name = "stub"
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, per_item_ms=0.0, rate_limit_rate=0.0, retry_after=None,
+                 error_rate=0.0, error_status=500, mutation_rate=0.0, mutations=None, drop_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.per_item_ms = per_item_ms
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.mutation_rate = mutation_rate
+        self.mutations = list(mutations or MUTATIONS)
+        unknown = [m for m in self.mutations if m not in MUTATIONS]
+        if unknown:
+            raise ValueError(f"Unknown mutations {unknown}; expected some of {list(MUTATIONS)}")
+        self.drop_rate = drop_rate
+        self.seed = seed
+        self._calls = {}
+        self._counts = dict.fromkeys(["requests", "items", "rate_limited", "errors", "dropped"], 0)
+        self._counts.update({f"mutated.{m}": 0 for m in self.mutations})
+        self._lock = threading.Lock()
+
+    def _rng(self, key):
+        # One generator per (seed, request content, n-th time this content is sent)
+        with self._lock:
+            n = self._calls[key] = self._calls.get(key, 0) + 1
+            self._counts["requests"] += 1
+        return random.Random(f"{self.seed}|{n}|{key}")
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def _request(self, rng, items):
+        # Latency, then the request-level outcome (429 / error) for this call
+        self._count("items", items)
+        delay = self.latency_ms + rng.uniform(0, self.jitter_ms) + self.per_item_ms * items
+        if delay > 0:
+            time.sleep(delay / 1000)
+        draw = rng.random()
+        if draw < self.rate_limit_rate:
+            self._count("rate_limited")
+            raise PolishHTTPError("stub error 429: rate limited", 429, self.retry_after)
+        if draw < self.rate_limit_rate + self.error_rate:
+            self._count("errors")
+            raise PolishHTTPError(f"stub error {self.error_status}", self.error_status)
+
+    def _rewrite(self, rng, payload, draft):
+        if self.mutations and rng.random() < self.mutation_rate:
+            name = rng.choice(self.mutations)
+            self._count(f"mutated.{name}")
+            return MUTATIONS[name](draft, payload, rng)
+        return draft
+
+    def polish(self, payload: dict, draft_text: str) -> str:
+        rng = self._rng(draft_text)
+        self._request(rng, 1)
+        return self._rewrite(rng, payload, draft_text)
+
+    def polish_many(self, entries) -> str:
+        entries = list(entries)
+        rng = self._rng("\n".join(draft for _, draft in entries))
+        self._request(rng, len(entries))
+        out = []
+        for k, (payload, draft) in enumerate(entries):
+            if rng.random() < self.drop_rate:
+                self._count("dropped")
+                continue
+            out.append({"index": k, "text": self._rewrite(rng, payload, draft)})
+        return json.dumps(out, ensure_ascii=False)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
+
+# ------------------------
+# HTTP endpoint
+# ------------------------
+_SINGLE = re.compile(r"Data JSON:\n(.*?)\n\nDraft paragraph:\n(.*?)\n\nRewrite now\.", re.S)
+_BATCH = re.compile(r"Items JSON:\n(.*?)\n\nReturn the JSON array now\.", re.S)
+
+def reply_for_prompt(backend, prompt):
+    # The stub's reply to a build_prompt / build_batch_prompt text (PolishHTTPError passes through)
+    m = _BATCH.search(prompt)
+    if m:
+        items = json.loads(m.group(1))
+        return backend.polish_many([(it.get("data") or {}, it.get("draft") or "") for it in items])
+    m = _SINGLE.search(prompt)
+    if m:
+        return backend.polish(json.loads(m.group(1)), m.group(2))
+    raise ValueError("prompt is not a polishing prompt")
+
+class _Handler(BaseHTTPRequestHandler):
+    # Text Generation Inference routes as InferenceClient calls them: chat
+    # completions ({"messages"}) on any path, text generation ({"inputs"})
+    server_version = "rbi-llmstub"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        if not self.server.quiet:
+            super().log_message(fmt, *args)
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._send(200, {"status": "ok", **self.server.backend.stats()})
+
+    def do_POST(self):
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            chat = "messages" in body
+            prompt = body["messages"][-1]["content"] if chat else body.get("inputs", "")
+            text = reply_for_prompt(self.server.backend, prompt)
+        except PolishHTTPError as e:
+            headers = {"Retry-After": str(e.retry_after)} if e.retry_after is not None else None
+            self._send(e.status, {"error": str(e)}, headers)
+            return
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            self._send(400, {"error": f"{type(e).__name__}: {e}"})
+            return
+        if not chat:
+            self._send(200, [{"generated_text": text}])
+            return
+        self._send(200, {
+            "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": "stub",
+            "system_fingerprint": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop", "logprobs": None,
+                         "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4,
+                      "total_tokens": (len(prompt) + len(text)) // 4},
+        })
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+def serve_stub(backend=None, host="127.0.0.1", port=DEFAULT_PORT, quiet=True):
+    # HTTP server around `backend` (default StubBackend()); call serve_forever() or run it in a thread
+    server = _Server((host, port), _Handler)
+    server.backend = backend or StubBackend()
+    server.quiet = quiet
+    return server
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m core.llmstub",
+                                 description="Local stand-in for the polishing model endpoint (no network).")
+    ap.add_argument("--host", default="127.0.0.1", help="bind address (default: %(default)s)")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT, help="port (default: %(default)s)")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="base latency per request")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="extra random latency, up to this")
+    ap.add_argument("--per-item-ms", type=float, default=0.0, help="extra latency per item of a packed request")
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered 429")
+    ap.add_argument("--retry-after", type=float, default=None, help="Retry-After seconds sent with 429s")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered --error-status")
+    ap.add_argument("--error-status", type=int, default=500, help="status for errors (default: %(default)s)")
+    ap.add_argument("--mutation-rate", type=float, default=0.0, help="share of items rewritten to drop a fact")
+    ap.add_argument("--mutations", default=",".join(MUTATIONS),
+                    help="comma-separated mutations to draw from (default: %(default)s)")
+    ap.add_argument("--drop-rate", type=float, default=0.0, help="share of items left out of packed replies")
+    ap.add_argument("--seed", type=int, default=0, help="outcome seed (default: %(default)s)")
+    ap.add_argument("--verbose", action="store_true", help="log every request")
+    args = ap.parse_args(argv)
+
+    backend = StubBackend(args.latency_ms, args.jitter_ms, args.per_item_ms, args.rate_limit_rate, args.retry_after,
+                          args.error_rate, args.error_status, args.mutation_rate,
+                          [m for m in args.mutations.split(",") if m], args.drop_rate, args.seed)
+    server = serve_stub(backend, args.host, args.port, quiet=not args.verbose)
+    print(f"Stub model on http://{args.host}:{server.server_port} (use it as the model / endpoint URL)",
+          file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
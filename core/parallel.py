@@ -0,0 +1,78 @@
+# core/parallel.py
+# Multi-core generation for a single large register: dataset thresholds are
+# computed once on the whole frame, then row shards are generated in worker
+# processes against those frozen levels and reassembled in original order.
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from .schema import REQUIRED_COLUMNS, OPTIONAL_COLUMNS
+from .generator import build_unique_justifications, dataset_levels, dedup_stats, justification_column
+
+DEFAULT_SHARD_ROWS = 20000
+
+def _shard_worker(shard, levels):
+    return build_unique_justifications(shard, levels=levels)
+
+def _input_frame(df):
+    # Workers only need the rule inputs; keeps pickling cost independent of extra columns
+    return df[[c for c in REQUIRED_COLUMNS + OPTIONAL_COLUMNS if c in df.columns]]
+
+def build_unique_justifications_parallel(df: pd.DataFrame, workers=None, shard_rows=DEFAULT_SHARD_ROWS,
+                                         levels=None, executor=None):
+    """
+    Parallel build_unique_justifications: same (codes, texts) contract and the
+    same text as the serial path. Shards run in up to `workers` processes, or
+    on `executor` (an existing process pool) when given. Falls back to
+    in-process generation when a single shard (or a single worker) would do.
+    """
+    workers = workers or os.cpu_count() or 1
+    shard_rows = max(int(shard_rows), 1)
+    if levels is None:
+        levels = dataset_levels(df)
+    if workers <= 1 or len(df) <= shard_rows:
+        return build_unique_justifications(df, levels=levels)
+
+    frame = _input_frame(df)
+    shards = [frame.iloc[i:i + shard_rows] for i in range(0, len(frame), shard_rows)]
+    if executor is not None:
+        results = list(executor.map(partial(_shard_worker, levels=levels), shards))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as ex:
+            results = list(ex.map(partial(_shard_worker, levels=levels), shards))
+
+    # map() keeps shard order
+    parts, texts = merge_text_tables(results)
+    return np.concatenate(parts), texts
+
+def merge_text_tables(results):
+    # [(codes, texts)] from separate runs -> ([codes into one table], table); first occurrence wins
+    index, texts, parts = {}, [], []
+    for part_codes, part_texts in results:
+        remap = np.empty(len(part_texts), dtype=np.int64)
+        for j, t in enumerate(part_texts):
+            k = index.get(t)
+            if k is None:
+                k = index[t] = len(texts)
+                texts.append(t)
+            remap[j] = k
+        parts.append(remap[part_codes] if len(part_codes) else np.asarray(part_codes, dtype=np.int64))
+    return parts, texts
+
+def build_all_justifications_parallel(df: pd.DataFrame, workers=None, shard_rows=DEFAULT_SHARD_ROWS,
+                                      stats=None, levels=None):
+    codes, texts = build_unique_justifications_parallel(df, workers, shard_rows, levels)
+    if stats is not None:
+        stats.update(dedup_stats(codes, texts))
+    return np.asarray(texts, dtype=object)[codes].tolist()
+
+def build_justification_column_parallel(df: pd.DataFrame, workers=None, shard_rows=DEFAULT_SHARD_ROWS,
+                                        stats=None, levels=None):
+    # build_all_justifications_parallel as a pd.Categorical (see generator.justification_column)
+    codes, texts = build_unique_justifications_parallel(df, workers, shard_rows, levels)
+    if stats is not None:
+        stats.update(dedup_stats(codes, texts))
+    return justification_column(codes, texts)
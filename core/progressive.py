@@ -0,0 +1,205 @@
+# core/progressive.py
+# In-memory run in small steps, for the app's progress bar and Cancel button.
+# Rows are generated in chunks against whole-register 3σ/CCR levels (so the
+# text is the same as one build_justification_column pass); with polishing,
+# the distinct drafts are then sent in small batches, most frequent first.
+# Each step() does one chunk and returns, and all state stays on the object:
+# the caller can draw progress between steps, stop at any point and still
+# export what is done. Rows not generated yet are blank; drafts not polished
+# yet keep the rules text, which is also what a rejected reply falls back to.
+#
+#   run = ProgressiveRun(typed, polish=lambda items: polish_batch(model, token, items))
+#   while not run.finished:
+#       run.step()
+#       show(run.progress())
+#   df["Risk Justification"] = run.column()
+#   run.close()  # only needed when a run with workers > 1 is dropped mid-generation
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import instrument
+from .generator import (
+    build_polish_items, build_unique_justifications, dataset_levels, dedup_stats, justification_column,
+)
+from .parallel import DEFAULT_SHARD_ROWS, build_unique_justifications_parallel
+from .validate import rejection_stats
+
+DEFAULT_CHUNK_ROWS = 20_000
+DEFAULT_POLISH_CHUNK = 64
+
+class ProgressiveRun:
+    """
+    Stepwise justification of `df` (a typed register, see ingest.coerce_register).
+
+    - `levels`: dataset levels to classify against (default: from `df`)
+    - `chunk_rows`: rows per generation step; `workers` > 1 shards each step
+      over one process pool kept for the whole generation phase (the chunk
+      is widened to one shard per worker); set_workers() changes it between steps
+    - `polish(items)`: optional, takes [(payload, draft)] and returns one
+      polish_batch result dict per item; `polish_chunk` drafts per step
+
+    Timings only count time spent inside step(), so rates and ETAs stay right
+    when the caller pauses between steps.
+    """
+    def __init__(self, df, levels=None, chunk_rows=DEFAULT_CHUNK_ROWS, workers=1, polish=None,
+                 polish_chunk=DEFAULT_POLISH_CHUNK):
+        self.df = df
+        self.n_rows = len(df)
+        self._chunk_rows = int(chunk_rows)
+        self._pool = self.workers = None
+        self.set_workers(workers)
+        self.polish = polish
+        self.polish_chunk = max(int(polish_chunk), 1)
+        self.recorder = instrument.Recorder()
+        with instrument.recording(self.recorder), instrument.stage("stats"):
+            self.levels = levels if levels is not None else dataset_levels(df)
+
+        self.codes = np.full(self.n_rows, -1, dtype=np.int64)
+        self.drafts, self.payloads = [], []  # distinct rules texts (and their polishing payloads)
+        self.texts = []  # current text per code: the draft, or the polished reply once kept
+        self._index = {}
+        self.generated = 0
+        self.polished = 0
+        self._order = self._counts = None
+        self.results = []
+        self.busy = {"generate": 0.0, "polish": 0.0}
+
+    @property
+    def phase(self):
+        # "generate", "polish" or "done"
+        if self.generated < self.n_rows:
+            return "generate"
+        if self.polish is not None and self.polished < len(self.drafts):
+            return "polish"
+        return "done"
+
+    @property
+    def finished(self):
+        return self.phase == "done"
+
+    def step(self):
+        # Do one chunk of the current phase; returns the phase it worked on
+        phase = self.phase
+        if phase == "done":
+            return phase
+        t0 = time.perf_counter()
+        with instrument.recording(self.recorder):
+            if phase == "generate":
+                self._generate_chunk()
+            else:
+                self._polish_chunk()
+        self.busy[phase] += time.perf_counter() - t0
+        return phase
+
+    def _generate_chunk(self):
+        start = self.generated
+        stop = min(start + self.chunk_rows, self.n_rows)
+        chunk = self.df.iloc[start:stop]
+        payloads = None
+        with instrument.stage("generate"):
+            if self.polish is not None:
+                codes, drafts, payloads = build_polish_items(chunk, levels=self.levels)
+            elif self.workers > 1:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                codes, drafts = build_unique_justifications_parallel(chunk, self.workers, levels=self.levels,
+                                                                     executor=self._pool)
+            else:
+                codes, drafts = build_unique_justifications(chunk, levels=self.levels)
+        # Chunk-local codes -> one table for the whole run
+        remap = np.empty(len(drafts), dtype=np.int64)
+        for j, text in enumerate(drafts):
+            k = self._index.get(text)
+            if k is None:
+                k = self._index[text] = len(self.drafts)
+                self.drafts.append(text)
+                self.texts.append(text)
+                if payloads is not None:
+                    self.payloads.append(payloads[j])
+            remap[j] = k
+        self.codes[start:stop] = remap[codes] if len(codes) else codes
+        self.generated = stop
+        if stop == self.n_rows:
+            self.close()
+
+    def set_workers(self, workers):
+        # The worker count only changes how fast rows are generated, not the text,
+        # so it can change between steps; the next parallel chunk starts a new pool
+        workers = max(int(workers or 1), 1)
+        if workers != self.workers:
+            self.close()
+            self.workers = workers
+            self.chunk_rows = max(self._chunk_rows, workers * DEFAULT_SHARD_ROWS if workers > 1 else 1)
+
+    def close(self):
+        # Shut down the worker pool (started by the first parallel chunk); generation
+        # restarts it if the run is stepped again
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _polish_chunk(self):
+        if self._order is None:
+            # Most frequent drafts first: every step polishes as many rows as it can
+            counts = np.bincount(self.codes, minlength=len(self.drafts))
+            self._order = np.argsort(-counts, kind="stable")
+            self._counts = counts
+        ks = self._order[self.polished:self.polished + self.polish_chunk]
+        with instrument.stage("polish"):
+            results = self.polish([(self.payloads[k], self.drafts[k]) for k in ks])
+        for k, r in zip(ks, results):
+            self.texts[k] = r["text"]
+        self.results.extend(results)
+        self.polished += len(ks)
+
+    def progress(self):
+        """
+        {"phase", "done", "total", "unit", "per_s", "eta_s", "rows_done", "rows"}
+        for the current phase: rows while generating, distinct texts while
+        polishing ("rows_done" is then the rows those texts cover).
+        """
+        phase = self.phase
+        if phase == "polish":
+            done, total, unit = self.polished, len(self.drafts), "texts"
+            rows_done = int(self._counts[self._order[:done]].sum()) if self._order is not None else 0
+            busy = self.busy["polish"]
+        else:
+            done, total, unit = self.generated, self.n_rows, "rows"
+            rows_done = self.generated
+            busy = self.busy["generate"]
+        per_s = done / busy if busy and done else None
+        return {
+            "phase": phase, "done": done, "total": total, "unit": unit, "per_s": per_s,
+            "eta_s": (total - done) / per_s if per_s else None,
+            "rows_done": rows_done, "rows": self.n_rows,
+        }
+
+    def texts_at(self, rows):
+        # Current text for row positions `rows` (None where not generated yet: code -1 hits the last entry)
+        table = np.asarray(self.texts + [None], dtype=object)
+        return table[self.codes[rows]]
+
+    def column(self):
+        # Justification column so far (pd.Categorical); rows not generated yet are blank
+        if self.generated < self.n_rows:
+            return justification_column(np.where(self.codes < 0, len(self.texts), self.codes), self.texts + [None])
+        return justification_column(self.codes, self.texts)
+
+    def gen_stats(self):
+        # rows / unique / dedup_ratio over the rows generated so far
+        return dedup_stats(self.codes[:self.generated], self.drafts)
+
+    def polish_summary(self):
+        # None without polishing; else kept / total / failed / cached counts and rejection reasons so far
+        if self.polish is None:
+            return None
+        done = self.results
+        return {
+            "kept": sum(r["polished"] for r in done),
+            "total": len(done),
+            "failed": sum(r["error"] is not None for r in done),
+            "cached": sum(r["cached"] for r in done),
+            "reasons": rejection_stats([r["rejected"] for r in done if r["error"] is None])["reasons"],
+        }
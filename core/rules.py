@@ -1,13 +1,22 @@
 # core/rules.py
+import hashlib
 import math
+import os
+from functools import lru_cache
+from itertools import combinations
+import numpy as np
 from .schema import CATEGORY_ORDER
+from .stats import RunningStats
 
 # ------------------------
 # Dataset-level statistics
 # ------------------------
 def three_sigma_levels(series):
-    mean = float(series.mean())
-    std = float(series.std(ddof=0))
+    return three_sigma_from_stats(RunningStats.of(series))
+
+def three_sigma_from_stats(stats):
+    # Same as three_sigma_levels, from an accumulator built chunk by chunk
+    mean, std = stats.mean_std()
     return mean, std, mean - 3 * std, mean + 3 * std
 
 def classify_three_sigma(value, low_thr, high_thr):
@@ -21,6 +30,11 @@ def classify_three_sigma(value, low_thr, high_thr):
         return "high"
     return "medium"
 
+def classify_three_sigma_array(values, low_thr, high_thr):
+    # Column form of classify_three_sigma; `values` is float with NaN where float() failed
+    v = np.asarray(values, dtype=float)
+    return np.where(v < low_thr, "low", np.where(v > high_thr, "high", "medium")).astype(object)
+
 # ------------------------
 # CoF governance
 # ------------------------
@@ -79,6 +93,20 @@ def classify_ccr(ccr_value, dataset_mean=None, dataset_std=None, bands=DEFAULT_C
         return order[min(idx + 1, len(order) - 1)]
     return base
 
+CCR_ORDER = ["negligible", "low", "moderate", "high", "severe"]
+
+def classify_ccr_array(values, dataset_mean=None, dataset_std=None, bands=DEFAULT_CCR_BANDS):
+    # Column form of classify_ccr; `values` is float with NaN for missing CCR
+    v = np.asarray(values, dtype=float)
+    edges = [bands["negligible"], bands["low"], bands["moderate"], bands["high"]]
+    finite = np.isfinite(v)
+    idx = np.where(finite, np.searchsorted(edges, np.where(finite, v, 0.0), side="right"), -1)
+    if dataset_mean is not None and dataset_std is not None:
+        thr = float(dataset_mean) + 2 * float(dataset_std)
+        idx = idx + (finite & (idx < len(CCR_ORDER) - 1) & (v > thr))
+    labels = np.array(CCR_ORDER + ["unknown"], dtype=object)
+    return labels[idx]
+
 # ------------------------
 # Short phrases (for compact sentence 2)
 # ------------------------
@@ -117,8 +145,8 @@ def inspection_text(risk_cat, priority_value):
 # ------------------------
 # Opener sentence (always includes fluid + phase when available)
 # ------------------------
-def opener_sentence(pof, cof_letter, drivers, fluid, phase, toxic, inv_level, fa_level, prod_cat, ccr_label):
-    # Normalize service terms
+def service_phrases(fluid, phase, toxic):
+    # Free-text part of the opener: (service, reason)
     fluid_txt = (str(fluid).strip() if fluid not in [None, "nan", "NaN"] else "")
     phase_txt = (str(phase).strip().lower() if phase not in [None, "nan", "NaN"] else "")
     toxic_txt = (str(toxic).strip() if toxic not in [None, "nan", "NaN"] else "")
@@ -129,6 +157,21 @@ def opener_sentence(pof, cof_letter, drivers, fluid, phase, toxic, inv_level, fa
     elif fluid_txt:             service = fluid_txt
     elif phase_txt:             service = phase_txt  # rare, but acceptable
 
+    reason_bits = []
+    if service: reason_bits.append(service)
+    if toxic_txt and toxic_txt.lower() not in ("nan", "none", "no"):
+        reason_bits.append(f"with toxic {toxic_txt}")
+    reason = " ".join(reason_bits) if reason_bits else "the handled service"
+    return service, reason
+
+def opener_template(pof, cof_letter, drivers, fa_level, ccr_label):
+    """
+    Opener with the free text left as placeholders:
+    {reason}  -> reason from service_phrases()
+    {service} -> service from service_phrases(), or "service" when empty
+    """
+    reason = "{reason}"
+
     # Inventory/area cue (no numbers)
     fa = (fa_level or "").lower()
     fa_phrase = "broad affected area" if fa == "high" else ("limited affected area" if fa == "low" else "moderate affected area")
@@ -139,13 +182,6 @@ def opener_sentence(pof, cof_letter, drivers, fluid, phase, toxic, inv_level, fa
     gap = abs(pof_sev - cof_sev)
     both_due_to_ccr = (pof_sev >= 4) and (ccr_label in ["high", "severe"])
 
-    # Compose “reason”
-    reason_bits = []
-    if service: reason_bits.append(service)
-    if toxic_txt and toxic_txt.lower() not in ("nan", "none", "no"):
-        reason_bits.append(f"with toxic {toxic_txt}")
-    reason = " ".join(reason_bits) if reason_bits else "the handled service"
-
     # CoF-driven helpers
     def cof_single(driver_key, letter):
         if driver_key == "flammable":
@@ -172,7 +208,7 @@ def opener_sentence(pof, cof_letter, drivers, fluid, phase, toxic, inv_level, fa
     if pof_sev + 1 <= cof_sev:
         # PoF worse → PoF-driven
         if ccr_label in ["high", "severe"]:
-            return f"driven mainly by PoF, as elevated likelihood is reinforced by a {ccr_label} CCR in {service or 'service'}"
+            return f"driven mainly by PoF, as elevated likelihood is reinforced by a {ccr_label} CCR in {{service}}"
         return f"driven mainly by PoF, with likelihood outweighing consequence effects"
     # Otherwise CoF-driven
     if not drivers:
@@ -183,3 +219,94 @@ def opener_sentence(pof, cof_letter, drivers, fluid, phase, toxic, inv_level, fa
     if len(drivers) == 2:
         return cof_tie(list(drivers.keys()), cof_letter)
     return f"consequence-led, with flammable, toxic, and production all at Category {cof_letter}, collectively dominating due to {reason} and the {fa_phrase}"
+
+def opener_sentence(pof, cof_letter, drivers, fluid, phase, toxic, inv_level, fa_level, prod_cat, ccr_label):
+    service, reason = service_phrases(fluid, phase, toxic)
+    template = opener_template(pof, cof_letter, drivers, fa_level, ccr_label)
+    return template.format(reason=reason, service=service or "service")
+
+# ------------------------
+# Compiled rule table (finite domain enumerated once)
+# ------------------------
+POF_DOMAIN = [None, 1, 2, 3, 4, 5]
+COF_DOMAIN = [None] + list(CATEGORY_ORDER)
+DRIVER_KEYS = ("flammable", "toxic", "production")  # insertion order used by governing_cof
+FA_LEVELS = ["low", "medium", "high"]
+CCR_LABELS = CCR_ORDER + ["unknown"]
+INSPECTION_KEYS = ["HIGH", "MEDIUM HIGH", "MEDIUM", "LOW", ""]
+
+def inspection_key(risk_cat):
+    risk = str(risk_cat).strip().upper()
+    return risk if risk in INSPECTION_KEYS else ""
+
+def _driver_domain(letter):
+    if letter is None:
+        return [()]
+    return [keys for n in (1, 2, 3) for keys in combinations(DRIVER_KEYS, n)]
+
+class RuleTable:
+    """
+    Sentence templates keyed on the discrete rule inputs. Openers keep the
+    {reason}/{service} placeholders; row templates add {risk}/{flam}/{tox}/{prod}.
+    Keys outside the enumerated domain (e.g. PoF 7) are computed on first use.
+    """
+    def __init__(self):
+        self.openers = {}
+        for pof in POF_DOMAIN:
+            for letter in COF_DOMAIN:
+                for keys in _driver_domain(letter):
+                    for fa in FA_LEVELS:
+                        for label in CCR_LABELS:
+                            self.opener(pof, letter, keys, fa, label)
+        self.summaries = {}
+        for pof in POF_DOMAIN:
+            for label in CCR_LABELS:
+                for risk in INSPECTION_KEYS:
+                    self.summary(pof, label, risk)
+        self.rows = {}
+
+    def opener(self, pof, cof_letter, driver_keys, fa_level, ccr_label):
+        key = (pof, cof_letter, driver_keys, fa_level, ccr_label)
+        tpl = self.openers.get(key)
+        if tpl is None:
+            drivers = dict.fromkeys(driver_keys, cof_letter)
+            tpl = self.openers[key] = opener_template(pof, cof_letter, drivers, fa_level, ccr_label)
+        return tpl
+
+    def summary(self, pof, ccr_label, risk_cat):
+        key = (pof, ccr_label, inspection_key(risk_cat))
+        txt = self.summaries.get(key)
+        if txt is None:
+            txt = self.summaries[key] = f"{pof_band_short(pof)}; {ccr_short(ccr_label)}; {inspection_text(key[2], None)}"
+        return txt
+
+    def row(self, pof, cof_letter, driver_keys, fa_level, ccr_label, risk_cat):
+        # Whole justification as one template: a lookup plus a single .format() per component
+        key = (pof, cof_letter, driver_keys, fa_level, ccr_label, inspection_key(risk_cat))
+        tpl = self.rows.get(key)
+        if tpl is None:
+            tpl = self.rows[key] = (
+                "The risk is {risk}, "
+                + self.opener(pof, cof_letter, driver_keys, fa_level, ccr_label)
+                + ". " + self.summary(pof, ccr_label, risk_cat) + ". "
+                + "Flam/Tox/Prod = {flam}/{tox}/{prod}; "
+                + f"with CoF governed by Category {cof_letter if cof_letter else 'N/A'}, the profile remains {{risk}}."
+            )
+        return tpl
+
+@lru_cache(maxsize=None)
+def compiled_rules():
+    return RuleTable()
+
+# Modules whose code decides the wording; editing any of them changes the version
+_RULE_SOURCES = ("rules.py", "generator.py", "schema.py", "ingest.py")
+
+@lru_cache(maxsize=None)
+def rules_version():
+    # Short content hash of the rule code, for cache keys that must expire when the rules change
+    h = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in _RULE_SOURCES:
+        with open(os.path.join(here, name), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
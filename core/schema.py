@@ -26,5 +26,28 @@ OPTIONAL_COLUMNS = [
 
 CATEGORY_ORDER = {"A": 1, "B": 2, "C": 3, "D": 4, "E": 5}  # lower = worse
 
+# Column types for the typed ingest (core/ingest.py)
+NUMERIC_COLUMNS = [
+    "Int Corr Rate",
+    "Ext Corr Rate",
+    "Inventory",
+    "Flammable Affected Area",
+    "Int Controlling Corrosion Rate",
+    "Controlling Corr Rate",
+]
+POF_COLUMN = "Driving PoF"
+LETTER_COLUMNS = ["Flamm Conseq Categ", "Toxic Conseq Cat", "Lost Production Category"]
+PHASE_COLUMN = "Initial Fluid Phase"
+RISK_COLUMN = "Risk Category"
+RISK_CATEGORIES = ["HIGH", "MEDIUM HIGH", "MEDIUM", "LOW"]
+TEXT_COLUMNS = [
+    "Component",
+    "Risk Category",
+    "Inspection Priority",
+    "Representative Fluid",
+    "Fluid Type",
+    "Toxic Fluid",
+]
+
 def missing_columns(df):
     return [c for c in REQUIRED_COLUMNS if c not in df.columns] 
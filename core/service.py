@@ -0,0 +1,350 @@
+# core/service.py
+# Local HTTP service for other tools (planning system, nightly ETL). Standard
+# library only: a threaded HTTP server in front of a pre-forked process pool.
+# Requests are queued and batched: every batch is generated in one pass over
+# the pool, each request keeping its own 3σ/CCR baseline (core.grouped), so a
+# response is the same as justifying that request's rows as one register.
+#
+#   python -m core.service --port 8765 -w 4
+#
+#   POST /justify        JSON {"rows": [{column: value, ...}, ...]}
+#                        or {"columns": [...], "data": [[...], ...]}
+#                        -> {"justifications": [...], "rows", "unique", "invalid"}
+#   POST /justify?format=xlsx|csv|parquet
+#                        the file as the request body (Content-Type also works);
+#                        JSON reply, or the justified file with &output=xlsx|csv|parquet
+#   GET  /health         status + metrics (rows/s, queue depth, latency)
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from .schema import missing_columns
+from .ingest import coerce_register, compact_frame
+from .generator import justification_column
+from .grouped import build_grouped_unique_justifications
+from .formats import FORMATS, INPUT_COLUMNS, MIME_TYPES, read_register, write_register
+from .xlsxpatch import export_patched
+from .stream import OUTPUT_COLUMN
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BATCH_ROWS = 50_000
+DEFAULT_MAX_WAIT_MS = 10
+MAX_BODY_BYTES = 512 * 1024 * 1024
+RATE_WINDOW_S = 10  # rows_per_s and latency percentiles cover the last 10 s
+CONTENT_FORMATS = {mime: fmt for fmt, mime in MIME_TYPES.items()}
+
+def _warmup():
+    # Runs once per worker so the engine is imported before the first request arrives
+    from . import generator  # noqa: F401
+    return os.getpid()
+
+class _Job:
+    __slots__ = ("frame", "future", "queued")
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.future = Future()
+        self.queued = time.perf_counter()
+
+class Justifier:
+    """
+    Request batcher over a pre-forked pool of `workers` processes. submit()
+    queues one typed register and returns a Future of (codes, texts); a
+    background thread drains the queue into batches of up to
+    `max_batch_rows` rows, waiting at most `max_wait_ms` for a batch to fill.
+    """
+    def __init__(self, workers=None, max_batch_rows=DEFAULT_MAX_BATCH_ROWS, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.pids = sorted(set(f.result() for f in [self.pool.submit(_warmup) for _ in range(self.workers)]))
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.started = time.time()
+        self.stats = {"requests": 0, "rows": 0, "batches": 0, "errors": 0, "busy_s": 0.0,
+                      "queued_rows": 0, "in_flight_rows": 0, "latency_ms_max": 0.0}
+        self._recent = deque()  # (finished at, rows, latency s) for the rate window
+        self._thread = threading.Thread(target=self._run, name="justifier-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, typed):
+        job = _Job(typed)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("service is shutting down")
+            self._queue.append(job)
+            self.stats["queued_rows"] += len(typed)
+            self._cond.notify()
+        return job.future
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return None
+            # Let concurrent requests join until the batch is full or max_wait has passed
+            deadline = time.perf_counter() + self.max_wait
+            while sum(len(j.frame) for j in self._queue) < self.max_batch_rows and not self._closed:
+                left = deadline - time.perf_counter()
+                if left <= 0:
+                    break
+                self._cond.wait(left)
+            batch, rows = [], 0
+            while self._queue and (not batch or rows + len(self._queue[0].frame) <= self.max_batch_rows):
+                job = self._queue.popleft()
+                batch.append(job)
+                rows += len(job.frame)
+            self.stats["queued_rows"] -= rows
+            self.stats["in_flight_rows"] = rows
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            t0 = time.perf_counter()
+            try:
+                codes, texts = self._generate(batch)
+            except Exception as e:
+                for job in batch:
+                    job.future.set_exception(e)
+                with self._cond:
+                    self.stats["errors"] += len(batch)
+                    self.stats["in_flight_rows"] = 0
+                continue
+            done = time.perf_counter()
+            start = 0
+            for job in batch:
+                n = len(job.frame)
+                job.future.set_result((codes[start:start + n], texts))
+                start += n
+            with self._cond:
+                self._account(batch, done, done - t0)
+
+    def _generate(self, batch):
+        # One group per request: each keeps its own dataset baseline
+        stacked = pd.concat([j.frame for j in batch], ignore_index=True)
+        labels = np.repeat(np.arange(len(batch)), [len(j.frame) for j in batch])
+        shard_rows = max(1000, len(stacked) // self.workers)
+        return build_grouped_unique_justifications(stacked, labels, shard_rows=shard_rows, executor=self.pool)
+
+    def _account(self, batch, done, busy):
+        rows = sum(len(j.frame) for j in batch)
+        s = self.stats
+        s["requests"] += len(batch)
+        s["rows"] += rows
+        s["batches"] += 1
+        s["busy_s"] += busy
+        s["in_flight_rows"] = 0
+        for job in batch:
+            latency = done - job.queued
+            s["latency_ms_max"] = max(s["latency_ms_max"], latency * 1000)
+            self._recent.append((done, len(job.frame), latency))
+        while self._recent and self._recent[0][0] < done - RATE_WINDOW_S:
+            self._recent.popleft()
+
+    def metrics(self):
+        now = time.perf_counter()
+        with self._cond:
+            s = dict(self.stats)
+            recent = [r for r in self._recent if r[0] >= now - RATE_WINDOW_S]
+            queue_depth = len(self._queue)
+        uptime = time.time() - self.started
+        window = min(RATE_WINDOW_S, uptime) or 1.0
+        lat = sorted(r[2] for r in recent)
+        return {
+            "workers": self.workers,
+            "uptime_s": round(uptime, 1),
+            "queue_depth": queue_depth,
+            "queued_rows": s["queued_rows"],
+            "in_flight_rows": s["in_flight_rows"],
+            "requests": s["requests"],
+            "rows": s["rows"],
+            "batches": s["batches"],
+            "errors": s["errors"],
+            "rows_per_s": round(sum(r[1] for r in recent) / window, 1),
+            "rows_per_busy_s": round(s["rows"] / s["busy_s"], 1) if s["busy_s"] else None,
+            "latency_ms_p50": round(lat[len(lat) // 2] * 1000, 1) if lat else None,
+            "latency_ms_p95": round(lat[int(len(lat) * 0.95)] * 1000, 1) if lat else None,
+            "latency_ms_max": round(s["latency_ms_max"], 1),
+        }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.pool.shutdown()
+
+# ------------------------
+# HTTP
+# ------------------------
+class ServiceError(Exception):
+    # `close`: the request body was not read, so the connection can't be reused
+    def __init__(self, status, message, close=False):
+        super().__init__(message)
+        self.status = status
+        self.close = close
+
+def rows_frame(body):
+    # DataFrame from {"rows": [...]}, a bare list of row objects, or {"columns", "data"}
+    if isinstance(body, dict) and "columns" in body:
+        return pd.DataFrame(body.get("data") or [], columns=body["columns"])
+    rows = body.get("rows") if isinstance(body, dict) else body
+    if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+        raise ServiceError(400, 'expected {"rows": [{column: value, ...}, ...]} or {"columns": [...], "data": [...]}')
+    return pd.DataFrame.from_records(rows)
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "rbi-justifier"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        if not self.server.quiet:
+            super().log_message(fmt, *args)
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        data = json.dumps(body, default=str).encode() if content_type == "application/json" else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path in ("/health", "/metrics"):
+            self._send(200, {"status": "ok", **self.server.justifier.metrics()})
+        else:
+            self._send(404, {"error": f"no route {path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/justify":
+            # The body is left unread: close the connection rather than parse it as the next request
+            self._send(404, {"error": f"no route {url.path}"}, headers={"Connection": "close"})
+            return
+        try:
+            self._send(*self._justify(parse_qs(url.query)))
+        except ServiceError as e:
+            self._send(e.status, {"error": str(e)}, headers={"Connection": "close"} if e.close else None)
+        except Exception as e:
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def _read_body(self):
+        try:
+            n = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            raise ServiceError(400, "invalid Content-Length", close=True)
+        if n < 0:
+            raise ServiceError(400, "invalid Content-Length", close=True)
+        if n > MAX_BODY_BYTES:
+            raise ServiceError(413, f"body larger than {MAX_BODY_BYTES} bytes", close=True)
+        return self.rfile.read(n)
+
+    def _justify(self, query):
+        body = self._read_body()
+        fmt = (query.get("format") or [None])[0]
+        ctype = (self.headers.get("Content-Type") or "application/json").split(";")[0].strip()
+        fmt = fmt or CONTENT_FORMATS.get(ctype)
+        if fmt is None and ctype == "application/octet-stream":
+            raise ServiceError(400, f"binary body: give its format with ?format= (one of {FORMATS})")
+        output = (query.get("output") or [None])[0]
+        if output is not None and output not in FORMATS:
+            raise ServiceError(400, f"output must be one of {FORMATS}")
+
+        if fmt is None:
+            try:
+                df = rows_frame(json.loads(body or b"null"))
+            except ValueError as e:
+                raise ServiceError(400, f"invalid JSON: {e}")
+        elif fmt in FORMATS:
+            try:
+                df = read_register(io.BytesIO(body), fmt, columns=None if output else INPUT_COLUMNS)
+            except Exception as e:
+                raise ServiceError(400, f"could not read {fmt}: {e}")
+        else:
+            raise ServiceError(400, f"format must be one of {FORMATS}")
+
+        miss = missing_columns(df)
+        if miss:
+            raise ServiceError(400, f"Missing required columns: {miss}")
+        df = compact_frame(df)
+        typed, report = coerce_register(df)
+        codes, texts = self.server.justifier.submit(typed).result()
+
+        if output is not None:
+            df[OUTPUT_COLUMN] = justification_column(codes, texts)
+            buf, headers = io.BytesIO(), {}
+            if output == "xlsx" and fmt == "xlsx":
+                patch = {}
+                export_patched(df, buf, body, report=patch)  # the uploaded workbook with the column patched in
+                if patch["reason"]:
+                    # Rebuilt from values: formatting and formulas of the upload are not kept
+                    headers["X-Export-Rebuilt"] = patch["reason"]
+            else:
+                write_register(df, buf, output)
+            return 200, buf.getvalue(), MIME_TYPES[output], headers
+        used = np.unique(codes)
+        return 200, {
+            "justifications": np.asarray(texts, dtype=object)[codes].tolist(),
+            "rows": len(codes),
+            "unique": len(used),
+            "invalid": report["invalid"],
+        }
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # listen backlog; the default of 5 resets connections under load
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, justifier=None, quiet=False):
+    server = Server((host, port), Handler)
+    server.justifier = justifier or Justifier()
+    server.quiet = quiet
+    return server
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m core.service",
+                                 description="Serve RBI risk justifications over HTTP (local, no external services).")
+    ap.add_argument("--host", default="127.0.0.1", help="bind address (default: %(default)s)")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT, help="port (default: %(default)s)")
+    ap.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    ap.add_argument("--max-batch-rows", type=int, default=DEFAULT_MAX_BATCH_ROWS,
+                    help="rows per generation batch (default: %(default)s)")
+    ap.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                    help="how long a batch waits for more requests (default: %(default)s)")
+    ap.add_argument("--quiet", action="store_true", help="no per-request access log")
+    args = ap.parse_args(argv)
+
+    justifier = Justifier(args.workers, args.max_batch_rows, args.max_wait_ms)
+    server = make_server(args.host, args.port, justifier, args.quiet)
+    print(f"Serving on http://{args.host}:{server.server_port} with {justifier.workers} workers "
+          f"(POST /justify, GET /health)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        justifier.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
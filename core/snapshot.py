@@ -0,0 +1,239 @@
+# core/snapshot.py
+# On-disk snapshots of parsed workbooks, keyed by file content hash, so a
+# workbook uploaded again skips openpyxl entirely. One directory per snapshot:
+#   meta.json           rows, column labels, per-column kind/dtype
+#   c<i>.npy            numeric / bool / datetime columns as-is
+#   c<i>.codes.npy      object columns: int32 codes ...
+#   c<i>.values.json    ... into their distinct values (type preserved)
+# Nothing is pickled, so a snapshot directory someone else can write to (a
+# shared RBI_CACHE_DIR) can't run code in the reading process; frames holding
+# values of other types are not snapshotted.
+# Total size is capped; least recently used snapshots are removed first.
+# The cache is best effort: a snapshot that can't be read, written or touched
+# (disk full, read-only cache dir, another process saving the same workbook)
+# is a miss, never an error.
+import datetime
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from .cache import CACHE_DIR
+from .generator import _factorize
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(CACHE_DIR, "snapshots")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Bump when the layout changes or parsing would give different frames
+SNAPSHOT_VERSION = f"2-pd{pd.__version__}"
+
+def content_key(data: bytes, sheet=0) -> str:
+    h = hashlib.sha256(data)
+    h.update(f"|{sheet}|{SNAPSHOT_VERSION}".encode())
+    return h.hexdigest()
+
+# Values of object columns (and column labels) are stored as one JSON list.
+# str, int, bool and None come back from json.load as they were; other types
+# are stored converted, with the positions of each listed under their tag.
+_NATIVE = (str, int, bool)
+# Exact type -> (tag, to JSON, from JSON)
+_TYPES = {
+    float: ("float", repr, float),  # repr round-trips, nan and inf included
+    pd.Timestamp: ("timestamp", pd.Timestamp.isoformat, pd.Timestamp),
+    datetime.datetime: ("datetime", datetime.datetime.isoformat, datetime.datetime.fromisoformat),
+    datetime.date: ("date", datetime.date.isoformat, datetime.date.fromisoformat),
+    datetime.time: ("time", datetime.time.isoformat, datetime.time.fromisoformat),
+    datetime.timedelta: ("timedelta", lambda v: v // datetime.timedelta(microseconds=1),
+                         lambda v: datetime.timedelta(microseconds=v)),
+}
+_DECODE = {tag: load for tag, _, load in _TYPES.values()}
+
+class _Unstorable(Exception):
+    pass
+
+def _encode(values):
+    # {"values": [...], "types": {tag: [positions]}}; raises _Unstorable for other types
+    out, types = [], {}
+    for i, v in enumerate(values):
+        t = type(v)
+        if v is None or t in _NATIVE:
+            out.append(v)
+        elif t in _TYPES:
+            tag, dump, _ = _TYPES[t]
+            out.append(dump(v))
+            types.setdefault(tag, []).append(i)
+        else:
+            raise _Unstorable(t.__name__)
+    return {"values": out, "types": types}
+
+def _decode(stored):
+    # Object array of the values _encode was given
+    values = stored["values"]
+    out = np.empty(len(values), dtype=object)
+    out[:] = values
+    for tag, positions in stored["types"].items():
+        load = _DECODE[tag]
+        for i in positions:
+            out[i] = load(values[i])
+    return out
+
+def _dir_bytes(path):
+    return sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+
+class SnapshotCache:
+    """
+    Parsed-workbook snapshots under `root`, at most `max_bytes` in total.
+    load() returns the DataFrame pd.read_excel gave when it was saved (same
+    dtypes, same Python types inside object columns) or None.
+    """
+    def __init__(self, root=DEFAULT_SNAPSHOT_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(root, exist_ok=True)
+        except OSError:
+            pass  # every load misses and every save fails
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def load(self, key):
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            names = _decode(meta["names"])
+            data = {}
+            for i, (name, col) in enumerate(zip(names, meta["columns"])):
+                base = os.path.join(path, f"c{i}")
+                if col["kind"] == "array":
+                    data[name] = np.load(base + ".npy")
+                else:
+                    codes = np.load(base + ".codes.npy")
+                    with open(base + ".values.json", encoding="utf-8") as f:
+                        values = _decode(json.load(f))
+                    data[name] = values[codes]
+            os.utime(os.path.join(path, "meta.json"))  # LRU clock; fails if evicted meanwhile
+        except (OSError, ValueError, KeyError, IndexError, TypeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pd.DataFrame(data, index=pd.RangeIndex(meta["rows"]), columns=pd.Index(names, dtype=object))
+
+    def save(self, key, df: pd.DataFrame):
+        # Returns False when nothing was stored: frames this format can't reproduce
+        # exactly, or a failed write (the snapshot is then a miss next time)
+        if not isinstance(df.index, pd.RangeIndex) or df.columns.has_duplicates:
+            return False
+        if any(not isinstance(dt, np.dtype) or dt.kind not in "biufcmMO" for dt in df.dtypes):
+            return False
+        try:
+            names = _encode(df.columns)
+            parts = []
+            for name in df.columns:
+                s = df[name]
+                if s.dtype == object:
+                    codes, values = _factorize(s.to_numpy(dtype=object))
+                    parts.append((codes.astype(np.int32), _encode(values)))
+                else:
+                    parts.append((s.to_numpy(), None))
+        except _Unstorable:
+            return False
+
+        tmp = self._path(f".tmp-{uuid.uuid4().hex}")
+        try:
+            os.makedirs(tmp)
+            cols = []
+            for i, (array, values) in enumerate(parts):
+                base = os.path.join(tmp, f"c{i}")
+                if values is not None:
+                    np.save(base + ".codes.npy", array)
+                    with open(base + ".values.json", "w", encoding="utf-8") as f:
+                        json.dump(values, f, ensure_ascii=False)
+                    cols.append({"kind": "object"})
+                else:
+                    np.save(base + ".npy", array, allow_pickle=False)
+                    cols.append({"kind": "array", "dtype": str(array.dtype)})
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"rows": len(df), "names": names, "columns": cols, "created": time.time()}, f,
+                          ensure_ascii=False)
+            with self._lock:
+                dest = self._path(key)
+                if os.path.exists(dest):
+                    shutil.rmtree(tmp)
+                else:
+                    # Raises (ENOTEMPTY) if another process stored the same key since the check
+                    os.replace(tmp, dest)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            return False
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        try:
+            self.evict()
+        except OSError:
+            pass  # evicted by another process meanwhile; the next save tries again
+        return True
+
+    def _entries(self):
+        # [(last_used, bytes, path)], oldest first
+        out = []
+        for e in os.scandir(self.root):
+            if e.is_dir() and not e.name.startswith(".tmp-"):
+                try:
+                    out.append((os.stat(os.path.join(e.path, "meta.json")).st_mtime, _dir_bytes(e.path), e.path))
+                except OSError:
+                    continue
+        return sorted(out)
+
+    def evict(self):
+        # Drops least recently used snapshots until the total fits; returns how many went
+        removed = 0
+        with self._lock:
+            entries = self._entries()
+            total = sum(b for _, b, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                removed += 1
+        return removed
+
+    def stats(self):
+        entries = self._entries()
+        return {"hits": self.hits, "misses": self.misses, "entries": len(entries),
+                "bytes": sum(b for _, b, _ in entries)}
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._entries():
+                shutil.rmtree(path, ignore_errors=True)
+
+def read_excel_cached(source, cache=None, sheet=0):
+    """
+    pd.read_excel(source, sheet_name=sheet) through a SnapshotCache.
+    `source` is a path or the workbook bytes. Cache failures only cost the
+    snapshot: the parsed frame is returned either way.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        data = bytes(source)
+    else:
+        with open(source, "rb") as f:
+            data = f.read()
+    cache = cache or SnapshotCache()
+    key = content_key(data, sheet)
+    df = cache.load(key)
+    if df is None:
+        df = pd.read_excel(io.BytesIO(data), sheet_name=sheet)
+        cache.save(key, df)
+    return df
@@ -0,0 +1,67 @@
+# core/stats.py
+import numpy as np
+
+class RunningStats:
+    """
+    Count / mean / M2 over the non-NaN values seen so far (population std,
+    ddof=0). update() folds in a chunk; merge() combines accumulators built
+    on other chunks or workers (Chan et al. parallel variance).
+
+    A single update() over a whole column reproduces pandas' mean() and
+    std(ddof=0) bit for bit; merged chunks agree to floating-point rounding.
+    """
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n, self.mean, self.m2 = n, mean, m2
+
+    @classmethod
+    def of(cls, values):
+        return cls().update(values)
+
+    def update(self, values):
+        x = np.asarray(values)
+        if x.dtype == object:
+            x = x.astype(float)
+        x = x.astype(float, copy=False)
+        mask = np.isnan(x)
+        n_b = int(x.size - mask.sum())
+        if not n_b:
+            return self
+        # NaNs are zero-filled rather than dropped so the pairwise sums match pandas' nanops
+        with np.errstate(invalid="ignore", over="ignore"):
+            mean_b = np.where(mask, 0.0, x).sum() / n_b
+            m2_b = np.where(mask, 0.0, (mean_b - x) ** 2).sum()
+        return self.merge(RunningStats(n_b, float(mean_b), float(m2_b)))
+
+    def merge(self, other):
+        if not other.n:
+            return self
+        if not self.n:
+            self.n, self.mean, self.m2 = other.n, other.mean, other.m2
+            return self
+        n = self.n + other.n
+        with np.errstate(invalid="ignore", over="ignore"):
+            delta = other.mean - self.mean
+            self.mean = self.mean + delta * other.n / n
+            self.m2 = self.m2 + other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        return self
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.m2 / self.n)) if self.n else float("nan")
+
+    def mean_std(self):
+        return (float(self.mean) if self.n else float("nan")), self.std
+
+    def to_dict(self):
+        return {"n": self.n, "mean": self.mean, "m2": self.m2}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(int(d["n"]), float(d["mean"]), float(d["m2"]))
+
+    def __repr__(self):
+        mean, std = self.mean_std()
+        return f"RunningStats(n={self.n}, mean={mean!r}, std={std!r})"
@@ -0,0 +1,175 @@
+# core/stream.py
+# Bounded-memory pipeline for very large workbooks:
+#   pass 1: read chunks (openpyxl read-only) -> dataset thresholds + column dtypes
+#   pass 2: read chunks again -> justifications per chunk -> xlsxwriter constant_memory
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers import TextParser
+
+from . import instrument
+from .generator import build_all_justifications, ccr_column, levels_from_stats
+from .ingest import coerce_register, merge_reports
+from .stats import RunningStats
+
+DEFAULT_CHUNK_ROWS = 5000
+OUTPUT_COLUMN = "Risk Justification"
+
+# ------------------------
+# Chunked reading
+# ------------------------
+def _cell_value(cell):
+    # Same conversion pandas applies to openpyxl cells in read_excel
+    if cell.value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        val = int(cell.value)
+        if val == cell.value:
+            return val
+        return float(cell.value)
+    return cell.value
+
+def _raw_chunks(source, chunk_rows, sheet=0):
+    # Yields the header first, then lists of padded raw rows
+    if hasattr(source, "seek"):
+        source.seek(0)
+    wb = load_workbook(source, read_only=True, data_only=True, keep_links=False)
+    try:
+        ws = wb.worksheets[sheet] if isinstance(sheet, int) else wb[sheet]
+        rows = ws.iter_rows()
+        header = next(rows, ())
+        names = [_cell_value(c) for c in header]
+        while names and names[-1] == "":
+            names.pop()
+        names = [n if n != "" else f"Unnamed: {i}" for i, n in enumerate(names)]
+        yield names
+
+        width, buf = len(names), []
+        for row in rows:
+            vals = [_cell_value(c) for c in row[:width]]
+            vals += [""] * (width - len(vals))
+            buf.append(vals)
+            if len(buf) >= chunk_rows:
+                yield buf
+                buf = []
+        if buf:
+            yield buf
+    finally:
+        wb.close()
+
+def read_header(source, sheet=0):
+    chunks = _raw_chunks(source, 1, sheet)
+    names = next(chunks)
+    chunks.close()
+    return names
+
+def iter_frames(source, chunk_rows=DEFAULT_CHUNK_ROWS, sheet=0, dtypes=None):
+    """
+    DataFrame chunks of the sheet. Pass the `dtypes` found by scan_workbook so
+    every chunk gets the column types a whole-sheet pd.read_excel would infer.
+    """
+    chunks = _raw_chunks(source, chunk_rows, sheet)
+    names = next(chunks)
+    for rows in chunks:
+        df = TextParser(rows, header=None, names=names, dtype=dtypes).read()
+        if len(df):
+            yield df
+
+def _merge_dtype(a, b):
+    if a is None or a == b:
+        return b
+    if {a, b} <= {"int64", "float64"}:
+        return "float64"
+    return "object"
+
+# ------------------------
+# Pass 1: dataset statistics
+# ------------------------
+def scan_workbook(source, chunk_rows=DEFAULT_CHUNK_ROWS, sheet=0):
+    """
+    First pass. Returns (levels, dtypes, n_rows); `levels` has the same keys
+    as generator.dataset_levels so it can be handed to build_all_justifications.
+    """
+    inv, fa, ccr = RunningStats(), RunningStats(), RunningStats()
+    dtypes, n_rows = {}, 0
+    for df in instrument.timed_iter("stream.read", iter_frames(source, chunk_rows, sheet)):
+        for col in df.columns:
+            dtypes[col] = _merge_dtype(dtypes.get(col), str(df[col].dtype))
+        inv.update(pd.to_numeric(df["Inventory"], errors="coerce"))
+        fa.update(pd.to_numeric(df["Flammable Affected Area"], errors="coerce"))
+        ccr.update(ccr_column(df))
+        n_rows += len(df)
+
+    with instrument.stage("stats"):
+        levels = levels_from_stats(inv, fa, ccr)
+    # Only pin the types a chunk can get wrong on its own; int/bool columns infer the same
+    pinned = {c: t for c, t in dtypes.items() if t in ("object", "float64")}
+    return levels, pinned, n_rows
+
+# ------------------------
+# Pass 2: generation + constant-memory export
+# ------------------------
+def iter_justifications(source, levels, dtypes=None, chunk_rows=DEFAULT_CHUNK_ROWS, sheet=0, report=None):
+    # Yields (chunk_df, justifications) with dataset-wide thresholds applied to every chunk;
+    # chunks are coerced (ingest.coerce_register) for generation and yielded as read.
+    # `report` (optional dict) receives the invalid-cell report of the whole sheet once
+    # the last chunk is done, as coerce_register gives it for the in-memory path
+    merged, rows = None, 0
+    for df in instrument.timed_iter("stream.read", iter_frames(source, chunk_rows, sheet, dtypes)):
+        with instrument.stage("stream.validate"):
+            typed, chunk_report = coerce_register(df)
+            if report is not None:
+                merged = merge_reports(merged, chunk_report, rows)
+        rows += len(df)
+        yield df, build_all_justifications(typed, levels=levels)
+    if report is not None and merged is not None:
+        report.update(merged)
+
+def _write_row(ws, r, values, date_fmt):
+    for c, v in enumerate(values):
+        if v is None or v is pd.NaT or (isinstance(v, float) and v != v):
+            continue
+        if isinstance(v, pd.Timestamp):
+            ws.write_datetime(r, c, v.to_pydatetime(), date_fmt)
+        else:
+            ws.write(r, c, v)
+
+def write_justified_xlsx(source, out, chunk_rows=DEFAULT_CHUNK_ROWS, sheet=0,
+                         sheet_name="Table1", on_chunk=None, report=None):
+    """
+    Stream `source` into `out` (path or binary file) with the Risk Justification
+    column added, holding at most one chunk in memory. `on_chunk(df)` sees each
+    finished chunk (e.g. to keep a preview); `report` (optional dict) receives
+    the invalid-cell report (see ingest.coerce_register). Returns the number
+    of rows written.
+    """
+    import xlsxwriter
+
+    levels, dtypes, _ = scan_workbook(source, chunk_rows, sheet)
+    names = read_header(source, sheet)
+    header = names if OUTPUT_COLUMN in names else names + [OUTPUT_COLUMN]
+
+    wb = xlsxwriter.Workbook(out, {"constant_memory": True})
+    try:
+        ws = wb.add_worksheet(sheet_name)
+        head_fmt = wb.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+        date_fmt = wb.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+        for c, name in enumerate(header):
+            ws.write(0, c, name, head_fmt)
+
+        r = 1
+        for df, justs in iter_justifications(source, levels, dtypes, chunk_rows, sheet, report):
+            df[OUTPUT_COLUMN] = justs
+            with instrument.stage("stream.write"):
+                for values in df[header].itertuples(index=False, name=None):
+                    _write_row(ws, r, values, date_fmt)
+                    r += 1
+            instrument.count("stream.chunks")
+            if on_chunk is not None:
+                on_chunk(df)
+    finally:
+        wb.close()
+    return r - 1
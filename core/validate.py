@@ -1,32 +1,111 @@
 import re
+from collections import Counter
 
-def safe_keep_or_fallback(model_text: str, payload: dict, draft_text: str) -> str:
-    # Require PoF pattern
-    pof = payload.get("pof")
-    if pof is not None and f"PoF = {pof}" not in model_text:
-        return draft_text
+from . import instrument
 
-    # Require governing_cof letter
-    g = payload.get("governing_cof")
-    if g and f"Category {g}" not in model_text:
-        return draft_text
+# Payload keys checked against the model text, in report order
+FACT_KEYS = ["pof", "governing_cof", "risk_category", "flamm_cat", "tox_cat", "prod_cat",
+             "int_corr_rate", "ext_corr_rate"]
+LETTER_KEYS = ["flamm_cat", "tox_cat", "prod_cat"]
+RATE_KEYS = ["int_corr_rate", "ext_corr_rate"]
 
-    # Require final risk category mention
-    rc = payload.get("risk_category")
-    if rc and rc not in model_text:
-        return draft_text
+_NUMBER = re.compile(r"(?<![\w.])\d+(?:\.\d+)?")
+
+class FactValidator:
+    """
+    Checks that a rewritten justification still states the facts in its payload.
+    Patterns are compiled once per distinct fact value and reused across the
+    batch, so validating thousands of replies costs a few regex searches each.
+
+    check() returns the payload keys whose fact is missing (empty = keep).
+    Corrosion rates match any number in the text within `rate_tolerance`, so
+    "0.1" and "0.10" are the same rate.
+    """
+    def __init__(self, rate_tolerance=0.005):
+        self.rate_tolerance = rate_tolerance
+        self._patterns = {}
+
+    def _pattern(self, key, value):
+        cache_key = (key, value)
+        pat = self._patterns.get(cache_key)
+        if pat is None:
+            pat = self._patterns[cache_key] = re.compile(self._regex(key, value))
+        return pat
+
+    @staticmethod
+    def _regex(key, value):
+        v = re.escape(str(value))
+        if key == "pof":
+            # The forms drafts use: "PoF = 4", "PoF 4" or "PoF is low (4)". The number must
+            # stand alone (not the 4 of "C4", the 2 of "H2S" or "2.5"); a full stop may follow
+            return rf"\bPoF(?:\s*=?\s*{v}(?!\w|\.\d)|\b[^\d.;()]{{0,40}}?\(\s*{v}\s*\))"
+        if key == "governing_cof":
+            return rf"\bCategory\s+{v}\b"
+        if key == "risk_category":
+            # MEDIUM must not be the start of MEDIUM HIGH, HIGH not the end of it
+            return rf"(?<![\w-])(?<!MEDIUM ){v}(?![\w-])(?!\s+(?:HIGH|LOW)\b)"
+        if key == "letters":
+            f, t, p = (re.escape(str(x)) for x in value)
+            return rf"(?<![\w/]){f}\s*/\s*{t}\s*/\s*{p}(?![\w/])"
+        # Single CoF letter as a standalone token
+        return rf"(?<![A-Za-z0-9]){v}(?![A-Za-z0-9])"
+
+    def check(self, model_text, payload):
+        text = model_text or ""
+        missing = []
 
-    # Basic letter presence
-    for k in ["flamm_cat", "tox_cat", "prod_cat"]:
-        v = payload.get(k)
-        if v and v not in model_text:
-            return draft_text
+        pof = payload.get("pof")
+        if pof is not None and not self._pattern("pof", pof).search(text):
+            missing.append("pof")
 
-    # Do not allow different numbers for corrosion rates if provided
-    for key in ["int_corr_rate", "ext_corr_rate"]:
-        if key in payload and payload[key] is not None:
-            num = f"{payload[key]:.2f}"
-            if num not in model_text:
-                return draft_text
+        g = payload.get("governing_cof")
+        if g and not self._pattern("governing_cof", g).search(text):
+            missing.append("governing_cof")
 
+        rc = payload.get("risk_category")
+        if rc and not self._pattern("risk_category", rc).search(text):
+            missing.append("risk_category")
+
+        # Letters: the compact "B/A/E" triple covers all three, else each letter must stand alone
+        letters = [payload.get(k) for k in LETTER_KEYS]
+        if not (all(letters) and self._pattern("letters", tuple(letters)).search(text)):
+            for k, v in zip(LETTER_KEYS, letters):
+                if v and not self._pattern("letter", v).search(text):
+                    missing.append(k)
+
+        # Rates: any number in the text within tolerance counts
+        rates = [(k, payload.get(k)) for k in RATE_KEYS if payload.get(k) is not None]
+        if rates:
+            numbers = [float(m) for m in _NUMBER.findall(text)]
+            for k, v in rates:
+                if not any(abs(n - float(v)) <= self.rate_tolerance for n in numbers):
+                    missing.append(k)
+        return missing
+
+    def validate_many(self, model_texts, payloads):
+        """
+        Validate many replies in one call. Returns (reasons, stats): reasons[i]
+        lists the missing fact keys for item i, stats aggregates them.
+        """
+        reasons = [self.check(t, p) for t, p in zip(model_texts, payloads)]
+        return reasons, rejection_stats(reasons)
+
+def rejection_stats(reasons):
+    # Aggregate per-item reason lists into counts
+    by_key = Counter(k for r in reasons for k in r)
+    rejected = sum(1 for r in reasons if r)
+    return {
+        "checked": len(reasons),
+        "kept": len(reasons) - rejected,
+        "rejected": rejected,
+        "reasons": {k: by_key[k] for k in FACT_KEYS if by_key[k]},
+    }
+
+_DEFAULT = FactValidator()
+
+def safe_keep_or_fallback(model_text: str, payload: dict, draft_text: str, validator=None) -> str:
+    # Keep the model text only if every fact in the payload survived the rewrite
+    if (validator or _DEFAULT).check(model_text, payload):
+        instrument.count("llm.fallbacks")
+        return draft_text
     return model_text
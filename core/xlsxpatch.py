@@ -0,0 +1,349 @@
+# core/xlsxpatch.py
+# Export by patching: the uploaded .xlsx is copied part by part and only the
+# first sheet's XML is edited, with the justification cells added (or an
+# existing "Risk Justification" column replaced) as inline strings. Styles,
+# other sheets, column widths and sharedStrings.xml keep their content; every
+# part is decompressed and recompressed (level 1) on the way through. The
+# sheet XML is scanned row by row rather than parsed into a tree, and other
+# cells only far enough to tell blank rows apart. The output workbook is
+# built in memory, so a sheet that fails to patch halfway can still fall back
+# to a rebuild.
+#
+# Rows map by sheet row number, as pd.read_excel (openpyxl) reads them: sheet
+# row 1 is the header and DataFrame row i is sheet row i + 2. Blank rows in
+# the middle are DataFrame rows (all NaN); trailing rows without a value are
+# not. A cell without a value (a formula with no cached result, an empty
+# string) does not count as one. patch_xlsx_column raises ValueError when the
+# sheet does not line up with `values`; export_patched then rebuilds the
+# workbook (values only) and says so in its report.
+import io
+import os
+import posixpath
+import re
+import zipfile
+from xml.etree import ElementTree as ET
+
+import pandas as pd
+
+from . import instrument
+from .export import export_excel, export_excel_sheets
+from .stream import OUTPUT_COLUMN
+
+_NS = {
+    "m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+CHUNK_BYTES = 1 << 20
+
+_ROW = re.compile(rb"<row\b[^>]*?(?:/>|>.*?</row>)", re.S)
+_ROW_NUM = re.compile(rb'<row\b[^>]*?\sr="(\d+)"')
+_CELL = re.compile(rb"<c\b[^>]*?(?:/>|>.*?</c>)", re.S)
+_CELL_REF = re.compile(rb'\sr="([A-Z]+)(\d+)"')
+_CELL_TYPE = re.compile(rb'\st="(\w+)"')
+_VALUE = re.compile(rb"<v>([^<]*)</v>")
+_TEXT = re.compile(rb"<t\b[^>]*>([^<]*)</t>")
+_DIMENSION = re.compile(rb'<dimension ref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"\s*/>')
+_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+def col_index(letters):
+    # "A" -> 1, "AN" -> 40
+    n = 0
+    for ch in letters.decode() if isinstance(letters, bytes) else letters:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+def col_letters(n):
+    out = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        out = chr(65 + rem) + out
+    return out
+
+def _escape(text):
+    text = _ILLEGAL.sub("", str(text))
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+def _inline_cell(ref, text):
+    return b'<c r="' + ref.encode() + _inline_body(text)
+
+def _inline_body(text):
+    # Everything after the cell reference; shared by every row with the same text
+    return f'" t="inlineStr"><is><t xml:space="preserve">{_escape(text)}</t></is></c>'.encode()
+
+def first_sheet_path(zf, sheet=0):
+    # Part name of the `sheet`-th worksheet in workbook order (what pd.read_excel(sheet_name=n) reads)
+    wb = ET.fromstring(zf.read("xl/workbook.xml"))
+    sheets = wb.findall("m:sheets/m:sheet", _NS)
+    rid = sheets[sheet].get(f"{{{_NS['r']}}}id")
+    rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels.findall("rel:Relationship", _NS):
+        if rel.get("Id") == rid:
+            target = rel.get("Target")
+            return target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+    raise ValueError(f"worksheet part for sheet {sheet} not found")
+
+def _shared_strings(zf, wanted):
+    # {index: text} for the shared-string indices in `wanted`; stops once all are found
+    out, wanted = {}, set(wanted)
+    if not wanted or "xl/sharedStrings.xml" not in zf.namelist():
+        return out
+    with zf.open("xl/sharedStrings.xml") as f:
+        k = 0
+        for _, el in ET.iterparse(f):
+            if el.tag == f"{{{_NS['m']}}}si":
+                if k in wanted:
+                    out[k] = "".join(t.text or "" for t in el.iter(f"{{{_NS['m']}}}t"))
+                    if len(out) == len(wanted):
+                        break
+                k += 1
+                el.clear()
+    return out
+
+def _empty_shared_strings(zf):
+    # Indices of shared strings whose text is "" (cells pointing at them read as blank)
+    out = set()
+    if "xl/sharedStrings.xml" not in zf.namelist():
+        return out
+    with zf.open("xl/sharedStrings.xml") as f:
+        k = 0
+        for _, el in ET.iterparse(f):
+            if el.tag == f"{{{_NS['m']}}}si":
+                if not "".join(t.text or "" for t in el.iter(f"{{{_NS['m']}}}t")):
+                    out.add(k)
+                k += 1
+                el.clear()
+    return out
+
+def _row_has_value(zf, row, empty_sst):
+    # pd.read_excel's test: some cell reads as other than "" (no value and empty text do not count).
+    # `empty_sst` is a one-slot list, filled by _empty_shared_strings the first time it is needed
+    shared = []
+    for m in _CELL.finditer(row):
+        cell = m.group(0)
+        typ = _CELL_TYPE.search(cell)
+        typ = typ.group(1) if typ else b"n"
+        if typ == b"inlineStr":
+            if b"".join(_TEXT.findall(cell)):
+                return True
+            continue
+        v = _VALUE.search(cell)
+        if v is None or not v.group(1):
+            continue
+        if typ != b"s":
+            return True
+        shared.append(int(v.group(1)))
+    if not shared:
+        return False
+    if not empty_sst:
+        empty_sst.append(_empty_shared_strings(zf))
+    return any(k not in empty_sst[0] for k in shared)
+
+def _header_columns(zf, row):
+    # {column index: header text} of the header row
+    cells = []
+    for m in _CELL.finditer(row):
+        cell = m.group(0)
+        ref, typ = _CELL_REF.search(cell), _CELL_TYPE.search(cell)
+        if ref is None:
+            continue
+        typ = typ.group(1) if typ else b"n"
+        if typ == b"s":
+            v = _VALUE.search(cell)
+            cells.append((col_index(ref.group(1)), "s", int(v.group(1)) if v else None))
+        elif typ == b"inlineStr":
+            cells.append((col_index(ref.group(1)), "t", b"".join(_TEXT.findall(cell)).decode("utf-8")))
+        else:
+            v = _VALUE.search(cell)
+            cells.append((col_index(ref.group(1)), "t", v.group(1).decode("utf-8") if v else ""))
+    strings = _shared_strings(zf, [v for _, kind, v in cells if kind == "s" and v is not None])
+    return {col: (strings.get(v, "") if kind == "s" else v) for col, kind, v in cells}
+
+def _set_cell(row, col, cell):
+    # `row` with the cell in column `col` replaced by `cell` (None: removed); cells stay in column order
+    body_start = row.find(b">") + 1
+    if row[body_start - 2:body_start] == b"/>":
+        head = row[:body_start - 2] + b">"
+        return head + (cell or b"") + b"</row>" if cell else row
+    end = row.rfind(b"</row>")
+    out, placed, pos = [row[:body_start]], False, body_start
+    for m in _CELL.finditer(row, body_start, end):
+        ref = _CELL_REF.search(m.group(0))
+        c = col_index(ref.group(1)) if ref else 0
+        if c >= col and not placed:
+            out.append(row[pos:m.start()])
+            if cell:
+                out.append(cell)
+            placed = True
+            pos = m.end() if c == col else m.start()
+    if not placed and cell:
+        out.append(row[pos:end])
+        out.append(cell)
+        pos = end
+    out.append(row[pos:])
+    return b"".join(out)
+
+def _replace_cell(row, ref, col, cell):
+    # _set_cell, locating an existing cell by its reference before scanning the row
+    at = row.find(b' r="' + ref + b'"')
+    if at < 0:
+        return _set_cell(row, col, cell) if cell else row
+    start = row.rfind(b"<c", 0, at)
+    end = _CELL.match(row, start).end()
+    return row[:start] + (cell or b"") + row[end:]
+
+def _append_cell(row, cell):
+    # Cell after the last one of the row (the column is right of every used column)
+    if row.endswith(b"/>"):
+        return row[:-2] + b">" + cell + b"</row>"
+    return row[:-6] + cell + b"</row>"
+
+def _patch_sheet(zf, src, dst, values, header):
+    """
+    Stream `src` (worksheet XML) to `dst` with `values[i]` written into the
+    header's column (appended when the header is absent) on sheet row i + 2.
+    Blank rows missing from the XML are added when they get a value.
+    """
+    encoded = {}  # text -> _inline_body(text), built once per distinct text
+    empty_sst = []
+    n = len(values)
+    buf, prefix_done, col, last_r, last_value_r = b"", False, None, 0, 0
+    append = False  # True once the column is known to lie right of every used cell
+
+    def new_cell(r):
+        text = values[r - 2]
+        if text is None or text != text:
+            return None
+        body = encoded.get(text)
+        if body is None:
+            body = encoded[text] = _inline_body(text)
+        return b'<c r="' + letters + str(r).encode() + body
+
+    while True:
+        chunk = src.read(CHUNK_BYTES)
+        buf += chunk
+        pos, parts = 0, []
+        for m in _ROW.finditer(buf):
+            row = m.group(0)
+            num = _ROW_NUM.search(row)
+            r = int(num.group(1)) if num else last_r + 1
+            if not prefix_done:
+                # pd.read_excel takes sheet row 1 as the header, blank or not
+                if r != 1 or not _row_has_value(zf, row, empty_sst):
+                    raise ValueError("sheet row 1 is not a header row")
+                headers = _header_columns(zf, row)
+                dim = _DIMENSION.search(buf, 0, m.start())
+                max_col = max(headers, default=0)
+                if dim and dim.group(3):
+                    max_col = max(max_col, col_index(dim.group(3)))
+                col = next((c for c, h in headers.items() if str(h).strip() == header), None)
+                prefix = buf[:m.start()]
+                if col is None:
+                    col = max_col + 1
+                    append = bool(dim and dim.group(3))
+                    row = _set_cell(row, col, _inline_cell(f"{col_letters(col)}{r}", header))
+                    if dim:
+                        last = f'{col_letters(col)}{dim.group(4).decode() if dim.group(4) else r}'.encode()
+                        prefix = prefix[:dim.start()] + b'<dimension ref="' + dim.group(1) + dim.group(2) + \
+                            b":" + last + b'"/>' + prefix[dim.end():]
+                parts.append(prefix)
+                letters = col_letters(col).encode()
+                prefix_done = True
+            else:
+                parts.append(buf[pos:m.start()])
+                # Rows absent from the XML are blank DataFrame rows; they still get their value
+                for k in range(last_r + 1, min(r, n + 2)):
+                    cell = new_cell(k)
+                    if cell:
+                        parts.append(b'<row r="' + str(k).encode() + b'">' + cell + b"</row>")
+                if _row_has_value(zf, row, empty_sst):
+                    if r - 2 >= n:
+                        raise ValueError(f"sheet has more data rows than the {n} values")
+                    last_value_r = r
+                if r - 2 < n:
+                    cell = new_cell(r)
+                    if append:
+                        row = _append_cell(row, cell) if cell else row
+                    else:
+                        row = _replace_cell(row, letters + str(r).encode(), col, cell)
+            last_r = r
+            parts.append(row)
+            pos = m.end()
+        if not prefix_done and not chunk:
+            raise ValueError("sheet has no header row")
+        if prefix_done:
+            dst.write(b"".join(parts))
+            buf = buf[pos:]
+        if not chunk:
+            break
+    dst.write(buf)
+    # Trailing rows without a value are not part of the frame
+    data_rows = max(last_value_r - 1, 0)
+    if data_rows != n:
+        raise ValueError(f"sheet has {data_rows} data rows, expected {n}")
+    return data_rows
+
+def patch_xlsx_column(source, out, values, header=OUTPUT_COLUMN, sheet=0):
+    """
+    Copy of the workbook `source` (path, bytes or binary file) written to `out`
+    (path or binary file) with `values` (one per DataFrame row, None = empty)
+    as column `header` of sheet `sheet`. Every other part of the package
+    keeps its content (recompressed). Returns `out`.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    values = list(values)
+    with zipfile.ZipFile(source) as zin:
+        target = first_sheet_path(zin, sheet)
+        # Every part, the rewritten sheet included, is recompressed at level 1
+        # (the default level dominates export time on large sheets)
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zout:
+            for info in zin.infolist():
+                if info.filename != target:
+                    zout.writestr(info, zin.read(info.filename))
+                    continue
+                with zin.open(info) as src, zout.open(info.filename, "w", force_zip64=True) as dst:
+                    _patch_sheet(zin, src, dst, values, header)
+    return out
+
+def _rebuild(df, out, source):
+    # Fallback export: `df` as the first sheet, the workbook's other sheets re-read and written
+    # after it (values only: styles, widths and formulas are not carried over)
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    try:
+        sheets = pd.read_excel(source, sheet_name=None)
+    except Exception:
+        return export_excel(df, out)
+    first = next(iter(sheets))
+    return export_excel_sheets({first: df, **{k: v for k, v in sheets.items() if k != first}}, out)
+
+def export_patched(df, out, source, column=OUTPUT_COLUMN, report=None):
+    """
+    Write `df[column]` into the workbook `source` (the .xlsx `df` was read
+    from) via patch_xlsx_column; when the sheet does not line up, fall back
+    to a rebuilt workbook (see _rebuild), which loses the original styles.
+    `out` is a path or binary file object. Returns True when the workbook
+    was patched; `report` (optional dict) receives "patched" and "reason"
+    (why it was rebuilt, else None) so callers can tell the user.
+    """
+    buf = io.BytesIO()  # `out` is only written once the patch has succeeded
+    try:
+        patch_xlsx_column(source, buf, df[column], header=column)
+    except (ValueError, KeyError, IndexError, zipfile.BadZipFile) as e:
+        instrument.count("export.rebuilt")
+        if report is not None:
+            report.update(patched=False, reason=f"{type(e).__name__}: {e}")
+        _rebuild(df, out, source)
+        return False
+    instrument.count("export.patched")
+    if report is not None:
+        report.update(patched=True, reason=None)
+    if isinstance(out, (str, os.PathLike)):
+        with open(out, "wb") as f:
+            f.write(buf.getbuffer())
+    else:
+        out.write(buf.getbuffer())
+    return True
@@ -0,0 +1,37 @@
+# tests/test_llm.py
+# A packed batch is split into single requests only when its reply is unusable,
+# never when the request itself was refused; cached replies stay with their source.
+from core import llm
+from core.cache import PolishCache
+from core.llm import polish_batch
+from core.llmstub import StubBackend
+
+def _items(n):
+    return [({"component": f"P-{i}", "pof": 3}, f"Component P-{i} has PoF 3.") for i in range(n)]
+
+def test_rate_limited_batch_is_not_split():
+    backend = StubBackend(rate_limit_rate=1.0, retry_after=0)
+    results = polish_batch("m", None, _items(8), backend=backend, batch_size=4, max_retries=2)
+    stats = backend.stats()
+    assert stats["requests"] == stats["rate_limited"] == 2 * 3  # two batches, three attempts each
+    assert stats["items"] == 8 * 3
+    assert all(r["error"] and not r["polished"] and r["attempts"] == 3 for r in results)
+    assert [r["text"] for r in results] == [d for _, d in _items(8)]
+
+def test_items_missing_from_the_reply_are_retried_alone():
+    backend = StubBackend(drop_rate=1.0)
+    results = polish_batch("m", None, _items(4), backend=backend, batch_size=4)
+    assert backend.stats()["requests"] == 1 + 4
+    assert all(r["polished"] and not r["error"] for r in results)
+
+def test_cache_is_keyed_on_the_call_that_replied(monkeypatch):
+    # Custom single calls next to the HF multi-item call: the HF reply drops every
+    # item, so each is answered by the custom call and must not be cached as "hf"
+    monkeypatch.setattr(llm.HFBackend, "polish_many", lambda self, entries: "[]")
+    cache = PolishCache(":memory:")
+    first = polish_batch("m", None, _items(4), polish=lambda p, d: d, batch_size=4, cache=cache)
+    assert all(r["polished"] for r in first) and cache.writes == 4
+
+    monkeypatch.setattr(llm.HFBackend, "polish", lambda self, payload, draft: draft)
+    again = polish_batch("m", None, _items(4), cache=cache)
+    assert not any(r["cached"] for r in again)
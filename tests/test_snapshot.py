@@ -0,0 +1,85 @@
+# tests/test_snapshot.py
+# The snapshot cache is best effort: write, race and touch failures are misses.
+import datetime
+import errno
+import io
+import os
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from core import snapshot
+from core.snapshot import SnapshotCache, content_key, read_excel_cached
+
+def _workbook():
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["Component", "Inventory"])
+    ws.append(["P-1", 1.5])
+    ws.append(["P-2", None])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+def test_round_trip(tmp_path):
+    data = _workbook()
+    cache = SnapshotCache(str(tmp_path))
+    first = read_excel_cached(data, cache)
+    again = read_excel_cached(data, cache)
+    pd.testing.assert_frame_equal(first, again)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_lost_save_race_returns_the_frame(tmp_path, monkeypatch):
+    # Another process stored the same snapshot between the exists check and the rename
+    def replace(src, dst):
+        raise OSError(errno.ENOTEMPTY, "Directory not empty", dst)
+    monkeypatch.setattr(snapshot.os, "replace", replace)
+    data = _workbook()
+    cache = SnapshotCache(str(tmp_path))
+    df = read_excel_cached(data, cache)
+    pd.testing.assert_frame_equal(df, pd.read_excel(io.BytesIO(data)))
+    assert os.listdir(tmp_path) == []  # the temporary directory was removed
+
+def test_unwritable_cache_dir(tmp_path):
+    root = tmp_path / "not-a-dir"
+    root.write_text("")
+    data = _workbook()
+    df = read_excel_cached(data, SnapshotCache(str(root)))
+    pd.testing.assert_frame_equal(df, pd.read_excel(io.BytesIO(data)))
+
+def test_touch_failure_is_a_miss(tmp_path, monkeypatch):
+    data = _workbook()
+    cache = SnapshotCache(str(tmp_path))
+    read_excel_cached(data, cache)
+    def utime(path, *args, **kwargs):
+        raise FileNotFoundError(errno.ENOENT, "evicted", path)
+    monkeypatch.setattr(snapshot.os, "utime", utime)
+    assert cache.load(content_key(data)) is None
+    pd.testing.assert_frame_equal(read_excel_cached(data, cache), pd.read_excel(io.BytesIO(data)))
+
+def test_object_values_keep_their_types_without_pickle(tmp_path):
+    values = [1, 1.0, True, "1", None, float("nan"), datetime.datetime(2024, 1, 2, 3, 4, 5, 6),
+              datetime.time(1, 2), datetime.timedelta(days=1, microseconds=3),
+              pd.Timestamp("2024-01-01 00:00:00.000000001")]
+    df = pd.DataFrame({"mixed": pd.Series(values, dtype=object), 7: range(len(values))})
+    cache = SnapshotCache(str(tmp_path))
+    assert cache.save("k", df)
+    back = cache.load("k")
+    pd.testing.assert_frame_equal(back, df)
+    assert [type(v) for v in back["mixed"]] == [type(v) for v in values]
+    for name in os.listdir(tmp_path / "k"):
+        if name.endswith(".npy"):
+            assert np.load(tmp_path / "k" / name).dtype != object  # loads with allow_pickle=False
+
+def test_unknown_value_types_are_not_stored(tmp_path):
+    df = pd.DataFrame({"a": pd.Series([np.int64(3)], dtype=object)})
+    assert not SnapshotCache(str(tmp_path)).save("k", df)
+
+def test_tampered_snapshot_is_a_miss(tmp_path):
+    data = _workbook()
+    cache = SnapshotCache(str(tmp_path))
+    read_excel_cached(data, cache)
+    key = content_key(data)
+    (tmp_path / key / "c0.values.json").write_text('{"values": ["echo hi"], "types": {"os.system": [0]}}')
+    assert cache.load(key) is None
@@ -0,0 +1,36 @@
+# tests/test_stream.py
+# Streaming mode must treat invalid cells like the in-memory path.
+import io
+
+import pandas as pd
+
+from core.generator import build_all_justifications
+from core.ingest import coerce_register
+from core.stream import OUTPUT_COLUMN, write_justified_xlsx
+from bench.synth import synth_register
+
+def test_text_cells_in_numeric_columns_match_in_memory():
+    df = synth_register(250).astype({"Inventory": object, "Flammable Affected Area": object})
+    df.loc[3, "Inventory"] = "unknown"
+    df.loc[180, "Flammable Affected Area"] = "tbc"
+    source = io.BytesIO()
+    df.to_excel(source, index=False)
+
+    out, report = io.BytesIO(), {}
+    assert write_justified_xlsx(source, out, chunk_rows=100, report=report) == len(df)
+
+    read = pd.read_excel(io.BytesIO(source.getvalue()))
+    typed, expected = coerce_register(read)
+    assert pd.read_excel(io.BytesIO(out.getvalue()))[OUTPUT_COLUMN].tolist() == \
+        build_all_justifications(typed)
+    assert report["invalid"] == expected["invalid"] == 2
+    assert report["by_column"] == expected["by_column"]
+    pd.testing.assert_frame_equal(report["cells"], expected["cells"])
+    assert report["cells"]["excel_row"].tolist() == [5, 182]
+
+def test_clean_sheet_reports_nothing():
+    source = io.BytesIO()
+    synth_register(50).to_excel(source, index=False)
+    report = {}
+    write_justified_xlsx(source, io.BytesIO(), chunk_rows=20, report=report)
+    assert report["invalid"] == 0 and not len(report["cells"])
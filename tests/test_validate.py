@@ -0,0 +1,44 @@
+# tests/test_validate.py
+# FactValidator must only find a PoF value where the text states it.
+import pytest
+
+from core.validate import FactValidator
+
+def _pof_missing(text, pof):
+    return "pof" in FactValidator().check(text, {"pof": pof})
+
+@pytest.mark.parametrize("text", [
+    "PoF is low (4); CCR is moderate.",
+    "The PoF = 4 for this component.",
+    "PoF 4 with a moderate CCR.",
+    "Likelihood is driven by PoF 4.",
+    "PoF rated low ( 4 ) given the measured rates.",
+])
+def test_stated_pof_is_found(text):
+    assert not _pof_missing(text, 4)
+
+@pytest.mark.parametrize("text, pof", [
+    ("PoF and CoF, because C4 gas release.", 4),
+    ("PoF and CoF are high due to H2S service.", 2),
+    ("The component has a PoF of 2.5 overall.", 2),
+    ("PoF is low; the inventory is 4 tonnes.", 4),
+    ("PoF is low (5).", 4),
+    ("PoF = 45 after reassessment.", 4),
+])
+def test_other_numbers_near_pof_are_not_the_pof(text, pof):
+    assert _pof_missing(text, pof)
+
+def test_drafts_pass_and_dropped_pof_is_caught():
+    from core.generator import build_polish_items
+    from core.ingest import coerce_register
+    from core.llmstub import MUTATIONS
+    from bench.synth import synth_register
+
+    typed, _ = coerce_register(synth_register(500))
+    _, drafts, payloads = build_polish_items(typed)
+    validator = FactValidator()
+    with_pof = [(p, d) for p, d in zip(payloads, drafts) if p["pof"] is not None]
+    assert with_pof
+    for payload, draft in with_pof:
+        assert "pof" not in validator.check(draft, payload)
+        assert "pof" in validator.check(MUTATIONS["drop_pof"](draft, payload, None), payload)
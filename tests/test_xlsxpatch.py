@@ -0,0 +1,97 @@
+# tests/test_xlsxpatch.py
+# export_patched must put each justification on the sheet row pd.read_excel
+# read it from, or rebuild the workbook and say so.
+import io
+
+import openpyxl
+import pandas as pd
+
+from core.stream import OUTPUT_COLUMN
+from core.xlsxpatch import export_patched
+
+def _workbook(rows, extra_sheets=None):
+    # .xlsx bytes with `rows` (lists, None = blank row) on the first sheet
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Register"
+    for r, row in enumerate(rows, start=1):
+        for c, v in enumerate(row or [], start=1):
+            ws.cell(r, c, v)
+    for name, sheet_rows in (extra_sheets or {}).items():
+        extra = wb.create_sheet(name)
+        for row in sheet_rows:
+            extra.append(row)
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+def _patch(source):
+    # (frame as read, patched workbook bytes, report), one justification per row: "J<sheet row>"
+    df = pd.read_excel(io.BytesIO(source))
+    df[OUTPUT_COLUMN] = [f"J{i + 2}" for i in range(len(df))]
+    out, report = io.BytesIO(), {}
+    export_patched(df, out, source, report=report)
+    return df, out.getvalue(), report
+
+def _column(data, sheet="Register"):
+    # {sheet row: value} of the justification column
+    ws = openpyxl.load_workbook(io.BytesIO(data))[sheet]
+    col = next(c.column for c in ws[1] if c.value == OUTPUT_COLUMN)
+    return {r: ws.cell(r, col).value for r in range(2, ws.max_row + 1) if ws.cell(r, col).value is not None}
+
+def _assert_aligned(source):
+    df, data, report = _patch(source)
+    assert report == {"patched": True, "reason": None}
+    assert _column(data) == {i + 2: f"J{i + 2}" for i in range(len(df))}
+    assert pd.read_excel(io.BytesIO(data))[OUTPUT_COLUMN].tolist() == df[OUTPUT_COLUMN].tolist()
+    return data
+
+def test_blank_row_in_the_middle():
+    _assert_aligned(_workbook([["Component", "Inventory"], ["P-1", 1], None, ["P-3", 3]]))
+
+def test_trailing_formula_without_cached_value():
+    # openpyxl saves formulas without a result: the row reads as blank and is dropped
+    source = _workbook([["Component", "Inventory"], ["P-1", 1], ["P-2", 2], [None, "=SUM(B2:B3)"]])
+    assert len(pd.read_excel(io.BytesIO(source))) == 2
+    data = _assert_aligned(source)
+    assert 4 not in _column(data)
+
+def test_formula_row_in_the_middle():
+    source = _workbook([["Component", "Inventory"], ["P-1", 1], [None, "=B2*2"], ["P-3", 3]])
+    assert len(pd.read_excel(io.BytesIO(source))) == 3
+    _assert_aligned(source)
+
+def test_blank_and_formula_rows_together():
+    _assert_aligned(_workbook([["Component", "Inventory"], ["P-1", 1], None, None, ["P-4", 4],
+                               [None, "=SUM(B2:B5)"]]))
+
+def test_existing_column_is_replaced():
+    source = _workbook([["Component", OUTPUT_COLUMN, "Inventory"], ["P-1", "old", 1], ["P-2", "old", 2]])
+    data = _assert_aligned(source)
+    ws = openpyxl.load_workbook(io.BytesIO(data))["Register"]
+    assert [c.value for c in ws[1]] == ["Component", OUTPUT_COLUMN, "Inventory"]
+    assert ws["C3"].value == 2
+
+def test_extra_sheets_and_styles_are_kept():
+    source = _workbook([["Component", "Inventory"], ["P-1", 1]], {"Notes": [["note"], ["kept"]]})
+    wb = openpyxl.load_workbook(io.BytesIO(source))
+    wb["Register"]["A1"].font = openpyxl.styles.Font(bold=True)
+    buf = io.BytesIO()
+    wb.save(buf)
+    data = _assert_aligned(buf.getvalue())
+    out = openpyxl.load_workbook(io.BytesIO(data))
+    assert out.sheetnames == ["Register", "Notes"]
+    assert out["Notes"]["A2"].value == "kept"
+    assert out["Register"]["A1"].font.bold
+
+def test_unaligned_sheet_is_rebuilt_and_reported():
+    # Header not on sheet row 1: the rows can't be matched, so the workbook is rebuilt
+    source = _workbook([None, ["Component", "Inventory"], ["P-1", 1]], {"Notes": [["note"], ["kept"]]})
+    df = pd.DataFrame({"Component": ["P-1"], OUTPUT_COLUMN: ["J2"]})
+    out, report = io.BytesIO(), {}
+    assert export_patched(df, out, source, report=report) is False
+    assert report["patched"] is False and report["reason"]
+    out = openpyxl.load_workbook(io.BytesIO(out.getvalue()))
+    assert out.sheetnames == ["Register", "Notes"]
+    assert out["Notes"]["A2"].value == "kept"
+    assert out["Register"]["B2"].value == "J2"